@@ -0,0 +1,78 @@
+"""
+API key authentication with an in-process cache.
+
+Each serverless instance keeps its own cache: revocation evicts the entry in
+the instance that handled it, and other instances pick it up once the entry
+expires, so the positive TTL is kept short.
+"""
+import hashlib
+import os
+from typing import NamedTuple, Optional
+
+from api._cache import TTLCache
+from api._db import APIKey, get_db
+
+AUTH_CACHE_TTL = float(os.environ.get("SHRTNR_AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_NEGATIVE_TTL = float(os.environ.get("SHRTNR_AUTH_CACHE_NEGATIVE_TTL", "5"))
+AUTH_CACHE_SIZE = int(os.environ.get("SHRTNR_AUTH_CACHE_SIZE", "10000"))
+
+_auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_MISSING = object()
+
+
+class AuthenticatedKey(NamedTuple):
+    id: int
+    is_active: bool
+
+
+def _digest(raw_key):
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+def _lookup(db, raw_key, digest):
+    row = db.query(APIKey.id, APIKey.is_active).filter(APIKey.key == raw_key).first()
+    cached = AuthenticatedKey(row.id, bool(row.is_active)) if row else None
+    ttl = AUTH_CACHE_TTL if cached and cached.is_active else AUTH_CACHE_NEGATIVE_TTL
+    _auth_cache.set(digest, cached, ttl=ttl)
+    return cached
+
+
+def _active(cached) -> Optional[AuthenticatedKey]:
+    if cached is None or not cached.is_active:
+        return None
+    return cached
+
+
+def authenticate(db, raw_key) -> Optional[AuthenticatedKey]:
+    """Resolve the X-API-Key header value, querying only on a cache miss."""
+    if not raw_key:
+        return None
+    digest = _digest(raw_key)
+    cached = _auth_cache.get(digest, _MISSING)
+    if cached is _MISSING:
+        cached = _lookup(db, raw_key, digest)
+    return _active(cached)
+
+
+def authenticate_request(handler) -> Optional[AuthenticatedKey]:
+    """authenticate() the request's X-API-Key for handlers without a session of their own.
+
+    A session is opened only on a cache miss.
+    """
+    raw_key = handler.headers.get('X-API-Key')
+    if not raw_key:
+        return None
+    digest = _digest(raw_key)
+    cached = _auth_cache.get(digest, _MISSING)
+    if cached is _MISSING:
+        db = next(get_db())
+        try:
+            cached = _lookup(db, raw_key, digest)
+        finally:
+            db.close()
+    return _active(cached)
+
+
+def invalidate(raw_key):
+    """Drop a key from the cache, e.g. right after it was revoked."""
+    _auth_cache.pop(_digest(raw_key))
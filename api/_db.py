@@ -3,26 +3,69 @@ Shared database module for Vercel serverless functions.
 Uses Neon Postgres via DATABASE_URL environment variable.
 """
 import os
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Boolean, func
+import time
+import zlib
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, select, text, Column, Integer, String, DateTime, ForeignKey, Boolean, Index, func
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import secrets
 
-# Get database URL from environment (Neon Postgres)
-DATABASE_URL = os.environ.get("DATABASE_URL", "")
+from api._replicas import REPLICA_URLS, ReplicaSet, recently_written
+from api._serializers import dumps
+from api._timing import phase, timing_headers
+
+
+def normalize_url(url):
+    """Handle Neon's postgres:// vs postgresql:// URL format."""
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
 
-# Handle Neon's postgres:// vs postgresql:// URL format
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+
+# Get database URL from environment (Neon Postgres)
+DATABASE_URL = normalize_url(os.environ.get("DATABASE_URL", ""))
 
 engine = create_engine(DATABASE_URL) if DATABASE_URL else None
+
+
+def enforce_foreign_keys(dbapi_connection, connection_record):
+    """SQLite checks foreign keys only when asked to, per connection."""
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+if engine is not None and engine.dialect.name == "sqlite":
+    # A click for a link deleted on another instance fails instead of
+    # leaving an orphan row (see api/redirect.py)
+    event.listen(engine, "connect", enforce_foreign_keys)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) if engine else None
+
+replica_sessions = [
+    sessionmaker(autocommit=False, autoflush=False, bind=create_engine(normalize_url(url)))
+    for url in REPLICA_URLS
+] if engine else []
+replicas = ReplicaSet(len(replica_sessions))
+
 Base = declarative_base()
 
 # Base URL for generated short links
 BASE_URL = os.environ.get("SHRTNR_BASE_URL", "https://your-app.vercel.app")
 
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get("SHRTNR_COMPRESS_MIN_SIZE", "1024"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "image/svg+xml")
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Configured once and copied per response instead of re-initialising zlib
+_GZIP_COMPRESSOR = zlib.compressobj(6, zlib.DEFLATED, 31)
+
 
 class APIKey(Base):
     __tablename__ = "api_keys"
@@ -43,10 +86,10 @@ class URL(Base):
     api_key_id = Column(Integer, ForeignKey("api_keys.id"), nullable=True)
     api_key = relationship("APIKey", back_populates="urls")
     clicks = relationship("Click", back_populates="url", cascade="all, delete-orphan")
-
-    @property
-    def click_count(self):
-        return len(self.clicks)
+    __table_args__ = (
+        Index("ix_urls_created_at_id", "created_at", "id"),
+        Index("ix_urls_api_key_id_created_at_id", "api_key_id", "created_at", "id"),
+    )
 
 
 class Click(Base):
@@ -59,6 +102,12 @@ class Click(Base):
     referer = Column(String, nullable=True)
     country = Column(String, nullable=True)
     url = relationship("URL", back_populates="clicks")
+    __table_args__ = (Index("ix_clicks_url_id_clicked_at", "url_id", "clicked_at"),)
+
+
+def click_count():
+    """A URL's click total as a correlated subquery, selected with the URL rather than loading url.clicks."""
+    return select(func.count(Click.id)).where(Click.url_id == URL.id).correlate(URL).scalar_subquery()
 
 
 def get_db():
@@ -72,15 +121,128 @@ def get_db():
         db.close()
 
 
+def read(query, short_code=None, api_key_id=None):
+    """Run query(session) on a read replica, falling back to the primary.
+
+    The primary answers when no replica is healthy, when the link or key was
+    written by this instance in the last few seconds, when the replica
+    errors, and when a lookup by short_code misses (it may not have
+    replicated yet). The session is closed before returning, so query must
+    load everything it needs.
+    """
+    index = None if recently_written(short_code, api_key_id) else replicas.pick()
+    if index is not None:
+        session = replica_sessions[index]()
+        try:
+            result = query(session)
+            if result is not None or short_code is None:
+                return result
+        except DBAPIError:
+            replicas.mark_down(index)
+        finally:
+            session.close()
+
+    session = SessionLocal()
+    try:
+        return query(session)
+    finally:
+        session.close()
+
+
+@contextmanager
+def time_limit(session, deadline):
+    """Abort statements the session runs past `deadline` (time.perf_counter()) with a DBAPIError.
+
+    Postgres gets a statement_timeout that ends with the session's
+    transaction; SQLite a progress handler that interrupts the statement.
+    """
+    remaining_ms = max(int((deadline - time.perf_counter()) * 1000), 1)
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        session.execute(text(f"SET LOCAL statement_timeout = {remaining_ms}"))
+        yield
+    elif dialect == "sqlite":
+        conn = session.connection().connection.driver_connection
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        try:
+            yield
+        finally:
+            conn.set_progress_handler(None, 0)
+    else:
+        yield
+
+
 def init_db():
     """Initialize database tables."""
     if engine:
         Base.metadata.create_all(bind=engine)
+        create_indexes()
+
+
+def create_indexes():
+    """Create indexes added after their table already existed."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    compressor = _GZIP_COMPRESSOR.copy()
+    return compressor.compress(body) + compressor.flush()
+
+
+def send_body(handler, body, content_type, status=200, headers=None):
+    """Write a complete response, compressing it when the client allows."""
+    encoding = None
+    compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+    if compressible and len(body) >= COMPRESS_MIN_SIZE:
+        encoding = negotiate_encoding(handler.headers.get('Accept-Encoding'))
+        if encoding:
+            body = compress(body, encoding)
+    handler.send_response(status)
+    handler.send_header('Content-Type', content_type)
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    if compressible:
+        handler.send_header('Vary', 'Accept-Encoding')
+    if encoding:
+        handler.send_header('Content-Encoding', encoding)
+    for name, value in {**(headers or {}), **timing_headers(status)}.items():
+        handler.send_header(name, value)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def send_json(handler, data, status=200, headers=None):
+    with phase("serialize"):
+        body = dumps(data)
+    send_body(handler, body, 'application/json', status, headers)
 
 
 def json_response(data, status=200):
     """Create JSON response for Vercel."""
-    import json
     return {
         "statusCode": status,
         "headers": {
@@ -89,7 +251,7 @@ def json_response(data, status=200):
             "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
             "Access-Control-Allow-Headers": "Content-Type, X-API-Key"
         },
-        "body": json.dumps(data, default=str)
+        "body": dumps(data).decode()
     }
 
 
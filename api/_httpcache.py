@@ -0,0 +1,50 @@
+"""ETag / conditional GET helpers for the serverless handlers."""
+import hashlib
+
+from api._db import send_body
+from api._serializers import dumps
+from api._timing import phase, timing_headers
+
+# Public aggregates can be served by the Vercel edge for a few seconds and
+# refreshed in the background; key-scoped listings must always revalidate.
+STATS_CACHE_CONTROL = "public, max-age=5, s-maxage=10, stale-while-revalidate=60"
+TRENDING_CACHE_CONTROL = "public, max-age=30, s-maxage=60, stale-while-revalidate=300"
+URL_STATS_CACHE_CONTROL = "public, max-age=5, s-maxage=10, stale-while-revalidate=60"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(handler, etag):
+    header = handler.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    wanted = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == wanted for tag in header.split(','))
+
+
+def send_not_modified(handler, etag, cache_control):
+    handler.send_response(304)
+    handler.send_header('ETag', etag)
+    handler.send_header('Cache-Control', cache_control)
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.send_header('Vary', 'Accept-Encoding')
+    for name, value in timing_headers(304).items():
+        handler.send_header(name, value)
+    handler.end_headers()
+
+
+def send_conditional_json(handler, data, cache_control, etag=None):
+    """Send JSON tagged with an ETag (content hash unless given), or a 304."""
+    with phase("serialize"):
+        body = dumps(data)
+    etag = etag or make_etag(body)
+    if etag_matches(handler, etag):
+        send_not_modified(handler, etag, cache_control)
+        return
+    send_body(handler, body, 'application/json', headers={'ETag': etag, 'Cache-Control': cache_control})
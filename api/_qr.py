@@ -0,0 +1,135 @@
+"""QR code rendering (PNG via PIL, or PIL-free SVG) with an in-memory and optional on-disk content-addressed cache."""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+from api._cache import TTLCache
+
+# Rendered QR codes only depend on the short URL and render parameters, so
+# they are cached by a content hash of both: in memory, and optionally on disk
+QR_CACHE_SIZE = int(os.environ.get("SHRTNR_QR_CACHE_SIZE", "512"))
+QR_CACHE_DIR = os.environ.get("SHRTNR_QR_CACHE_DIR")
+
+QR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 5
+DEFAULT_ERROR_CORRECTION = "M"
+
+MAX_BOX_SIZE = 40
+MAX_BORDER = 20
+
+# Values of qrcode.constants.ERROR_CORRECT_*, kept here so that choosing a
+# level does not require importing qrcode
+ERROR_CORRECTION_LEVELS = {"L": 1, "M": 0, "Q": 3, "H": 2}
+
+MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+_qr_cache = TTLCache(maxsize=QR_CACHE_SIZE)
+
+
+class QRParams(NamedTuple):
+    box_size: int = DEFAULT_BOX_SIZE
+    border: int = DEFAULT_BORDER
+    error_correction: str = DEFAULT_ERROR_CORRECTION
+
+
+def qr_cache_key(short_url: str, fmt: str, params: QRParams) -> str:
+    raw = json.dumps([short_url, fmt, params._asdict()], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _make_qr(short_url: str, params: QRParams):
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        box_size=params.box_size,
+        border=params.border,
+        error_correction=ERROR_CORRECTION_LEVELS[params.error_correction],
+    )
+    qr.add_data(short_url)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(short_url: str, params: QRParams = QRParams()) -> bytes:
+    # PIL is only needed for raster output
+    from qrcode.image.pil import PilImage
+
+    img = _make_qr(short_url, params).make_image(
+        image_factory=PilImage, fill_color="black", back_color="white"
+    )
+
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_svg(short_url: str, params: QRParams = QRParams()) -> bytes:
+    """Emit the module matrix as a single path, one subpath per run of dark modules."""
+    matrix = _make_qr(short_url, params).get_matrix()  # includes the border
+    n = len(matrix)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < n:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < n and row[x]:
+                x += 1
+            runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+    pixels = n * params.box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {n} {n}" shape-rendering="crispEdges">'
+        f'<rect width="{n}" height="{n}" fill="#fff"/>'
+        f'<path d="{"".join(runs)}"/></svg>'
+    ).encode()
+
+
+RENDERERS = {"png": render_png, "svg": render_svg}
+
+
+def _disk_path(key: str, fmt: str) -> Optional[str]:
+    if not QR_CACHE_DIR:
+        return None
+    return os.path.join(QR_CACHE_DIR, key[:2], f"{key}.{fmt}")
+
+
+def _read_disk(key: str, fmt: str) -> Optional[bytes]:
+    path = _disk_path(key, fmt)
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    return None
+
+
+def _write_disk(key: str, fmt: str, data: bytes) -> None:
+    path = _disk_path(key, fmt)
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so concurrent readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def get_qr(short_url: str, fmt: str = "png", params: QRParams = QRParams()) -> tuple[str, bytes]:
+    """Return (cache key, image bytes), rendering only on a cache miss."""
+    key = qr_cache_key(short_url, fmt, params)
+    data = _qr_cache.get(key)
+    if data is None:
+        data = _read_disk(key, fmt)
+        if data is None:
+            data = RENDERERS[fmt](short_url, params)
+            _write_disk(key, fmt, data)
+        _qr_cache.set(key, data)
+    return key, data
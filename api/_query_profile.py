@@ -0,0 +1,136 @@
+"""Per-request SQL statement budgets, N+1 and slow-query checks for the serverless handlers."""
+import functools
+import io
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# off (default), log (warnings on "shrtnr.queries") or raise (the response
+# becomes a 500 listing the problems, failing any test that hits the route)
+QUERY_PROFILE = os.environ.get("SHRTNR_QUERY_PROFILE", "off").lower()
+SLOW_QUERY_MS = float(os.environ.get("SHRTNR_SLOW_QUERY_MS", "100"))
+QUERY_REPEAT_LIMIT = int(os.environ.get("SHRTNR_QUERY_REPEAT_LIMIT", "5"))
+
+# Most statements each handler may run: with an uncached API key lookup, a
+# database-backed rate limit and a replica miss retried on the primary
+QUERY_BUDGETS = {
+    "POST /api/keys": 3,
+    "GET /api/keys": 2,
+    "DELETE /api/keys/{id}": 4,
+    "POST /api/shorten": 6,
+    "GET /{code}": 3,
+    "GET /api/urls/{code}": 5,
+    "DELETE /api/urls/{code}": 6,
+    "GET /api/urls": 3,
+    "GET /api/urls/{code}/qr": 3,
+    "GET /api/stats": 5,
+    "GET /api/trending": 2,
+}
+
+logger = logging.getLogger("shrtnr.queries")
+
+_current = ContextVar("query_profile", default=None)
+
+
+class QueryProfile:
+    """Statements run on behalf of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.repeats = {}
+        self.slow = []
+        self._lock = threading.Lock()
+
+    def record(self, engine, statement, ms):
+        with self._lock:
+            self.count += 1
+            key = (engine, statement)
+            self.repeats[key] = self.repeats.get(key, 0) + 1
+            if ms >= SLOW_QUERY_MS:
+                self.slow.append((ms, statement))
+
+    def problems(self, route):
+        found = []
+        budget = QUERY_BUDGETS.get(route)
+        if budget is not None and self.count > budget:
+            found.append(f"{self.count} statements, budget {budget}")
+        for (_, statement), times in self.repeats.items():
+            if times >= QUERY_REPEAT_LIMIT:
+                found.append(f"repeated {times}x (N+1?): {_shorten(statement)}")
+        for ms, statement in self.slow:
+            found.append(f"slow {ms:.0f} ms: {_shorten(statement)}")
+        return found
+
+
+def _shorten(statement, limit=200):
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_profile_started", None)
+    profile = _current.get()
+    if started is not None and profile is not None:
+        profile.record(conn.engine, statement, (time.perf_counter() - started) * 1000)
+
+
+if QUERY_PROFILE != "off":
+    event.listen(Engine, "before_cursor_execute", _before_execute)
+    event.listen(Engine, "after_cursor_execute", _after_execute)
+
+
+def profiled(route):
+    """Check a do_GET/do_POST/do_DELETE method against the budget for `route`.
+
+    The response is buffered so that, in raise mode, it can be replaced by
+    a 500; otherwise it goes out unchanged plus an X-Query-Count header.
+    """
+    def decorate(method):
+        if QUERY_PROFILE == "off":
+            return method
+
+        @functools.wraps(method)
+        def wrapper(handler):
+            profile = QueryProfile()
+            token = _current.set(profile)
+            wfile, handler.wfile = handler.wfile, io.BytesIO()
+            try:
+                return method(handler)
+            finally:
+                _current.reset(token)
+                response, handler.wfile = handler.wfile.getvalue(), wfile
+                problems = profile.problems(route)
+                if problems:
+                    logger.warning(
+                        "%s: %s", route, "; ".join(problems),
+                        extra={"route": route, "queries": profile.count, "problems": problems},
+                    )
+                if problems and QUERY_PROFILE == "raise":
+                    body = json.dumps({"detail": "Query profile check failed", "route": route,
+                                       "problems": problems}).encode()
+                    handler.send_response(500)
+                    handler.send_header('Content-Type', 'application/json')
+                    handler.send_header('Content-Length', str(len(body)))
+                    handler.send_header('X-Query-Count', str(profile.count))
+                    handler.end_headers()
+                    handler.wfile.write(body)
+                else:
+                    status_line, sep, rest = response.partition(b"\r\n")
+                    if sep:
+                        response = status_line + f"\r\nX-Query-Count: {profile.count}".encode() + sep + rest
+                    handler.wfile.write(response)
+
+        return wrapper
+
+    return decorate
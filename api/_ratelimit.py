@@ -0,0 +1,163 @@
+"""
+Per API key / client IP rate limiting with token buckets.
+
+The default in-process store is per serverless instance; set
+SHRTNR_RATE_LIMIT_STORE=database to share buckets through Postgres.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from sqlalchemy import Boolean, Column, Float, MetaData, String, Table, case, create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api._db import engine, send_json
+
+# Limits per endpoint class, e.g. "shorten=60/minute,read=600/minute".
+# Set to "off" to disable rate limiting entirely.
+DEFAULT_RATE_LIMITS = "shorten=60/minute,read=600/minute,write=60/minute,qr=60/minute"
+RATE_LIMITS = os.environ.get("SHRTNR_RATE_LIMITS", DEFAULT_RATE_LIMITS)
+
+# "memory" for a single process, "database" to share buckets through
+# DATABASE_URL, or any SQLAlchemy URL (e.g. sqlite:////var/lib/shrtnr/rl.db)
+RATE_LIMIT_STORE = os.environ.get("SHRTNR_RATE_LIMIT_STORE", "memory")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit(NamedTuple):
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_limits(spec: str) -> dict[str, Limit]:
+    limits = {}
+    if not spec or spec.strip().lower() == "off":
+        return limits
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        count, _, period = value.partition("/")
+        limits[name.strip()] = Limit(int(count), PERIODS[period.strip().rstrip("s")])
+    return limits
+
+
+class MemoryStore:
+    """Token buckets held in this process."""
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, bucket: str, limit: Limit, now: float) -> float:
+        with self._lock:
+            tokens, updated_at = self._buckets.get(bucket, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated_at) * limit.rate)
+            if tokens >= 1:
+                self._buckets[bucket] = (tokens - 1, now)
+                retry_after = 0.0
+            else:
+                self._buckets[bucket] = (tokens, now)
+                retry_after = (1 - tokens) / limit.rate
+            self._buckets.move_to_end(bucket)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class SQLStore:
+    """Token buckets shared by all workers through a SQLite or Postgres table.
+
+    Each hit is a single atomic upsert, so concurrent workers never need a
+    read-modify-write transaction.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.table = Table(
+            "rate_limit_buckets", MetaData(),
+            Column("bucket", String, primary_key=True),
+            Column("tokens", Float, nullable=False),
+            Column("updated_at", Float, nullable=False),
+            Column("allowed", Boolean, nullable=False),
+        )
+        self.table.create(bind=engine, checkfirst=True)
+        dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+        self._insert = dialect.insert
+
+    def take(self, bucket: str, limit: Limit, now: float) -> float:
+        t = self.table
+        refilled = t.c.tokens + (now - t.c.updated_at) * limit.rate
+        refilled = case((refilled > limit.capacity, float(limit.capacity)), else_=refilled)
+        stmt = self._insert(t).values(
+            bucket=bucket, tokens=limit.capacity - 1, updated_at=now, allowed=True
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[t.c.bucket],
+            set_={
+                "tokens": case((refilled >= 1, refilled - 1), else_=refilled),
+                "updated_at": now,
+                "allowed": refilled >= 1,
+            },
+        ).returning(t.c.tokens, t.c.allowed)
+        with self.engine.begin() as conn:
+            tokens, allowed = conn.execute(stmt).one()
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+
+class RateLimiter:
+    def __init__(self, limits: dict[str, Limit], store):
+        self.limits = limits
+        self.store = store
+
+    def hit(self, endpoint_class: str, identity: str) -> float:
+        """Consume one token; returns 0 when allowed, else seconds to wait."""
+        limit = self.limits.get(endpoint_class)
+        if limit is None:
+            return 0.0
+        return self.store.take(f"{endpoint_class}:{identity}", limit, time.time())
+
+
+def identity_for(api_key_id: Optional[int], client_ip: Optional[str]) -> str:
+    if api_key_id is not None:
+        return f"key:{api_key_id}"
+    return f"ip:{client_ip or 'unknown'}"
+
+
+def retry_after_header(retry_after: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+def _build_store():
+    if RATE_LIMIT_STORE == "memory":
+        return MemoryStore()
+    if RATE_LIMIT_STORE == "database":
+        return SQLStore(engine)
+    return SQLStore(create_engine(RATE_LIMIT_STORE))
+
+
+limiter = RateLimiter(parse_limits(RATE_LIMITS), _build_store())
+
+
+def client_ip(handler):
+    forwarded = handler.headers.get('X-Forwarded-For')
+    if forwarded:
+        return forwarded.split(',')[0].strip()
+    return handler.client_address[0] if handler.client_address else None
+
+
+def check_rate_limit(handler, endpoint_class, api_key=None):
+    """Consume a token for this request; sends a 429 and returns False when limited."""
+    identity = identity_for(api_key.id if api_key else None, client_ip(handler))
+    retry_after = limiter.hit(endpoint_class, identity)
+    if not retry_after:
+        return True
+    send_json(handler, {"detail": "Rate limit exceeded"}, 429, retry_after_header(retry_after))
+    return False
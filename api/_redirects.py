@@ -0,0 +1,236 @@
+"""Key-value redirect store consulted before the SQL database."""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from api._cache import TTLCache
+
+# Key-value store answering short_code -> destination ahead of the SQL
+# database, which stays the system of record for links and clicks.
+#   sqlite:////tmp/redirects.db   one memory-mapped key/value file; on
+#                                 Vercel each instance has its own
+#   memory                        per-instance LRU (SHRTNR_REDIRECT_STORE_SIZE)
+# Empty or "off" disables it. Entries are written through on shorten and
+# delete and filled in when a redirect falls back to SQL.
+REDIRECT_STORE = os.environ.get("SHRTNR_REDIRECT_STORE", "")
+# Seconds an entry is trusted before the next redirect re-reads SQL; 0 keeps
+# it until the link is deleted. A delete only reaches the instance that
+# served it, and neither store is shared between instances, so unset this
+# defaults to UNSHARED_STORE_TTL.
+REDIRECT_STORE_TTL = os.environ.get("SHRTNR_REDIRECT_STORE_TTL", "")
+UNSHARED_STORE_TTL = 300.0
+# Most links the memory store holds per instance
+REDIRECT_STORE_SIZE = int(os.environ.get("SHRTNR_REDIRECT_STORE_SIZE", "100000"))
+# On a cold start the redirect function loads the links with the most clicks
+# over the last SHRTNR_REDIRECT_WARM_DAYS into the store before its first
+# request. Loading stops once SHRTNR_REDIRECT_WARM_BUDGET seconds have gone,
+# the query included. 0 links: no warm-up.
+REDIRECT_WARM_LINKS = int(os.environ.get("SHRTNR_REDIRECT_WARM_LINKS", "1000"))
+REDIRECT_WARM_BUDGET = float(os.environ.get("SHRTNR_REDIRECT_WARM_BUDGET", "5"))
+REDIRECT_WARM_DAYS = float(os.environ.get("SHRTNR_REDIRECT_WARM_DAYS", "7"))
+
+logger = logging.getLogger("shrtnr.redirects")
+
+
+class Redirect(NamedTuple):
+    """What a redirect needs; stands in for the URL row when recording the click."""
+    id: int
+    short_code: str
+    original_url: str
+
+
+def store_ttl(shared: bool) -> float:
+    """SHRTNR_REDIRECT_STORE_TTL, or the default for a store that is (not) shared."""
+    if REDIRECT_STORE_TTL:
+        return float(REDIRECT_STORE_TTL)
+    return 0.0 if shared else UNSHARED_STORE_TTL
+
+
+class RedirectStore:
+    def get(self, short_code: str) -> Optional[Redirect]:
+        raise NotImplementedError
+
+    def put(self, redirect: Redirect) -> None:
+        raise NotImplementedError
+
+    def delete(self, short_code: str) -> None:
+        raise NotImplementedError
+
+    def put_many(self, redirects: list) -> None:
+        for redirect in redirects:
+            self.put(redirect)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryRedirectStore(RedirectStore):
+    """Per-process LRU: past `maxsize` links, the least recently used go first."""
+
+    def __init__(self, ttl: float = store_ttl(shared=False), maxsize: int = REDIRECT_STORE_SIZE):
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl or None)
+
+    def get(self, short_code: str) -> Optional[Redirect]:
+        return self._cache.get(short_code)
+
+    def put(self, redirect: Redirect) -> None:
+        self._cache.set(redirect.short_code, redirect)
+
+    def delete(self, short_code: str) -> None:
+        self._cache.pop(short_code)
+
+
+class SQLiteRedirectStore(RedirectStore):
+    """A single-table SQLite file used as a key/value store.
+
+    Lookups are a primary-key probe on a WITHOUT ROWID table through
+    memory-mapped pages, so they stay in the microseconds and never wait on
+    analytics queries. WAL lets every worker process read while one writes.
+    Connections are per thread, as sqlite3 requires.
+    """
+
+    # get() skips expired rows; they are deleted at most this often (seconds)
+    PRUNE_INTERVAL = 60
+
+    PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 64 * 1024 * 1024,
+    }
+
+    def __init__(self, path: str, ttl: float = store_ttl(shared=False)):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS redirects ("
+            "short_code TEXT PRIMARY KEY, url_id INTEGER NOT NULL, "
+            "original_url TEXT NOT NULL, expires_at REAL) WITHOUT ROWID"
+        )
+        self._connection().execute(
+            "CREATE INDEX IF NOT EXISTS redirects_expires_at ON redirects (expires_at)"
+        )
+        self._next_prune = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every put/delete is its own short transaction
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            for name, value in self.PRAGMAS.items():
+                conn.execute(f"PRAGMA {name}={value}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, short_code: str) -> Optional[Redirect]:
+        row = self._connection().execute(
+            "SELECT url_id, original_url FROM redirects "
+            "WHERE short_code = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (short_code, time.time())
+        ).fetchone()
+        return Redirect(row[0], short_code, row[1]) if row else None
+
+    def put(self, redirect: Redirect) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self._connection().execute(
+            "INSERT OR REPLACE INTO redirects (short_code, url_id, original_url, expires_at) VALUES (?, ?, ?, ?)",
+            (redirect.short_code, redirect.id, redirect.original_url, expires_at)
+        )
+        if self.ttl and time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def put_many(self, redirects: list) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        conn = self._connection()
+        # One transaction, so one WAL commit for the whole batch
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO redirects (short_code, url_id, original_url, expires_at) VALUES (?, ?, ?, ?)",
+                [(r.short_code, r.id, r.original_url, expires_at) for r in redirects]
+            )
+        if self.ttl and time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete expired rows."""
+        self._next_prune = time.monotonic() + self.PRUNE_INTERVAL
+        self._connection().execute("DELETE FROM redirects WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, short_code: str) -> None:
+        self._connection().execute("DELETE FROM redirects WHERE short_code = ?", (short_code,))
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def create_store(url: str) -> Optional[RedirectStore]:
+    if not url or url.lower() == "off":
+        return None
+    if url == "memory":
+        return MemoryRedirectStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteRedirectStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHRTNR_REDIRECT_STORE: {url}")
+
+
+redirect_store = create_store(REDIRECT_STORE)
+
+
+def lookup(short_code: str) -> Optional[Redirect]:
+    return redirect_store.get(short_code) if redirect_store else None
+
+
+def remember(url) -> None:
+    if redirect_store:
+        redirect_store.put(Redirect(url.id, url.short_code, url.original_url))
+
+
+def forget(short_code: str) -> None:
+    if redirect_store:
+        redirect_store.delete(short_code)
+
+
+def warm(hot_links, chunk_size=100):
+    """Load the hottest links into the store within REDIRECT_WARM_BUDGET.
+
+    hot_links(since, limit, deadline) returns [Redirect], hottest first, and
+    gives up with TimeoutError at deadline (a time.perf_counter() value).
+    """
+    if not redirect_store or REDIRECT_WARM_LINKS <= 0:
+        return 0
+    start = time.perf_counter()
+    deadline = start + REDIRECT_WARM_BUDGET
+    loaded = 0
+    try:
+        redirects = hot_links(
+            datetime.utcnow() - timedelta(days=REDIRECT_WARM_DAYS), REDIRECT_WARM_LINKS, deadline
+        )
+        while loaded < len(redirects) and time.perf_counter() < deadline:
+            chunk = redirects[loaded:loaded + chunk_size]
+            redirect_store.put_many(chunk)
+            loaded += len(chunk)
+    except TimeoutError:
+        logger.warning("Warm-up query took longer than %.1fs; starting cold", REDIRECT_WARM_BUDGET)
+    except Exception:
+        # A cold store is slower, not wrong: never fail the cold start over it
+        logger.exception("Warm-up of the redirect store failed")
+    logger.info(
+        "Warmed the redirect store with %d links in %.3fs", loaded, time.perf_counter() - start,
+        extra={"links": loaded, "seconds": time.perf_counter() - start},
+    )
+    return loaded
@@ -0,0 +1,62 @@
+"""Read-replica selection and the read-your-writes window."""
+import itertools
+import os
+import threading
+import time
+from typing import Optional
+
+from api._cache import TTLCache
+
+# Comma-separated read replicas of DATABASE_URL. Reads that can tolerate a
+# little lag go to them; writes, auth and uniqueness checks stay on the primary.
+REPLICA_URLS = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# A replica whose query failed is skipped for this long, then tried again
+REPLICA_RETRY_AFTER = float(os.environ.get("SHRTNR_REPLICA_RETRY_AFTER", "30"))
+# Links and API keys written in this instance are read from the primary for
+# this long, so a freshly created link resolves before replication catches up
+READ_YOUR_WRITES = float(os.environ.get("SHRTNR_READ_YOUR_WRITES", "5"))
+
+_recent_writes = TTLCache(maxsize=10000, ttl=READ_YOUR_WRITES)
+
+
+class ReplicaSet:
+    """Round-robin over replicas, skipping any marked down.
+
+    Health is checked passively: a replica is marked down when a query on
+    it fails, and its next query after REPLICA_RETRY_AFTER is the probe.
+    Callers fall back to the primary either way.
+    """
+
+    def __init__(self, count: int, retry_after: float = REPLICA_RETRY_AFTER):
+        self.count = count
+        self.retry_after = retry_after
+        self._down_until = [0.0] * count
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def pick(self) -> Optional[int]:
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(self.count):
+                index = next(self._counter) % self.count
+                if self._down_until[index] <= now:
+                    return index
+        return None
+
+    def mark_down(self, index: int) -> None:
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_after
+
+
+def note_write(short_code: Optional[str] = None, api_key_id: Optional[int] = None) -> None:
+    if short_code is not None:
+        _recent_writes.set(("code", short_code), True)
+    if api_key_id is not None:
+        _recent_writes.set(("key", api_key_id), True)
+
+
+def recently_written(short_code: Optional[str] = None, api_key_id: Optional[int] = None) -> bool:
+    return (
+        (short_code is not None and _recent_writes.get(("code", short_code)) is not None)
+        or (api_key_id is not None and _recent_writes.get(("key", api_key_id)) is not None)
+    )
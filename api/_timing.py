@@ -0,0 +1,84 @@
+"""Server-Timing phase timings for the serverless handlers."""
+import functools
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+# Per-request phase timings (lookup, click, db, render, serialize, total),
+# sent as a Server-Timing header and logged at INFO on "shrtnr.timing".
+# Off by default; when off @timed returns the handler method unchanged and
+# phase() is a context variable read returning a shared no-op.
+SERVER_TIMING = os.environ.get("SHRTNR_SERVER_TIMING", "off").lower() in ("on", "1", "true")
+
+logger = logging.getLogger("shrtnr.timing")
+
+_current = ContextVar("timings", default=None)
+_NO_PHASE = nullcontext()
+
+
+class Timings:
+    """Milliseconds per phase for one request; repeated phases add up."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.status = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def total(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self):
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.phases.items()]
+        entries.append(f"total;dur={self.total():.2f}")
+        return ", ".join(entries)
+
+    def log(self, method, path):
+        fields = {name: round(ms, 2) for name, ms in self.phases.items()}
+        fields["total"] = round(self.total(), 2)
+        logger.info(
+            "%s %s %s %s", method, path, self.status, " ".join(f"{name}={ms}ms" for name, ms in fields.items()),
+            extra={"http_method": method, "path": path, "status": self.status, "timings": fields},
+        )
+
+
+def phase(name):
+    """Context manager timing one phase of the current request, if timing is on."""
+    timings = _current.get()
+    return timings.phase(name) if timings is not None else _NO_PHASE
+
+
+def timing_headers(status):
+    """{"Server-Timing": ...} for a response about to be sent, or {} when timing is off."""
+    timings = _current.get()
+    if timings is None:
+        return {}
+    timings.status = status
+    return {"Server-Timing": timings.header()}
+
+
+def timed(method):
+    """Time a do_GET/do_POST/do_DELETE method and log its phases."""
+    if not SERVER_TIMING:
+        return method
+
+    @functools.wraps(method)
+    def wrapper(handler):
+        timings = Timings()
+        token = _current.set(timings)
+        try:
+            return method(handler)
+        finally:
+            _current.reset(token)
+            timings.log(handler.command, handler.path.split('?', 1)[0])
+
+    return wrapper
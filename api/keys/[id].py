@@ -1,8 +1,11 @@
 """DELETE /api/keys/:id - Revoke API key"""
-import json
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse
-from api._db import get_db, APIKey, init_db
+from api._auth import authenticate_request, invalidate
+from api._db import get_db, APIKey, send_json, init_db
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._timing import phase, timed
 
 init_db()
 
@@ -22,8 +25,14 @@ class handler(BaseHTTPRequestHandler):
             return self.do_DELETE()
         self.send_json({"detail": "Use DELETE or X-HTTP-Method-Override: DELETE"}, 405)
 
+    @timed
+    @profiled("DELETE /api/keys/{id}")
     def do_DELETE(self):
+        db = None
         try:
+            if not check_rate_limit(self, 'write', authenticate_request(self)):
+                return
+
             # Extract key ID from path like /api/keys/123
             parsed = urlparse(self.path)
             parts = parsed.path.strip('/').split('/')
@@ -33,24 +42,26 @@ class handler(BaseHTTPRequestHandler):
                 self.send_json({"detail": "Key ID required"}, 400)
                 return
 
-            db = next(get_db())
-            api_key = db.query(APIKey).filter(APIKey.id == key_id).first()
+            with phase("db"):
+                db = next(get_db())
+                api_key = db.query(APIKey).filter(APIKey.id == key_id).first()
 
             if not api_key:
                 self.send_json({"detail": "API key not found"}, 404)
                 return
 
-            api_key.is_active = False
-            db.commit()
+            with phase("db"):
+                api_key.is_active = False
+                db.commit()
+            invalidate(api_key.key)
 
             self.send_json({"message": "API key revoked"})
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
@@ -1,7 +1,12 @@
 """GET/POST /api/keys - API key management"""
 import json
 from http.server import BaseHTTPRequestHandler
-from api._db import get_db, APIKey, init_db
+from api._auth import authenticate_request
+from api._db import get_db, APIKey, send_json, init_db
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._serializers import encode_api_key
+from api._timing import phase, timed
 
 init_db()
 
@@ -14,26 +19,34 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
 
+    @timed
+    @profiled("GET /api/keys")
     def do_GET(self):
+        db = None
         try:
-            db = next(get_db())
-            keys = db.query(APIKey).filter(APIKey.is_active == True).all()
+            if not check_rate_limit(self, 'read', authenticate_request(self)):
+                return
 
-            results = [{
-                "id": key.id,
-                "key": key.key,
-                "name": key.name,
-                "created_at": key.created_at.isoformat(),
-                "is_active": key.is_active
-            } for key in keys]
+            with phase("db"):
+                db = next(get_db())
+                keys = db.query(APIKey).filter(APIKey.is_active == True).all()
 
-            self.send_json(results)
+            self.send_json([encode_api_key(key) for key in keys])
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
 
+    @timed
+    @profiled("POST /api/keys")
     def do_POST(self):
+        db = None
         try:
+            if not check_rate_limit(self, 'write', authenticate_request(self)):
+                return
+
             content_length = int(self.headers.get('Content-Length', 0))
             body = self.rfile.read(content_length)
             data = json.loads(body) if body else {}
@@ -43,26 +56,20 @@ class handler(BaseHTTPRequestHandler):
                 self.send_json({"detail": "Name is required"}, 400)
                 return
 
-            db = next(get_db())
-            api_key = APIKey(name=name)
-            db.add(api_key)
-            db.commit()
-            db.refresh(api_key)
+            with phase("db"):
+                db = next(get_db())
+                api_key = APIKey(name=name)
+                db.add(api_key)
+                db.commit()
+                db.refresh(api_key)
 
-            self.send_json({
-                "id": api_key.id,
-                "key": api_key.key,
-                "name": api_key.name,
-                "created_at": api_key.created_at.isoformat(),
-                "is_active": api_key.is_active
-            })
+            self.send_json(encode_api_key(api_key))
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
@@ -1,11 +1,58 @@
 """GET /:code - Redirect handler with viral interstitial"""
-import json
+import time
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-from api._db import get_db, URL, Click, BASE_URL, init_db
+from sqlalchemy import func, desc
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from api._db import get_db, read, time_limit, URL, Click, BASE_URL, send_body, send_json, init_db
+from api._query_profile import profiled
+from api._redirects import Redirect, forget, lookup, remember, warm
+from api._timing import phase, timed, timing_headers
 
 init_db()
 
+
+def hot_links(since, limit, deadline):
+    """[Redirect] for the links with most clicks since `since`, most first; TimeoutError past `deadline`."""
+    def top(session):
+        recent_clicks = func.count(Click.id).label('recent_clicks')
+        try:
+            with time_limit(session, deadline):
+                return (
+                    session.query(URL.id, URL.short_code, URL.original_url)
+                    .join(Click, Click.url_id == URL.id)
+                    .filter(Click.clicked_at >= since)
+                    .group_by(URL.id)
+                    .order_by(desc(recent_clicks))
+                    .limit(limit)
+                    .all()
+                )
+        except DBAPIError:
+            if time.perf_counter() < deadline:
+                raise
+            # Our own timeout: not a reason for read() to mark a replica down
+            return None
+
+    rows = read(top)
+    if rows is None:
+        raise TimeoutError("hot links query ran past the warm-up budget")
+    return [Redirect(*row) for row in rows]
+
+
+def find_url(short_code):
+    """The URL row from SQL, remembered in the redirect store; None if there is none."""
+    url = read(
+        lambda session: session.query(URL).filter(URL.short_code == short_code).first(),
+        short_code=short_code
+    )
+    if url:
+        remember(url)
+    return url
+
+
+# Once per cold start, before the first request
+warm(hot_links)
+
 INTERSTITIAL_HTML = """
 <!DOCTYPE html>
 <html lang="en">
@@ -77,7 +124,10 @@ INTERSTITIAL_HTML = """
 
 
 class handler(BaseHTTPRequestHandler):
+    @timed
+    @profiled("GET /{code}")
     def do_GET(self):
+        db = None
         try:
             # Parse the path to get short code
             parsed = urlparse(self.path)
@@ -91,22 +141,35 @@ class handler(BaseHTTPRequestHandler):
                 self.send_error(404, "Not found")
                 return
 
-            db = next(get_db())
-            url = db.query(URL).filter(URL.short_code == short_code).first()
+            with phase("lookup"):
+                url = lookup(short_code) or find_url(short_code)
 
             if not url:
                 self.send_error(404, "URL not found")
                 return
 
-            # Record click
-            click = Click(
-                url_id=url.id,
-                ip_address=self.headers.get('X-Forwarded-For', self.client_address[0] if self.client_address else None),
-                user_agent=self.headers.get('User-Agent'),
-                referer=self.headers.get('Referer')
-            )
-            db.add(click)
-            db.commit()
+            # Record click on the primary
+            with phase("click"):
+                db = next(get_db())
+                click = dict(
+                    ip_address=self.headers.get('X-Forwarded-For', self.client_address[0] if self.client_address else None),
+                    user_agent=self.headers.get('User-Agent'),
+                    referer=self.headers.get('Referer')
+                )
+                db.add(Click(url_id=url.id, **click))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # The store outlived a link deleted on another instance:
+                    # drop the entry and ask SQL again
+                    db.rollback()
+                    forget(short_code)
+                    url = find_url(short_code)
+                    if not url:
+                        self.send_error(404, "URL not found")
+                        return
+                    db.add(Click(url_id=url.id, **click))
+                    db.commit()
 
             # Check if direct redirect requested
             direct = 'direct' in query and query['direct'][0].lower() == 'true'
@@ -116,20 +179,20 @@ class handler(BaseHTTPRequestHandler):
                 self.send_response(307)
                 self.send_header('Location', url.original_url)
                 self.send_header('Access-Control-Allow-Origin', '*')
+                for name, value in timing_headers(307).items():
+                    self.send_header(name, value)
                 self.end_headers()
             else:
                 # Show interstitial
-                html = INTERSTITIAL_HTML.format(
-                    destination=url.original_url,
-                    base_url=BASE_URL
-                )
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html')
-                self.end_headers()
-                self.wfile.write(html.encode())
+                with phase("render"):
+                    html = INTERSTITIAL_HTML.format(
+                        destination=url.original_url,
+                        base_url=BASE_URL
+                    )
+                send_body(self, html.encode(), 'text/html')
 
         except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"detail": str(e)}).encode())
+            send_json(self, {"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
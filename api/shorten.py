@@ -3,9 +3,17 @@ import json
 import secrets
 import string
 from http.server import BaseHTTPRequestHandler
-from api._db import get_db, URL, APIKey, BASE_URL, json_response, init_db
+from api._auth import authenticate
+from api._db import get_db, URL, BASE_URL, json_response, send_json, init_db
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._redirects import remember
+from api._replicas import note_write
+from api._serializers import url_encoder
+from api._timing import phase, timed
 
 init_db()
+encode_url = url_encoder(BASE_URL)
 
 
 def generate_short_code(length=6):
@@ -21,7 +29,10 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-API-Key')
         self.end_headers()
 
+    @timed
+    @profiled("POST /api/shorten")
     def do_POST(self):
+        db = None
         try:
             content_length = int(self.headers.get('Content-Length', 0))
             body = self.rfile.read(content_length)
@@ -41,52 +52,43 @@ class handler(BaseHTTPRequestHandler):
             db = next(get_db())
 
             # Get API key if provided
-            api_key_header = self.headers.get('X-API-Key')
-            api_key = None
-            if api_key_header:
-                api_key = db.query(APIKey).filter(
-                    APIKey.key == api_key_header,
-                    APIKey.is_active == True
-                ).first()
-
-            # Handle custom code
-            if custom_code:
-                existing = db.query(URL).filter(URL.short_code == custom_code).first()
-                if existing:
-                    self.send_json({"detail": "Custom code already taken"}, 400)
-                    return
-                short_code = custom_code
-            else:
-                while True:
-                    short_code = generate_short_code()
-                    if not db.query(URL).filter(URL.short_code == short_code).first():
-                        break
-
-            # Create URL
-            db_url = URL(
-                original_url=url,
-                short_code=short_code,
-                api_key_id=api_key.id if api_key else None
-            )
-            db.add(db_url)
-            db.commit()
-            db.refresh(db_url)
-
-            self.send_json({
-                "id": db_url.id,
-                "original_url": db_url.original_url,
-                "short_code": db_url.short_code,
-                "created_at": db_url.created_at.isoformat(),
-                "click_count": 0,
-                "short_url": f"{BASE_URL}/{db_url.short_code}"
-            })
+            api_key = authenticate(db, self.headers.get('X-API-Key'))
+            if not check_rate_limit(self, 'shorten', api_key):
+                return
+
+            with phase("db"):
+                # Handle custom code
+                if custom_code:
+                    existing = db.query(URL).filter(URL.short_code == custom_code).first()
+                    if existing:
+                        self.send_json({"detail": "Custom code already taken"}, 400)
+                        return
+                    short_code = custom_code
+                else:
+                    while True:
+                        short_code = generate_short_code()
+                        if not db.query(URL).filter(URL.short_code == short_code).first():
+                            break
+
+                # Create URL
+                db_url = URL(
+                    original_url=url,
+                    short_code=short_code,
+                    api_key_id=api_key.id if api_key else None
+                )
+                db.add(db_url)
+                db.commit()
+                db.refresh(db_url)
+            note_write(short_code, db_url.api_key_id)
+            remember(db_url)
+
+            self.send_json(encode_url(db_url, 0))
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
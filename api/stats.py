@@ -1,9 +1,13 @@
 """GET /api/stats - Global statistics"""
-import json
 from http.server import BaseHTTPRequestHandler
 from datetime import datetime
 from sqlalchemy import func
-from api._db import get_db, URL, Click, init_db
+from api._auth import authenticate_request
+from api._db import read, URL, Click, send_json, init_db
+from api._httpcache import STATS_CACHE_CONTROL, send_conditional_json
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._timing import phase, timed
 
 init_db()
 
@@ -15,34 +19,33 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
         self.end_headers()
 
+    @timed
+    @profiled("GET /api/stats")
     def do_GET(self):
         try:
-            db = next(get_db())
-
-            total_urls = db.query(func.count(URL.id)).scalar()
-            total_clicks = db.query(func.count(Click.id)).scalar()
+            if not check_rate_limit(self, 'read', authenticate_request(self)):
+                return
 
             today = datetime.utcnow().date()
-            urls_today = db.query(func.count(URL.id)).filter(
-                func.date(URL.created_at) == today
-            ).scalar()
-            clicks_today = db.query(func.count(Click.id)).filter(
-                func.date(Click.clicked_at) == today
-            ).scalar()
-
-            self.send_json({
-                "total_urls": total_urls or 0,
-                "total_clicks": total_clicks or 0,
-                "urls_today": urls_today or 0,
-                "clicks_today": clicks_today or 0
-            })
+
+            def counts(db):
+                return {
+                    "total_urls": db.query(func.count(URL.id)).scalar() or 0,
+                    "total_clicks": db.query(func.count(Click.id)).scalar() or 0,
+                    "urls_today": db.query(func.count(URL.id)).filter(
+                        func.date(URL.created_at) == today
+                    ).scalar() or 0,
+                    "clicks_today": db.query(func.count(Click.id)).filter(
+                        func.date(Click.clicked_at) == today
+                    ).scalar() or 0
+                }
+
+            with phase("db"):
+                stats = read(counts)
+            send_conditional_json(self, stats, STATS_CACHE_CONTROL)
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
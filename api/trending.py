@@ -1,11 +1,17 @@
 """GET /api/trending - Trending URLs"""
-import json
 from http.server import BaseHTTPRequestHandler
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
-from api._db import get_db, URL, Click, BASE_URL, init_db
+from api._auth import authenticate_request
+from api._db import read, click_count, URL, Click, BASE_URL, send_json, init_db
+from api._httpcache import TRENDING_CACHE_CONTROL, send_conditional_json
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._serializers import url_encoder
+from api._timing import phase, timed
 
 init_db()
+encode_url = url_encoder(BASE_URL)
 
 
 class handler(BaseHTTPRequestHandler):
@@ -15,40 +21,39 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
         self.end_headers()
 
+    @timed
+    @profiled("GET /api/trending")
     def do_GET(self):
         try:
-            db = next(get_db())
+            if not check_rate_limit(self, 'read', authenticate_request(self)):
+                return
 
             seven_days_ago = datetime.utcnow() - timedelta(days=7)
 
-            trending_query = (
-                db.query(URL, func.count(Click.id).label('recent_clicks'))
-                .join(Click, Click.url_id == URL.id)
-                .filter(Click.clicked_at >= seven_days_ago)
-                .group_by(URL.id)
-                .order_by(desc('recent_clicks'))
-                .limit(10)
-            )
-
-            results = []
-            for url, recent_clicks in trending_query:
-                results.append({
-                    "id": url.id,
-                    "original_url": url.original_url[:50] + "..." if len(url.original_url) > 50 else url.original_url,
-                    "short_code": url.short_code,
-                    "created_at": url.created_at.isoformat(),
-                    "click_count": url.click_count,
-                    "short_url": f"{BASE_URL}/{url.short_code}"
-                })
-
-            self.send_json(results)
+            def trending(db):
+                trending_query = (
+                    db.query(URL, click_count(), func.count(Click.id).label('recent_clicks'))
+                    .join(Click, Click.url_id == URL.id)
+                    .filter(Click.clicked_at >= seven_days_ago)
+                    .group_by(URL.id)
+                    .order_by(desc('recent_clicks'))
+                    .limit(10)
+                )
+
+                results = []
+                for url, total_clicks, recent_clicks in trending_query:
+                    row = encode_url(url, total_clicks)
+                    if len(url.original_url) > 50:
+                        row["original_url"] = url.original_url[:50] + "..."
+                    results.append(row)
+                return results
+
+            with phase("db"):
+                results = read(trending)
+            send_conditional_json(self, results, TRENDING_CACHE_CONTROL)
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
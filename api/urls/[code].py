@@ -1,10 +1,18 @@
 """GET/DELETE /api/urls/:code - URL stats and deletion"""
-import json
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse
 from datetime import datetime, timedelta
 from collections import defaultdict
-from api._db import get_db, URL, Click, APIKey, BASE_URL, init_db
+from sqlalchemy import func, desc
+from api._auth import authenticate, authenticate_request
+from api._db import get_db, read, URL, Click, send_json, init_db
+from api._query_profile import profiled
+from api._redirects import forget
+from api._replicas import note_write
+from api._httpcache import URL_STATS_CACHE_CONTROL, etag_matches, make_etag, send_conditional_json, send_not_modified
+from api._ratelimit import check_rate_limit
+from api._serializers import encode_url_stats
+from api._timing import phase, timed
 
 init_db()
 
@@ -33,58 +41,83 @@ class handler(BaseHTTPRequestHandler):
             return parts[2]
         return None
 
+    @timed
+    @profiled("GET /api/urls/{code}")
     def do_GET(self):
         try:
+            if not check_rate_limit(self, 'read', authenticate_request(self)):
+                return
+
             short_code = self.get_code()
             if not short_code:
                 self.send_json({"detail": "Short code required"}, 400)
                 return
 
-            db = next(get_db())
-            url = db.query(URL).filter(URL.short_code == short_code).first()
-
-            if not url:
+            # Cheap version probe: stats only change when clicks are added
+            # or the 30-day window rolls over
+            with phase("db"):
+                row = read(
+                    lambda db: (
+                        db.query(URL, func.count(Click.id), func.max(Click.id))
+                        .outerjoin(Click, Click.url_id == URL.id)
+                        .filter(URL.short_code == short_code)
+                        .group_by(URL.id)
+                        .first()
+                    ),
+                    short_code=short_code
+                )
+
+            if not row:
                 self.send_json({"detail": "URL not found"}, 404)
                 return
 
-            # Get clicks by day (last 30 days)
+            url, total_clicks, last_click_id = row
+            etag = make_etag(url.id, total_clicks, last_click_id, datetime.utcnow().date())
+            if etag_matches(self, etag):
+                send_not_modified(self, etag, URL_STATS_CACHE_CONTROL)
+                return
+
             thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            clicks = db.query(Click).filter(
-                Click.url_id == url.id,
-                Click.clicked_at >= thirty_days_ago
-            ).all()
-
-            clicks_by_day = defaultdict(int)
-            for click in clicks:
-                day = click.clicked_at.strftime("%Y-%m-%d")
-                clicks_by_day[day] += 1
-
-            # Get top referers
-            referer_counts = defaultdict(int)
-            for click in url.clicks:
-                ref = click.referer or "Direct"
-                referer_counts[ref] += 1
-
-            top_referers = [
-                {"referer": ref, "count": count}
-                for ref, count in sorted(referer_counts.items(), key=lambda x: -x[1])[:5]
-            ]
-
-            self.send_json({
-                "id": url.id,
-                "original_url": url.original_url,
-                "short_code": url.short_code,
-                "created_at": url.created_at.isoformat(),
-                "click_count": url.click_count,
-                "clicks": [],
-                "clicks_by_day": dict(clicks_by_day),
-                "top_referers": top_referers
-            })
+
+            def click_stats(db):
+                # Get clicks by day (last 30 days)
+                clicks = db.query(Click.clicked_at).filter(
+                    Click.url_id == url.id,
+                    Click.clicked_at >= thirty_days_ago
+                )
+
+                clicks_by_day = defaultdict(int)
+                for (clicked_at,) in clicks:
+                    clicks_by_day[clicked_at.strftime("%Y-%m-%d")] += 1
+
+                # Get top referers
+                referer = func.coalesce(Click.referer, "Direct")
+                top_referers = [
+                    {"referer": ref, "count": count}
+                    for ref, count in (
+                        db.query(referer, func.count(Click.id).label('count'))
+                        .filter(Click.url_id == url.id)
+                        .group_by(referer)
+                        .order_by(desc('count'))
+                        .limit(5)
+                    )
+                ]
+                return dict(clicks_by_day), top_referers
+
+            with phase("db"):
+                clicks_by_day, top_referers = read(click_stats, short_code=short_code)
+
+            with phase("serialize"):
+                stats = encode_url_stats(url, total_clicks, clicks_by_day, top_referers)
+            send_conditional_json(self, stats, URL_STATS_CACHE_CONTROL, etag=etag)
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
 
+    @timed
+    @profiled("DELETE /api/urls/{code}")
     def do_DELETE(self):
+        db = None
         try:
             short_code = self.get_code()
             if not short_code:
@@ -92,33 +125,34 @@ class handler(BaseHTTPRequestHandler):
                 return
 
             db = next(get_db())
-            url = db.query(URL).filter(URL.short_code == short_code).first()
+            api_key = authenticate(db, self.headers.get('X-API-Key'))
+            if not check_rate_limit(self, 'write', api_key):
+                return
+
+            with phase("db"):
+                url = db.query(URL).filter(URL.short_code == short_code).first()
 
             if not url:
                 self.send_json({"detail": "URL not found"}, 404)
                 return
 
             # Check API key authorization
-            api_key_header = self.headers.get('X-API-Key')
-            if api_key_header:
-                api_key = db.query(APIKey).filter(
-                    APIKey.key == api_key_header,
-                    APIKey.is_active == True
-                ).first()
-                if api_key and url.api_key_id != api_key.id:
-                    self.send_json({"detail": "Not authorized"}, 403)
-                    return
-
-            db.delete(url)
-            db.commit()
+            if api_key and url.api_key_id != api_key.id:
+                self.send_json({"detail": "Not authorized"}, 403)
+                return
+
+            with phase("db"):
+                db.delete(url)
+                db.commit()
+            note_write(short_code, url.api_key_id)
+            forget(short_code)
             self.send_json({"message": "URL deleted successfully"})
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
@@ -1,11 +1,17 @@
-"""GET /api/urls/:code/qr - Generate QR code"""
-import json
-import qrcode
-import io
+"""GET /api/urls/:code/qr - Generate QR code (?format=json|png|svg&size=&ec=&border=)"""
 import base64
 from http.server import BaseHTTPRequestHandler
-from urllib.parse import urlparse
-from api._db import get_db, URL, BASE_URL, init_db
+from urllib.parse import urlparse, parse_qs
+from api._auth import authenticate_request
+from api._db import read, URL, BASE_URL, send_body, send_json, init_db
+from api._httpcache import etag_matches, send_not_modified
+from api._qr import (
+    DEFAULT_BORDER, DEFAULT_BOX_SIZE, DEFAULT_ERROR_CORRECTION, ERROR_CORRECTION_LEVELS,
+    MAX_BORDER, MAX_BOX_SIZE, MEDIA_TYPES, QR_CACHE_CONTROL, QRParams, get_qr, qr_cache_key
+)
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._timing import phase, timed
 
 init_db()
 
@@ -17,46 +23,77 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
         self.end_headers()
 
+    @timed
+    @profiled("GET /api/urls/{code}/qr")
     def do_GET(self):
         try:
+            if not check_rate_limit(self, 'qr', authenticate_request(self)):
+                return
+
             # Extract short code from path like /api/urls/abc123/qr
             parsed = urlparse(self.path)
             parts = parsed.path.strip('/').split('/')
             short_code = parts[2] if len(parts) >= 4 else None
+            query = parse_qs(parsed.query)
+            fmt = query.get('format', ['json'])[0]
 
             if not short_code:
                 self.send_json({"detail": "Short code required"}, 400)
                 return
 
-            db = next(get_db())
-            url = db.query(URL).filter(URL.short_code == short_code).first()
+            if fmt not in ('json', 'png', 'svg'):
+                self.send_json({"detail": "format must be json, png or svg"}, 400)
+                return
 
-            if not url:
-                self.send_json({"detail": "URL not found"}, 404)
+            try:
+                params = QRParams(
+                    box_size=int(query.get('size', [DEFAULT_BOX_SIZE])[0]),
+                    border=int(query.get('border', [DEFAULT_BORDER])[0]),
+                    error_correction=query.get('ec', [DEFAULT_ERROR_CORRECTION])[0].upper(),
+                )
+            except ValueError:
+                self.send_json({"detail": "size and border must be integers"}, 400)
+                return
+            if not 1 <= params.box_size <= MAX_BOX_SIZE or not 0 <= params.border <= MAX_BORDER:
+                self.send_json({"detail": f"size must be 1-{MAX_BOX_SIZE} and border 0-{MAX_BORDER}"}, 400)
+                return
+            if params.error_correction not in ERROR_CORRECTION_LEVELS:
+                self.send_json({"detail": "ec must be one of L, M, Q, H"}, 400)
                 return
 
-            short_url = f"{BASE_URL}/{url.short_code}"
+            with phase("db"):
+                exists = read(
+                    lambda session: session.query(URL.id).filter(URL.short_code == short_code).first(),
+                    short_code=short_code
+                )
 
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(short_url)
-            qr.make(fit=True)
+            if not exists:
+                self.send_json({"detail": "URL not found"}, 404)
+                return
 
-            img = qr.make_image(fill_color="black", back_color="white")
+            short_url = f"{BASE_URL}/{short_code}"
 
-            buffer = io.BytesIO()
-            img.save(buffer, format="PNG")
-            buffer.seek(0)
+            # The image only depends on the short URL, so revalidation never renders
+            image_format = 'png' if fmt == 'json' else fmt
+            key = qr_cache_key(short_url, image_format, params)
+            etag = f'"{key}-{fmt}"'
+            if etag_matches(self, etag):
+                send_not_modified(self, etag, QR_CACHE_CONTROL)
+                return
 
-            qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+            with phase("render"):
+                _, image = get_qr(short_url, image_format, params)
+            headers = {'ETag': etag, 'Cache-Control': QR_CACHE_CONTROL}
+            if fmt != 'json':
+                send_body(self, image, MEDIA_TYPES[fmt], headers=headers)
+                return
 
-            self.send_json({"qr_code": f"data:image/png;base64,{qr_base64}"})
+            with phase("serialize"):
+                qr_base64 = base64.b64encode(image).decode()
+            send_json(self, {"qr_code": f"data:image/png;base64,{qr_base64}"}, headers=headers)
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
@@ -1,10 +1,18 @@
-"""GET /api/urls - List URLs"""
-import json
+"""GET /api/urls - List URLs (offset or keyset cursor pagination)"""
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-from api._db import get_db, URL, APIKey, BASE_URL, init_db
+from sqlalchemy import tuple_
+from api._auth import authenticate
+from api._db import get_db, read, click_count, URL, BASE_URL, send_json, init_db
+from api._httpcache import PRIVATE_CACHE_CONTROL, send_conditional_json
+from api._pagination import MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+from api._query_profile import profiled
+from api._ratelimit import check_rate_limit
+from api._serializers import url_encoder
+from api._timing import phase, timed
 
 init_db()
+encode_url = url_encoder(BASE_URL)
 
 
 class handler(BaseHTTPRequestHandler):
@@ -15,47 +23,74 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-API-Key')
         self.end_headers()
 
+    @timed
+    @profiled("GET /api/urls")
     def do_GET(self):
+        db = None
         try:
             parsed = urlparse(self.path)
-            query = parse_qs(parsed.query)
-            limit = int(query.get('limit', [50])[0])
-            offset = int(query.get('offset', [0])[0])
+            query = parse_qs(parsed.query, keep_blank_values=True)
+            cursor = query.get('cursor', [None])[0]
+            try:
+                limit = int(query.get('limit', [50])[0])
+                offset = int(query.get('offset', [0])[0])
+            except ValueError:
+                self.send_json({"detail": "limit and offset must be integers"}, 400)
+                return
+            if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+                self.send_json({"detail": f"limit must be 1-{MAX_PAGE_SIZE} and offset at least 0"}, 400)
+                return
 
             db = next(get_db())
 
             # Get API key if provided
-            api_key_header = self.headers.get('X-API-Key')
-            api_key = None
-            if api_key_header:
-                api_key = db.query(APIKey).filter(
-                    APIKey.key == api_key_header,
-                    APIKey.is_active == True
-                ).first()
-
-            query_obj = db.query(URL)
-            if api_key:
-                query_obj = query_obj.filter(URL.api_key_id == api_key.id)
-
-            urls = query_obj.order_by(URL.created_at.desc()).offset(offset).limit(limit).all()
-
-            results = [{
-                "id": url.id,
-                "original_url": url.original_url,
-                "short_code": url.short_code,
-                "created_at": url.created_at.isoformat(),
-                "click_count": url.click_count,
-                "short_url": f"{BASE_URL}/{url.short_code}"
-            } for url in urls]
-
-            self.send_json(results)
+            api_key = authenticate(db, self.headers.get('X-API-Key'))
+            if not check_rate_limit(self, 'read', api_key):
+                return
+
+            if cursor:
+                try:
+                    created_at, last_id = decode_cursor(cursor)
+                except InvalidCursor as e:
+                    self.send_json({"detail": str(e)}, 400)
+                    return
+
+            api_key_id = api_key.id if api_key else None
+
+            def page(db):
+                query_obj = db.query(URL, click_count())
+                if api_key_id:
+                    query_obj = query_obj.filter(URL.api_key_id == api_key_id)
+
+                query_obj = query_obj.order_by(URL.created_at.desc(), URL.id.desc())
+                if cursor:
+                    query_obj = query_obj.filter(tuple_(URL.created_at, URL.id) < tuple_(created_at, last_id))
+                elif cursor is None:
+                    query_obj = query_obj.offset(offset)
+
+                return query_obj.limit(limit).all()
+
+            with phase("db"):
+                rows = read(page, api_key_id=api_key_id)
+
+            with phase("serialize"):
+                results = [encode_url(url, clicks) for url, clicks in rows]
+
+            if cursor is None:
+                send_conditional_json(self, results, PRIVATE_CACHE_CONTROL)
+                return
+
+            next_cursor = None
+            if len(rows) == limit:
+                last = rows[-1][0]
+                next_cursor = encode_cursor(last.created_at, last.id)
+            send_conditional_json(self, {"items": results, "next_cursor": next_cursor}, PRIVATE_CACHE_CONTROL)
 
         except Exception as e:
             self.send_json({"detail": str(e)}, 500)
+        finally:
+            if db is not None:
+                db.close()
 
     def send_json(self, data, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode())
+        send_json(self, data, status)
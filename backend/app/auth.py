@@ -0,0 +1,49 @@
+import hashlib
+import os
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from .cache import TTLCache
+from .models import APIKey
+
+# Positive entries are evicted on revocation in this process; other workers
+# pick up a revocation once their entry expires, so keep the TTL short.
+AUTH_CACHE_TTL = float(os.getenv("SHRTNR_AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_NEGATIVE_TTL = float(os.getenv("SHRTNR_AUTH_CACHE_NEGATIVE_TTL", "5"))
+AUTH_CACHE_SIZE = int(os.getenv("SHRTNR_AUTH_CACHE_SIZE", "10000"))
+
+_auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+_MISSING = object()
+
+
+class AuthenticatedKey(NamedTuple):
+    id: int
+    is_active: bool
+
+
+def _digest(raw_key: str) -> str:
+    # Never keep presented secrets in memory as cache keys
+    return hashlib.sha256(raw_key.encode()).hexdigest()
+
+
+def authenticate(db: Session, raw_key: str) -> Optional[AuthenticatedKey]:
+    """Resolve a presented API key, hitting the database only on a cache miss."""
+    digest = _digest(raw_key)
+    cached = _auth_cache.get(digest, _MISSING)
+    if cached is _MISSING:
+        row = db.query(APIKey.id, APIKey.is_active).filter(APIKey.key == raw_key).first()
+        cached = AuthenticatedKey(row.id, bool(row.is_active)) if row else None
+        ttl = AUTH_CACHE_TTL if cached and cached.is_active else AUTH_CACHE_NEGATIVE_TTL
+        _auth_cache.set(digest, cached, ttl=ttl)
+    if cached is None or not cached.is_active:
+        return None
+    return cached
+
+
+def invalidate(raw_key: str) -> None:
+    _auth_cache.pop(_digest(raw_key))
+
+
+def cache_size() -> int:
+    return len(_auth_cache)
@@ -1,14 +1,133 @@
-from sqlalchemy import create_engine
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 import os
 
+from .metrics import Gauge
+from .replicas import REPLICA_URLS, ReplicaSet, recently_written
+from .shards import SHARDED_TABLES, SQLITE_SHARDS, Shard, shard_index, shard_url
+from .sqlite_profile import SQLITE_WRITER, apply_pragmas, create_writer
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./url_shortener.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# An async driver in the URL scheme (postgresql+asyncpg://, sqlite+aiosqlite://)
+# switches the hot routes to a native async engine. Everything else keeps using
+# a sync engine on the same database, through the matching sync driver.
+SYNC_DRIVERS = {"asyncpg": "postgresql+psycopg2", "aiosqlite": "sqlite"}
+
+_url = make_url(DATABASE_URL)
+USE_ASYNC = _url.get_driver_name() in SYNC_DRIVERS
+_sync_url = _url.set(drivername=SYNC_DRIVERS[_url.get_driver_name()]) if USE_ASYNC else _url
+
+IS_SQLITE = _url.get_backend_name() == "sqlite"
+_connect_args = {"check_same_thread": False} if IS_SQLITE else {}
+
+engine = create_engine(_sync_url, connect_args=_connect_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# SQLite profile: WAL and tuned pragmas on every connection, and all writes
+# funnelled through one batching thread. In-memory databases are private to
+# each connection, so they keep writing in place.
+sqlite_writer = None
+if IS_SQLITE:
+    event.listen(engine, "connect", apply_pragmas)
+    if SQLITE_WRITER and _url.database not in (None, "", ":memory:"):
+        sqlite_writer = create_writer(_sync_url, _connect_args)
+
+# Sharded SQLite: urls/clicks live in SQLITE_SHARDS files next to the main
+# database, routed by a hash of short_code (see queries.py)
+shards = []
+if IS_SQLITE and SQLITE_SHARDS > 1:
+    shards = [Shard(i, shard_url(_sync_url, i)) for i in range(SQLITE_SHARDS)]
+
+
+
+def _create_async_engine(url):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    connect_args = _connect_args
+    if url.get_driver_name() == "asyncpg" and "sslmode" in url.query:
+        # asyncpg takes ssl=, not libpq's sslmode= (Neon URLs carry the latter)
+        connect_args = {"ssl": url.query["sslmode"]}
+        url = url.difference_update_query(["sslmode"])
+    async_engine = create_async_engine(url, connect_args=connect_args)
+    if IS_SQLITE:
+        event.listen(async_engine.sync_engine, "connect", apply_pragmas)
+    return async_engine
+
+
+def _create_engine(url):
+    sync_engine = create_engine(url, connect_args=_connect_args)
+    if IS_SQLITE:
+        event.listen(sync_engine, "connect", apply_pragmas)
+    return sync_engine
+
+
+async_engine = None
+AsyncSessionLocal = None
+if USE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = _create_async_engine(_url)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Read replicas use the same driver family as the primary (give them an
+# async scheme too when DATABASE_URL has one). Not combined with shards.
+replica_sessions = []
+if REPLICA_URLS and not shards:
+    for replica_url in map(make_url, REPLICA_URLS):
+        if USE_ASYNC:
+            replica_sessions.append(async_sessionmaker(
+                _create_async_engine(replica_url), autoflush=False, expire_on_commit=False
+            ))
+        else:
+            replica_sessions.append(sessionmaker(
+                autoflush=False, bind=_create_engine(replica_url), expire_on_commit=False
+            ))
+replicas = ReplicaSet(len(replica_sessions))
+
+
+def pools() -> dict:
+    """Connection pools by name, for metrics and health checks."""
+    named = {"primary": engine.pool}
+    if async_engine is not None:
+        named["async"] = async_engine.pool
+    for i, factory in enumerate(replica_sessions):
+        named[f"replica{i}"] = factory.kw["bind"].pool
+    for shard in shards:
+        named[f"shard{shard.index}"] = shard.engine.pool
+    # SingletonThreadPool/StaticPool (in-memory SQLite) have no size to report
+    return {name: pool for name, pool in named.items() if hasattr(pool, "checkedout")}
+
+
+def writers() -> list:
+    return [writer for writer in [sqlite_writer] + [shard.writer for shard in shards] if writer is not None]
+
+
+Gauge(
+    "shrtnr_db_pool_checked_out", "Connections in use per pool", ("pool",),
+    collect=lambda: {(name,): pool.checkedout() for name, pool in pools().items()},
+)
+Gauge(
+    "shrtnr_db_pool_size", "Configured pool size per pool", ("pool",),
+    collect=lambda: {(name,): pool.size() for name, pool in pools().items()},
+)
+Gauge(
+    "shrtnr_db_pool_overflow", "Connections opened beyond the pool size (negative: idle room left)", ("pool",),
+    collect=lambda: {(name,): pool.overflow() for name, pool in pools().items()},
+)
+Gauge(
+    "shrtnr_sqlite_writer_queue_depth", "Writes (mostly clicks) waiting for the SQLite writer",
+    collect=lambda: {(): sum(writer.queue_depth() for writer in writers())},
+)
+
 
 def get_db():
     db = SessionLocal()
@@ -16,3 +135,194 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+class ThreadedSession:
+    """The subset of AsyncSession the async routes use, over a sync Session.
+
+    Each awaited call runs in the thread pool, so the same route code works
+    whether or not DATABASE_URL names an async driver.
+    """
+
+    def __init__(self, session, writer=None):
+        self.session = session
+        self.writer = writer
+
+    async def execute(self, statement):
+        return await run_in_threadpool(self.session.execute, statement)
+
+    async def scalar(self, statement):
+        return await run_in_threadpool(self.session.scalar, statement)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.session.rollback)
+
+    async def run_sync(self, fn, *args):
+        return await run_in_threadpool(fn, self.session, *args)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.session.close)
+
+
+class ShardedDB:
+    """Per-request sessions on the shard files, each opened on first use."""
+
+    def __init__(self):
+        self.count = len(shards)
+        self._sessions = {}
+
+    def shard(self, index: int) -> ThreadedSession:
+        if index not in self._sessions:
+            shard = shards[index]
+            self._sessions[index] = ThreadedSession(
+                shard.SessionLocal(expire_on_commit=False), writer=shard.writer
+            )
+        return self._sessions[index]
+
+    def index_for(self, short_code: str) -> int:
+        return shard_index(short_code, len(shards))
+
+    def for_code(self, short_code: str) -> ThreadedSession:
+        return self.shard(self.index_for(short_code))
+
+    def all(self) -> list:
+        return [self.shard(i) for i in range(len(shards))]
+
+    async def close(self) -> None:
+        await asyncio.gather(*(session.close() for session in self._sessions.values()))
+
+
+class ReplicatedDB:
+    """The primary session plus, on first read, one replica for the rest of the request."""
+
+    def __init__(self, primary):
+        self.primary = primary
+        self._replica = None
+        self._replica_index = None
+        self._use_replica = True
+
+    def _replica_session(self):
+        if self._replica is None and self._use_replica:
+            self._replica_index = replicas.pick()
+            if self._replica_index is None:
+                self._use_replica = False
+                return None
+            session = replica_sessions[self._replica_index]()
+            self._replica = session if USE_ASYNC else ThreadedSession(session)
+        return self._replica
+
+    async def read(self, query, short_code=None, api_key_id=None):
+        """Run query(session) on the replica, falling back to the primary.
+
+        Also falls back when a lookup by short_code finds nothing, since the
+        link may not have replicated yet.
+        """
+        if not recently_written(short_code, api_key_id):
+            replica = self._replica_session()
+            if replica is not None:
+                try:
+                    result = await query(replica)
+                except DBAPIError:
+                    # Not retried within this request; others skip it for a while
+                    replicas.mark_down(self._replica_index)
+                    self._use_replica = False
+                    await self.close()
+                else:
+                    if result is not None or short_code is None:
+                        return result
+        return await query(self.primary)
+
+    async def close(self) -> None:
+        if self._replica is not None:
+            replica, self._replica = self._replica, None
+            await replica.close()
+
+
+@asynccontextmanager
+async def _primary_session():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as session:
+            yield session
+        return
+
+    db = ThreadedSession(SessionLocal(expire_on_commit=False), writer=sqlite_writer)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def get_async_db():
+    if shards:
+        db = ShardedDB()
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+
+    async with _primary_session() as primary:
+        if not replica_sessions:
+            yield primary
+            return
+        db = ReplicatedDB(primary)
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+def write(db, work):
+    """Apply work(session) and commit: on the SQLite writer when enabled, else on db."""
+    if sqlite_writer is not None:
+        return sqlite_writer.submit(work).result()
+    result = work(db)
+    db.commit()
+    return result
+
+
+async def write_async(db, work):
+    """write() for AsyncSession / ThreadedSession callers; shard sessions use their shard's writer."""
+    if isinstance(db, ReplicatedDB):
+        db = db.primary
+    writer = db.writer if isinstance(db, ThreadedSession) else sqlite_writer
+    if writer is not None:
+        return await asyncio.wrap_future(writer.submit(work))
+    try:
+        result = await db.run_sync(work)
+        await db.commit()
+    except Exception:
+        # Leave the session usable for the rest of the request
+        await db.rollback()
+        raise
+    return result
+
+
+def create_indexes():
+    """Create indexes added after their table already existed."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def create_shard_tables():
+    tables = [Base.metadata.tables[name] for name in SHARDED_TABLES]
+    for shard in shards:
+        Base.metadata.create_all(bind=shard.engine, tables=tables)
+
+
+def unsharded_links() -> bool:
+    """Whether DATABASE_URL still holds links that the shards would hide."""
+    if not shards:
+        return False
+    urls = Base.metadata.tables["urls"]
+    with engine.connect() as conn:
+        return conn.execute(select(urls.c.id).limit(1)).first() is not None
+
+
+def stop_writers():
+    for writer in writers():
+        writer.stop()
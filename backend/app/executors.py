@@ -0,0 +1,46 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from anyio import to_thread
+
+# Sync (def) routes and dependencies run in anyio's thread pool, so this
+# bounds how many blocking DB calls can be in flight per uvicorn worker
+THREADPOOL_SIZE = int(os.getenv("SHRTNR_THREADPOOL_SIZE", "40"))
+
+# CPU-bound work (QR rendering) runs in separate processes so it never
+# holds the GIL the event loop and DB threads need
+PROCESS_WORKERS = int(os.getenv("SHRTNR_QR_WORKERS", str(os.cpu_count() or 2)))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def configure_threadpool(size: int = THREADPOOL_SIZE) -> None:
+    """Resize the thread pool; must be called from the running event loop."""
+    to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn, not fork: the server process already has threads running
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+async def run_in_process(fn: Callable[..., Any], *args: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), functools.partial(fn, *args))
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
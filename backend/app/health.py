@@ -0,0 +1,98 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from .auth import cache_size as auth_cache_size
+from .database import engine, pools, writers
+from .qr import cache_size as qr_cache_size
+from .redirects import store_size
+from .singleflight import SingleFlight
+
+# Readiness for load balancers, on GET /health/ready: a SELECT 1 round trip
+# on the primary, connection pool usage, SQLite writer queue depth and cache
+# sizes. "degraded" when a threshold below is crossed, "unavailable" when the
+# database does not answer; both are served as 503 so the worker is taken
+# out of rotation until it recovers. A result is reused for
+# SHRTNR_HEALTH_CACHE_SECONDS, and concurrent probes share one check, so
+# probing does not add load to a struggling worker.
+HEALTH_CACHE_SECONDS = float(os.getenv("SHRTNR_HEALTH_CACHE_SECONDS", "1"))
+HEALTH_DB_TIMEOUT = float(os.getenv("SHRTNR_HEALTH_DB_TIMEOUT", "2"))
+HEALTH_MAX_DB_LATENCY_MS = float(os.getenv("SHRTNR_HEALTH_MAX_DB_LATENCY_MS", "250"))
+# Checked-out connections over pool size plus max overflow
+HEALTH_MAX_POOL_USAGE = float(os.getenv("SHRTNR_HEALTH_MAX_POOL_USAGE", "0.9"))
+HEALTH_MAX_QUEUE_DEPTH = int(os.getenv("SHRTNR_HEALTH_MAX_QUEUE_DEPTH", "1000"))
+
+_checks = SingleFlight("health")
+_last: Optional[tuple] = None
+
+
+def _db_round_trip() -> float:
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return (time.perf_counter() - start) * 1000
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"checked_out": pool.checkedout(), "size": pool.size(), "overflow": pool.overflow()}
+    # Negative max overflow: the pool grows without limit
+    max_overflow = getattr(pool, "_max_overflow", -1)
+    if max_overflow >= 0:
+        stats["capacity"] = pool.size() + max_overflow
+    return stats
+
+
+async def _check() -> dict:
+    global _last
+    problems = []
+    available = True
+
+    try:
+        latency = await asyncio.wait_for(run_in_threadpool(_db_round_trip), HEALTH_DB_TIMEOUT)
+        db = {"latency_ms": round(latency, 2)}
+        if latency > HEALTH_MAX_DB_LATENCY_MS:
+            problems.append(f"database round trip {latency:.0f} ms > {HEALTH_MAX_DB_LATENCY_MS:.0f} ms")
+    except asyncio.TimeoutError:
+        available = False
+        db = {"latency_ms": None, "error": f"no answer within {HEALTH_DB_TIMEOUT:g}s"}
+    except Exception as e:
+        available = False
+        db = {"latency_ms": None, "error": str(e)}
+
+    pool_stats = {name: _pool_stats(pool) for name, pool in pools().items()}
+    for name, stats in pool_stats.items():
+        capacity = stats.get("capacity")
+        if capacity and stats["checked_out"] / capacity >= HEALTH_MAX_POOL_USAGE:
+            problems.append(f"pool {name}: {stats['checked_out']} of {capacity} connections checked out")
+
+    queue_depth = sum(writer.queue_depth() for writer in writers())
+    if queue_depth > HEALTH_MAX_QUEUE_DEPTH:
+        problems.append(f"{queue_depth} writes queued > {HEALTH_MAX_QUEUE_DEPTH}")
+
+    report = {
+        "status": "unavailable" if not available else "degraded" if problems else "ok",
+        "checked_at": datetime.utcnow().isoformat(),
+        "problems": problems,
+        "db": db,
+        "pools": pool_stats,
+        "writer_queue_depth": queue_depth,
+        "caches": {
+            "auth": auth_cache_size(),
+            "qr": qr_cache_size(),
+            "redirect_store": await run_in_threadpool(store_size),
+        },
+    }
+    _last = (time.monotonic(), report)
+    return report
+
+
+async def readiness() -> dict:
+    """The latest report, checked again once it is older than HEALTH_CACHE_SECONDS."""
+    if _last is not None and time.monotonic() - _last[0] < HEALTH_CACHE_SECONDS:
+        return _last[1]
+    return await _checks.do("ready", _check)
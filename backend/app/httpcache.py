@@ -0,0 +1,52 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .serializers import dumps
+
+# Public aggregates can be served by the edge for a few seconds and refreshed
+# in the background; key-scoped listings must always revalidate.
+STATS_CACHE_CONTROL = "public, max-age=5, s-maxage=10, stale-while-revalidate=60"
+TRENDING_CACHE_CONTROL = "public, max-age=30, s-maxage=60, stale-while-revalidate=300"
+URL_STATS_CACHE_CONTROL = "public, max-age=5, s-maxage=10, stale-while-revalidate=60"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation
+    wanted = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def conditional_json(
+    request: Request,
+    content: Any,
+    cache_control: str,
+    etag: Optional[str] = None
+) -> Response:
+    """JSON response tagged with an ETag (content hash unless given), or a 304."""
+    body = dumps(content)
+    etag = etag or make_etag(body)
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
@@ -1,27 +1,63 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, Response, HTMLResponse
+from fastapi.responses import RedirectResponse, Response, HTMLResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import update
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional
-from collections import defaultdict
+from typing import NamedTuple, Optional, Union
 import secrets
 import string
-import qrcode
-import io
 import base64
 
 import os
 
-from .database import engine, get_db, Base
-from .models import URL, Click, APIKey
+from .auth import AuthenticatedKey, authenticate, invalidate
+from .compression import CompressionMiddleware
+from .database import (
+    engine, async_engine, get_db, get_async_db, write, Base, create_indexes, create_shard_tables, stop_writers,
+    unsharded_links
+)
+from .executors import configure_threadpool, run_in_process, shutdown_process_pool
+from .health import readiness
+from .httpcache import (
+    PRIVATE_CACHE_CONTROL, STATS_CACHE_CONTROL, TRENDING_CACHE_CONTROL, URL_STATS_CACHE_CONTROL,
+    conditional_json, etag_matches, make_etag, not_modified
+)
+from .metrics import (
+    CONTENT_TYPE, METRICS, MetricsMiddleware, exposition, instrument_queries, start_publishing, stop_publishing
+)
+from .models import APIKey
+from .pagination import MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+from .qr import (
+    DEFAULT_BORDER, DEFAULT_BOX_SIZE, DEFAULT_ERROR_CORRECTION, MAX_BORDER, MAX_BOX_SIZE,
+    MEDIA_TYPES, QR_CACHE_CONTROL, QR_RENDER_DURATION, QRParams, cached_qr, qr_cache_key, render_qr, store_qr
+)
+from .profiler import (
+    DEFAULT_MODE, MODES, PROFILER_INTERVAL_MS, PROFILER_MAX_SECONDS, ProfilerBusy, authorized, profile
+)
+from .qr_batch import QR_BATCH_MAX_CODES, stream_qr_zip
+from .query_profile import QUERY_PROFILE, QueryProfileMiddleware, profile_queries
+from .redirects import Redirect, close_store, forget, lookup, remember, warm
+from .ratelimit import identity_for, limiter, retry_after_header
 from .schemas import (
-    URLCreate, URLResponse, URLStatsResponse,
-    APIKeyCreate, APIKeyResponse, QRCodeResponse
+    URLCreate, URLResponse, URLStatsResponse, URLPage,
+    APIKeyCreate, APIKeyResponse, QRCodeResponse, QRBatchRequest
 )
+from .serializers import JSONBytesResponse, encode_api_key, encode_url_stats, url_encoder
+from .singleflight import SingleFlight
+from .timing import SERVER_TIMING, ServerTimingMiddleware, phase
+from . import queries
 
 Base.metadata.create_all(bind=engine)
+create_indexes()
+create_shard_tables()
+if unsharded_links():
+    # Sharding turned on over an existing database: its links would 404
+    raise RuntimeError(
+        "SHRTNR_SQLITE_SHARDS is set but DATABASE_URL still holds links; "
+        "move them into the shards first with: python -m app.move_to_shards"
+    )
 
 app = FastAPI(
     title="URL Shortener API",
@@ -36,11 +72,89 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
+if METRICS:
+    instrument_queries()
+    app.add_middleware(MetricsMiddleware)
+if QUERY_PROFILE != "off":
+    profile_queries()
+    app.add_middleware(QueryProfileMiddleware)
+
+
+# Routes that touch the database are plain `def` so FastAPI runs them in the
+# thread pool. Routes on urls/clicks are async and go through queries.py with
+# get_async_db: a native async engine when DATABASE_URL names an async
+# driver, per-shard sessions when SQLite is sharded, otherwise a sync session
+# whose calls are offloaded one by one.
+@app.on_event("startup")
+async def start_executors():
+    configure_threadpool()
+    start_publishing()
+
+
+async def hot_links(since: datetime, limit: int) -> list:
+    async with asynccontextmanager(get_async_db)() as db:
+        return await queries.hot_links(db, since, limit)
+
+
+# Runs before the worker accepts connections
+@app.on_event("startup")
+async def warm_redirect_store():
+    await warm(hot_links)
+
+
+@app.on_event("shutdown")
+async def stop_executors():
+    stop_publishing()
+    shutdown_process_pool()
+    stop_writers()
+    close_store()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # Set your domain here or via environment variable
 # Examples: https://shrtnr.io, https://s.yourdomain.com
 BASE_URL = os.getenv("SHRTNR_BASE_URL", "http://localhost:8000")
 
+encode_url = url_encoder(BASE_URL)
+
+
+# Lookups by short code (redirects and QR), stats bodies by version and QR
+# renders by cache key: one of each per key in flight per worker. Flights
+# return plain values, never ORM rows, since followers use their own sessions
+url_lookups = SingleFlight("url_lookup")
+stats_versions = SingleFlight("url_stats_version")
+stats_bodies = SingleFlight("url_stats")
+qr_renders = SingleFlight("qr_render")
+
+
+async def find_redirect(db, short_code: str) -> Optional[Redirect]:
+    url = await queries.find_url(db, short_code)
+    if not url:
+        return None
+    await remember(url)
+    return Redirect(url.id, url.short_code, url.original_url)
+
+
+class StatsVersion(NamedTuple):
+    """What get_url_stats needs of the URL row, plus its click version."""
+    id: int
+    short_code: str
+    original_url: str
+    created_at: datetime
+    total_clicks: int
+    last_click_id: Optional[int]
+
+
+async def find_stats_version(db, short_code: str) -> Optional[StatsVersion]:
+    row = await queries.url_stats_version(db, short_code)
+    if not row:
+        return None
+    url, total_clicks, last_click_id = row
+    return StatsVersion(url.id, url.short_code, url.original_url, url.created_at, total_clicks, last_click_id)
+
 
 def generate_short_code(length: int = 6) -> str:
     chars = string.ascii_letters + string.digits
@@ -50,14 +164,35 @@ def generate_short_code(length: int = 6) -> str:
 def get_api_key(
     x_api_key: Optional[str] = Header(None),
     db: Session = Depends(get_db)
-) -> Optional[APIKey]:
+) -> Optional[AuthenticatedKey]:
     if x_api_key is None:
         return None
-    api_key = db.query(APIKey).filter(
-        APIKey.key == x_api_key,
-        APIKey.is_active == True
-    ).first()
-    return api_key
+    return authenticate(db, x_api_key)
+
+
+def rate_limited(endpoint_class: str):
+    def check_rate_limit(
+        request: Request,
+        api_key: Optional[AuthenticatedKey] = Depends(get_api_key)
+    ):
+        identity = identity_for(
+            api_key.id if api_key else None,
+            request.client.host if request.client else None
+        )
+        retry_after = limiter.hit(endpoint_class, identity)
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded",
+                headers=retry_after_header(retry_after)
+            )
+    return Depends(check_rate_limit)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not authorized(x_admin_token):
+        # Indistinguishable from a missing route unless the token is right
+        raise HTTPException(status_code=404, detail="Not found")
 
 
 # Health check
@@ -66,47 +201,77 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 
+# Readiness: 503 while degraded or the database is unreachable
+@app.get("/health/ready")
+async def readiness_check():
+    report = await readiness()
+    return JSONBytesResponse(
+        report,
+        status_code=200 if report["status"] == "ok" else 503,
+        headers={"Cache-Control": "no-store"}
+    )
+
+
+# Prometheus scrape target
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not METRICS:
+        raise HTTPException(status_code=404, detail="Not found")
+    return Response(content=exposition(), media_type=CONTENT_TYPE)
+
+
+# Sampling profile of this worker, e.g.
+#   curl -H "X-Admin-Token: $TOKEN" "localhost:8000/api/admin/profile?seconds=30" > out.folded
+#   flamegraph.pl out.folded > flame.svg
+@app.get("/api/admin/profile", include_in_schema=False, dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS),
+    interval_ms: float = Query(PROFILER_INTERVAL_MS, ge=1, le=1000),
+    mode: str = Query(DEFAULT_MODE, pattern="^(" + "|".join(MODES) + ")$"),
+    idle: bool = False
+):
+    try:
+        body = await profile(mode, seconds, interval_ms / 1000, include_idle=idle)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    filename, media_type = (
+        (f"profile-{os.getpid()}.folded", "text/plain; charset=utf-8") if mode == "sample"
+        else (f"profile-{os.getpid()}.prof", "application/octet-stream")
+    )
+    return Response(content=body, media_type=media_type, headers={
+        "Cache-Control": "no-store",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    })
+
+
 # URL Shortening
-@app.post("/api/shorten", response_model=URLResponse)
+@app.post("/api/shorten", response_model=URLResponse, dependencies=[rate_limited("shorten")])
 async def shorten_url(
     url_data: URLCreate,
     request: Request,
-    db: Session = Depends(get_db),
-    api_key: Optional[APIKey] = Depends(get_api_key)
+    db=Depends(get_async_db),
+    api_key: Optional[AuthenticatedKey] = Depends(get_api_key)
 ):
-    # Check if custom code is taken
-    if url_data.custom_code:
-        existing = db.query(URL).filter(URL.short_code == url_data.custom_code).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Custom code already taken")
-        short_code = url_data.custom_code
-    else:
-        # Generate unique short code
-        while True:
-            short_code = generate_short_code()
-            existing = db.query(URL).filter(URL.short_code == short_code).first()
-            if not existing:
-                break
-
-    # Create URL entry
-    db_url = URL(
-        original_url=url_data.url,
-        short_code=short_code,
-        api_key_id=api_key.id if api_key else None
-    )
-    db.add(db_url)
-    db.commit()
-    db.refresh(db_url)
-
-    response = URLResponse(
-        id=db_url.id,
-        original_url=db_url.original_url,
-        short_code=db_url.short_code,
-        created_at=db_url.created_at,
-        click_count=0,
-        short_url=f"{BASE_URL}/{db_url.short_code}"
-    )
-    return response
+    with phase("db"):
+        # Check if custom code is taken
+        if url_data.custom_code:
+            if await queries.short_code_taken(db, url_data.custom_code):
+                raise HTTPException(status_code=400, detail="Custom code already taken")
+            short_code = url_data.custom_code
+        else:
+            # Generate unique short code
+            while True:
+                short_code = generate_short_code()
+                if not await queries.short_code_taken(db, short_code):
+                    break
+
+        # Create URL entry
+        db_url = await queries.create_url(
+            db, url_data.url, short_code, api_key.id if api_key else None
+        )
+
+    with phase("serialize"):
+        return JSONBytesResponse(encode_url(db_url, 0))
 
 
 # Viral Interstitial HTML
@@ -208,116 +373,128 @@ INTERSTITIAL_HTML = """
 async def redirect_to_url(
     short_code: str,
     request: Request,
-    db: Session = Depends(get_db),
+    db=Depends(get_async_db),
     direct: bool = Query(False, description="Skip interstitial")
 ):
     # Skip API routes
-    if short_code in ["api", "health", "docs", "openapi.json", "redoc", "trending"]:
+    if short_code in ["api", "health", "metrics", "docs", "openapi.json", "redoc", "trending"]:
         raise HTTPException(status_code=404, detail="Not found")
 
-    url = db.query(URL).filter(URL.short_code == short_code).first()
-    if not url:
-        raise HTTPException(status_code=404, detail="URL not found")
+    with phase("lookup"):
+        url = lookup(short_code) or await url_lookups.do(short_code, find_redirect, db, short_code)
+        if url is None:
+            raise HTTPException(status_code=404, detail="URL not found")
 
     # Record click
-    click = Click(
-        url_id=url.id,
+    click = dict(
         ip_address=request.client.host if request.client else None,
         user_agent=request.headers.get("user-agent"),
         referer=request.headers.get("referer")
     )
-    db.add(click)
-    db.commit()
-
-    # Direct redirect for API calls or returning visitors
-    if direct or request.headers.get("X-Requested-With") == "XMLHttpRequest":
-        return RedirectResponse(url=url.original_url, status_code=307)
-
-    # Show interstitial for first-time web visitors
-    html = INTERSTITIAL_HTML.replace("{destination}", url.original_url).replace("{base_url}", BASE_URL)
-    return HTMLResponse(content=html)
+    with phase("click"):
+        if not await queries.record_click(db, url, **click):
+            # The store outlived a link deleted through another worker or
+            # host: drop the entry and ask SQL again
+            await forget(short_code)
+            url = await url_lookups.do(short_code, find_redirect, db, short_code)
+            if url is None:
+                raise HTTPException(status_code=404, detail="URL not found")
+            await queries.record_click(db, url, **click)
+
+    with phase("render"):
+        # Direct redirect for API calls or returning visitors
+        if direct or request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            return RedirectResponse(url=url.original_url, status_code=307)
+
+        # Show interstitial for first-time web visitors
+        html = INTERSTITIAL_HTML.replace("{destination}", url.original_url).replace("{base_url}", BASE_URL)
+        return HTMLResponse(content=html)
 
 
 # Get URL stats
-@app.get("/api/urls/{short_code}", response_model=URLStatsResponse)
+@app.get("/api/urls/{short_code}", response_model=URLStatsResponse, dependencies=[rate_limited("read")])
 async def get_url_stats(
     short_code: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    db=Depends(get_async_db)
 ):
-    url = db.query(URL).filter(URL.short_code == short_code).first()
+    # Cheap version probe: the stats only change when clicks are added
+    # or the 30-day window rolls over
+    with phase("db"):
+        url = await stats_versions.do(short_code, find_stats_version, db, short_code)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
+    total_clicks = url.total_clicks
+    etag = make_etag(url.id, total_clicks, url.last_click_id, datetime.utcnow().date())
+    if etag_matches(request, etag):
+        return not_modified(etag, URL_STATS_CACHE_CONTROL)
 
-    # Get clicks by day (last 30 days)
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    clicks = db.query(Click).filter(
-        Click.url_id == url.id,
-        Click.clicked_at >= thirty_days_ago
-    ).all()
-
-    clicks_by_day = defaultdict(int)
-    for click in clicks:
-        day = click.clicked_at.strftime("%Y-%m-%d")
-        clicks_by_day[day] += 1
-
-    # Get top referers
-    referer_counts = defaultdict(int)
-    for click in url.clicks:
-        ref = click.referer or "Direct"
-        referer_counts[ref] += 1
-
-    top_referers = [
-        {"referer": ref, "count": count}
-        for ref, count in sorted(referer_counts.items(), key=lambda x: -x[1])[:5]
-    ]
-
-    return URLStatsResponse(
-        id=url.id,
-        original_url=url.original_url,
-        short_code=url.short_code,
-        created_at=url.created_at,
-        click_count=url.click_count,
-        clicks=[],  # Simplified for now
-        clicks_by_day=dict(clicks_by_day),
-        top_referers=top_referers
-    )
+    async def build_stats():
+        with phase("db"):
+            # Get clicks by day (last 30 days)
+            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+            clicks_by_day = await queries.clicks_by_day(db, url, thirty_days_ago)
+
+            # Get top referers
+            top_referers = await queries.top_referers(db, url)
+
+        with phase("serialize"):
+            return encode_url_stats(url, total_clicks, clicks_by_day, top_referers)
+
+    # Same ETag, same body
+    stats = await stats_bodies.do(etag, build_stats)
+    with phase("serialize"):
+        return conditional_json(request, stats, URL_STATS_CACHE_CONTROL, etag=etag)
 
 
 # List all URLs (for API key holder)
-@app.get("/api/urls", response_model=list[URLResponse])
+@app.get("/api/urls", response_model=Union[list[URLResponse], URLPage], dependencies=[rate_limited("read")])
 async def list_urls(
-    db: Session = Depends(get_db),
-    api_key: Optional[APIKey] = Depends(get_api_key),
-    limit: int = 50,
-    offset: int = 0
+    request: Request,
+    db=Depends(get_async_db),
+    api_key: Optional[AuthenticatedKey] = Depends(get_api_key),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Keyset cursor; pass empty for the first page")
 ):
-    query = db.query(URL)
-    if api_key:
-        query = query.filter(URL.api_key_id == api_key.id)
-
-    urls = query.order_by(URL.created_at.desc()).offset(offset).limit(limit).all()
-
-    return [
-        URLResponse(
-            id=url.id,
-            original_url=url.original_url,
-            short_code=url.short_code,
-            created_at=url.created_at,
-            click_count=url.click_count,
-            short_url=f"{BASE_URL}/{url.short_code}"
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    with phase("db"):
+        rows = await queries.list_urls_page(
+            db,
+            api_key.id if api_key else None,
+            limit,
+            offset=offset if cursor is None else None,
+            after=after
         )
-        for url in urls
-    ]
+
+    with phase("serialize"):
+        items = [encode_url(url, click_count) for url, click_count in rows]
+        if cursor is None:
+            return conditional_json(request, items, PRIVATE_CACHE_CONTROL)
+
+        next_cursor = None
+        if len(rows) == limit:
+            last = rows[-1][0]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        page = {"items": items, "next_cursor": next_cursor}
+        return conditional_json(request, page, PRIVATE_CACHE_CONTROL)
 
 
 # Delete URL
-@app.delete("/api/urls/{short_code}")
+@app.delete("/api/urls/{short_code}", dependencies=[rate_limited("write")])
 async def delete_url(
     short_code: str,
-    db: Session = Depends(get_db),
-    api_key: Optional[APIKey] = Depends(get_api_key)
+    db=Depends(get_async_db),
+    api_key: Optional[AuthenticatedKey] = Depends(get_api_key)
 ):
-    url = db.query(URL).filter(URL.short_code == short_code).first()
+    with phase("db"):
+        url = await queries.find_url(db, short_code, primary=True)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
 
@@ -325,58 +502,115 @@ async def delete_url(
     if api_key and url.api_key_id != api_key.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this URL")
 
-    db.delete(url)
-    db.commit()
+    with phase("db"):
+        deleted = await queries.delete_url(db, url)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="URL not found")
     return {"message": "URL deleted successfully"}
 
 
 # Generate QR Code
-@app.get("/api/urls/{short_code}/qr", response_model=QRCodeResponse)
+@app.get("/api/urls/{short_code}/qr", response_model=QRCodeResponse, dependencies=[rate_limited("qr")])
 async def generate_qr_code(
     short_code: str,
-    db: Session = Depends(get_db)
+    request: Request,
+    db=Depends(get_async_db),
+    fmt: str = Query("json", alias="format", pattern="^(json|png|svg)$", description="json (base64 PNG data URI), png or svg"),
+    size: int = Query(DEFAULT_BOX_SIZE, ge=1, le=MAX_BOX_SIZE, description="Pixels per QR module"),
+    ec: str = Query(DEFAULT_ERROR_CORRECTION, pattern="^[LMQHlmqh]$", description="Error correction level (L, M, Q or H)"),
+    border: int = Query(DEFAULT_BORDER, ge=0, le=MAX_BORDER, description="Quiet zone width in modules")
 ):
-    url = db.query(URL).filter(URL.short_code == short_code).first()
+    with phase("db"):
+        url = await url_lookups.do(short_code, find_redirect, db, short_code)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
 
-    short_url = f"{BASE_URL}/{url.short_code}"
-
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(short_url)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    buffer = io.BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
+    short_url = f"{BASE_URL}/{short_code}"
+
+    # The image only depends on the short URL, so revalidation never renders
+    params = QRParams(box_size=size, border=border, error_correction=ec.upper())
+    image_format = "png" if fmt == "json" else fmt
+    key = qr_cache_key(short_url, image_format, params)
+    etag = f'"{key}-{fmt}"'
+    if etag_matches(request, etag):
+        return not_modified(etag, QR_CACHE_CONTROL)
+
+    async def render():
+        # CPU-bound; rendering in the event loop would stall every redirect
+        with QR_RENDER_DURATION.time(image_format):
+            image = await run_in_process(render_qr, short_url, image_format, params)
+        store_qr(key, image_format, image)
+        return image
+
+    with phase("render"):
+        image = cached_qr(key, image_format) or await qr_renders.do((key, image_format), render)
+    headers = {"ETag": etag, "Cache-Control": QR_CACHE_CONTROL}
+    if fmt != "json":
+        return Response(content=image, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+    with phase("serialize"):
+        qr_base64 = base64.b64encode(image).decode()
+        return JSONBytesResponse({"qr_code": f"data:image/png;base64,{qr_base64}"}, headers=headers)
+
+
+# Batch QR export (ZIP streamed as renders finish)
+@app.post("/api/qr/batch", dependencies=[rate_limited("qr")])
+async def batch_qr_codes(
+    batch: QRBatchRequest,
+    db=Depends(get_async_db),
+    api_key: Optional[AuthenticatedKey] = Depends(get_api_key)
+):
+    missing = []
+    if batch.codes:
+        requested = list(dict.fromkeys(batch.codes))
+        if len(requested) > QR_BATCH_MAX_CODES:
+            raise HTTPException(status_code=400, detail=f"At most {QR_BATCH_MAX_CODES} codes per batch")
+        found = await queries.existing_codes(db, requested)
+        codes = [code for code in requested if code in found]
+        missing = [code for code in requested if code not in found]
+    elif api_key:
+        codes = await queries.codes_for_api_key(db, api_key.id, QR_BATCH_MAX_CODES + 1)
+        if len(codes) > QR_BATCH_MAX_CODES:
+            raise HTTPException(status_code=400, detail=f"At most {QR_BATCH_MAX_CODES} codes per batch")
+    else:
+        raise HTTPException(status_code=400, detail="Provide codes or an API key")
 
-    qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+    if not codes:
+        raise HTTPException(status_code=404, detail="No matching URLs")
 
-    return QRCodeResponse(qr_code=f"data:image/png;base64,{qr_base64}")
+    params = QRParams(box_size=batch.size, border=batch.border, error_correction=batch.ec)
+    items = [(code, f"{BASE_URL}/{code}") for code in codes]
+    return StreamingResponse(
+        stream_qr_zip(items, batch.format, params, missing),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="qr-codes.zip"'}
+    )
 
 
 # API Key Management
-@app.post("/api/keys", response_model=APIKeyResponse)
-async def create_api_key(
+@app.post("/api/keys", response_model=APIKeyResponse, dependencies=[rate_limited("write")])
+def create_api_key(
     key_data: APIKeyCreate,
     db: Session = Depends(get_db)
 ):
-    api_key = APIKey(name=key_data.name)
-    db.add(api_key)
-    db.commit()
-    db.refresh(api_key)
-    return api_key
+    def insert(session):
+        api_key = APIKey(name=key_data.name)
+        session.add(api_key)
+        session.flush()
+        return api_key
+
+    api_key = write(db, insert)
+    return JSONBytesResponse(encode_api_key(api_key))
 
 
-@app.get("/api/keys", response_model=list[APIKeyResponse])
-async def list_api_keys(db: Session = Depends(get_db)):
-    return db.query(APIKey).filter(APIKey.is_active == True).all()
+@app.get("/api/keys", response_model=list[APIKeyResponse], dependencies=[rate_limited("read")])
+def list_api_keys(db: Session = Depends(get_db)):
+    keys = db.query(APIKey).filter(APIKey.is_active == True).all()
+    return JSONBytesResponse([encode_api_key(key) for key in keys])
 
 
-@app.delete("/api/keys/{key_id}")
-async def revoke_api_key(
+@app.delete("/api/keys/{key_id}", dependencies=[rate_limited("write")])
+def revoke_api_key(
     key_id: int,
     db: Session = Depends(get_db)
 ):
@@ -384,63 +618,42 @@ async def revoke_api_key(
     if not api_key:
         raise HTTPException(status_code=404, detail="API key not found")
 
-    api_key.is_active = False
-    db.commit()
+    write(db, lambda session: session.execute(
+        update(APIKey).where(APIKey.id == key_id).values(is_active=False)
+    ))
+    invalidate(api_key.key)
     return {"message": "API key revoked"}
 
 
 # Global stats
-@app.get("/api/stats")
-async def get_global_stats(db: Session = Depends(get_db)):
-    total_urls = db.query(func.count(URL.id)).scalar()
-    total_clicks = db.query(func.count(Click.id)).scalar()
-
-    # URLs created today
-    today = datetime.utcnow().date()
-    urls_today = db.query(func.count(URL.id)).filter(
-        func.date(URL.created_at) == today
-    ).scalar()
-
-    # Clicks today
-    clicks_today = db.query(func.count(Click.id)).filter(
-        func.date(Click.clicked_at) == today
-    ).scalar()
-
-    return {
-        "total_urls": total_urls,
-        "total_clicks": total_clicks,
-        "urls_today": urls_today,
-        "clicks_today": clicks_today
-    }
+@app.get("/api/stats", dependencies=[rate_limited("read")])
+async def get_global_stats(request: Request, db=Depends(get_async_db)):
+    # Totals, plus URLs and clicks created today
+    with phase("db"):
+        stats = await queries.global_stats(db, datetime.utcnow().date())
+    with phase("serialize"):
+        return conditional_json(request, stats, STATS_CACHE_CONTROL)
 
 
 # Trending URLs (most clicked in last 7 days)
-@app.get("/api/trending", response_model=list[URLResponse])
+@app.get("/api/trending", response_model=list[URLResponse], dependencies=[rate_limited("read")])
 async def get_trending_urls(
-    db: Session = Depends(get_db),
+    request: Request,
+    db=Depends(get_async_db),
     limit: int = 10
 ):
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
 
     # Get URLs with most clicks in last 7 days
-    trending_query = (
-        db.query(URL, func.count(Click.id).label('recent_clicks'))
-        .join(Click, Click.url_id == URL.id)
-        .filter(Click.clicked_at >= seven_days_ago)
-        .group_by(URL.id)
-        .order_by(desc('recent_clicks'))
-        .limit(limit)
-    )
-
-    results = []
-    for url, recent_clicks in trending_query:
-        results.append(URLResponse(
-            id=url.id,
-            original_url=url.original_url[:50] + "..." if len(url.original_url) > 50 else url.original_url,
-            short_code=url.short_code,
-            created_at=url.created_at,
-            click_count=url.click_count,
-            short_url=f"{BASE_URL}/{url.short_code}"
-        ))
-
-    return results
+    with phase("db"):
+        trending = await queries.trending_urls(db, seven_days_ago, limit)
+
+    with phase("serialize"):
+        results = []
+        for url, click_count in trending:
+            row = encode_url(url, click_count)
+            if len(url.original_url) > 50:
+                row["original_url"] = url.original_url[:50] + "..."
+            results.append(row)
+
+        return conditional_json(request, results, TRENDING_CACHE_CONTROL)
@@ -0,0 +1,342 @@
+import asyncio
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Prometheus text-format metrics, served on GET /metrics. Every thread
+# records into its own cells, so observing a value never takes a lock; a
+# scrape sums the cells. "off" removes the endpoint, the request middleware
+# and the SQL statement hooks (the remaining counters are a dict update).
+METRICS = os.getenv("SHRTNR_METRICS", "on").lower() not in ("off", "0", "false")
+# With several uvicorn workers, a directory shared by them: each worker
+# writes its snapshot there every SHRTNR_METRICS_FLUSH_INTERVAL seconds and
+# when it serves a scrape, and /metrics on any worker reports the sum over
+# the live workers. Empty: each worker reports only itself.
+METRICS_DIR = os.getenv("SHRTNR_METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("SHRTNR_METRICS_FLUSH_INTERVAL", "5"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+_registry: list = []
+
+
+class _PerThread:
+    """One dict per recording thread; only its owner writes it, readers copy them all."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def mine(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._all.append(values)
+            return values
+
+    def copies(self) -> list:
+        with self._lock:
+            return [values.copy() for values in self._all]
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def samples(self) -> dict:
+        """{label values: value}; histograms give [count per bucket..., +Inf, sum]."""
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        return {
+            "type": self.type,
+            "help": self.help,
+            "labelnames": list(self.labelnames),
+            "samples": [[list(labels), value] for labels, value in self.samples().items()],
+        }
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values = _PerThread()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        values = self._values.mine()
+        values[labels] = values.get(labels, 0.0) + amount
+
+    def samples(self) -> dict:
+        totals = {}
+        for values in self._values.copies():
+            for labels, value in values.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        return totals
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._values = _PerThread()
+
+    def observe(self, value: float, *labels: str) -> None:
+        values = self._values.mine()
+        cell = values.get(labels)
+        if cell is None:
+            cell = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> dict:
+        totals = {}
+        for values in self._values.copies():
+            for labels, cell in values.items():
+                total = totals.get(labels)
+                totals[labels] = list(cell) if total is None else [a + b for a, b in zip(total, cell)]
+        return totals
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "buckets": list(self.buckets)}
+
+
+class Gauge(Metric):
+    """Read at scrape time: collect() returns {label values: value}."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), collect: Callable[[], dict] = dict):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def samples(self) -> dict:
+        return self.collect()
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "shrtnr_http_request_duration_seconds", "Request latency by route template",
+    ("method", "route", "status"),
+)
+DB_QUERY_DURATION = Histogram(
+    "shrtnr_db_query_duration_seconds", "SQL statement latency (its _count is the statement count)",
+    ("operation",),
+)
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"}
+
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip()[:8].split(None, 1)
+    operation = word[0].upper() if word else ""
+    return operation if operation in _OPERATIONS else "OTHER"
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        DB_QUERY_DURATION.observe(time.perf_counter() - started, _operation(statement))
+
+
+def instrument_queries() -> None:
+    """Time statements on every engine: primary, async, shards, replicas and writers."""
+    event.listen(Engine, "before_cursor_execute", _before_execute)
+    event.listen(Engine, "after_cursor_execute", _after_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template, not the path, keeps one series per endpoint
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], route, str(status))
+
+
+def snapshot() -> dict:
+    return {metric.name: metric.snapshot() for metric in _registry}
+
+
+def merge(snapshots: list) -> dict:
+    """Sum snapshots from several workers, series by series."""
+    merged = {}
+    for snap in snapshots:
+        for name, metric in snap.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif isinstance(value, list):
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = current + value
+    for metric in merged.values():
+        metric["samples"] = [[list(labels), value] for labels, value in metric["samples"].items()]
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(names, values, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snap: dict) -> str:
+    lines = []
+    for name, metric in snap.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        names = metric["labelnames"]
+        for labels, value in metric["samples"]:
+            if metric["type"] != "histogram":
+                lines.append(f"{name}{_labels(names, labels)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric["buckets"] + ["+Inf"], value[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(float(bound))
+                lines.append(f"{name}_bucket{_labels(names, labels, ('le', le))} {cumulative}")
+            lines.append(f"{name}_count{_labels(names, labels)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_number(float(value[-1]))}")
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+def write_snapshot() -> None:
+    path = _snapshot_path(os.getpid())
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(path + ".tmp", path)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def exposition() -> str:
+    """The /metrics body: this worker, or every live worker with METRICS_DIR."""
+    if not METRICS_DIR:
+        return render(snapshot())
+
+    write_snapshot()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        name = os.path.basename(path)[:-len(".json")]
+        if not name.isdigit():
+            continue
+        if not _alive(int(name)):
+            # Its counters go with it; Prometheus treats the drop as a reset
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return render(merge(snapshots))
+
+
+_publisher: Optional[asyncio.Task] = None
+
+
+async def _publish() -> None:
+    while True:
+        await run_in_threadpool(write_snapshot)
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+
+
+def start_publishing() -> None:
+    """Write this worker's snapshot to METRICS_DIR periodically; call from the event loop."""
+    global _publisher
+    if METRICS and METRICS_DIR and _publisher is None:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _publisher = asyncio.get_running_loop().create_task(_publish())
+
+
+def stop_publishing() -> None:
+    global _publisher
+    if _publisher is not None:
+        _publisher.cancel()
+        _publisher = None
+        try:
+            os.remove(_snapshot_path(os.getpid()))
+        except FileNotFoundError:
+            pass
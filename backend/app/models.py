@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import secrets
@@ -30,9 +30,11 @@ class URL(Base):
     api_key = relationship("APIKey", back_populates="urls")
     clicks = relationship("Click", back_populates="url", cascade="all, delete-orphan")
 
-    @property
-    def click_count(self):
-        return len(self.clicks)
+    # Keyset pagination walks (created_at, id) newest first, optionally per key
+    __table_args__ = (
+        Index("ix_urls_created_at_id", "created_at", "id"),
+        Index("ix_urls_api_key_id_created_at_id", "api_key_id", "created_at", "id"),
+    )
 
 
 class Click(Base):
@@ -47,3 +49,6 @@ class Click(Base):
     country = Column(String, nullable=True)
 
     url = relationship("URL", back_populates="clicks")
+
+    # Per-URL stats and the ETag version probe filter clicks by url_id
+    __table_args__ = (Index("ix_clicks_url_id_clicked_at", "url_id", "clicked_at"),)
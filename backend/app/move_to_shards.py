@@ -0,0 +1,89 @@
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import delete, insert, select
+
+from .database import create_shard_tables, engine, shards
+from .models import URL, Click
+from .redirects import close_store, redirect_store
+from .shards import shard_index
+
+# One-shot move of the links and clicks left in DATABASE_URL into the
+# SHRTNR_SQLITE_SHARDS files, for turning sharding on over an existing
+# database (the backend refuses to start sharded while any are left).
+# Links get new ids in their shard (id % shards == shard index) and their
+# clicks follow them. Each chunk is committed to the shards before it is
+# deleted from DATABASE_URL, and links already in their shard are skipped,
+# so an interrupted run can be started again. Stop the workers first.
+# Run from backend/: SHRTNR_SQLITE_SHARDS=4 python -m app.move_to_shards
+
+urls = URL.__table__
+clicks = Click.__table__
+CLICK_COLUMNS = [column for column in clicks.c if column.name != "id"]
+CLICK_BATCH = 5000
+
+
+def _move_links(main, index: int, rows: list) -> int:
+    count = len(shards)
+    with shards[index].engine.begin() as conn:
+        moved = set(conn.execute(
+            select(urls.c.short_code).where(urls.c.short_code.in_([row.short_code for row in rows]))
+        ).scalars())
+        # Ids stay unique across shards: the shard's next id, then every count-th
+        next_id = (conn.execute(select(urls.c.id).order_by(urls.c.id.desc()).limit(1)).scalar() or 0) // count
+        next_id = (next_id + 1) * count + index
+        new_ids = {}
+        for row in rows:
+            if row.short_code in moved:
+                continue
+            conn.execute(insert(urls).values({**row._mapping, "id": next_id}))
+            new_ids[row.id] = next_id
+            next_id += count
+
+        result = main.execution_options(yield_per=CLICK_BATCH).execute(
+            select(*CLICK_COLUMNS).where(clicks.c.url_id.in_(list(new_ids)))
+        )
+        for batch in result.partitions():
+            conn.execute(insert(clicks), [{**click._mapping, "url_id": new_ids[click.url_id]} for click in batch])
+    return len(new_ids)
+
+
+def move_to_shards(chunk_size: int = 500) -> int:
+    """Move every link in DATABASE_URL into its shard; returns how many were moved."""
+    create_shard_tables()
+    total = 0
+    while True:
+        with engine.connect() as main:
+            rows = main.execute(select(urls).order_by(urls.c.id).limit(chunk_size)).all()
+            if not rows:
+                return total
+            by_shard = defaultdict(list)
+            for row in rows:
+                by_shard[shard_index(row.short_code, len(shards))].append(row)
+            for index, shard_rows in by_shard.items():
+                total += _move_links(main, index, shard_rows)
+        with engine.begin() as main:
+            ids = [row.id for row in rows]
+            main.execute(delete(clicks).where(clicks.c.url_id.in_(ids)))
+            main.execute(delete(urls).where(urls.c.id.in_(ids)))
+        if redirect_store:
+            # Entries carry the old ids
+            for row in rows:
+                redirect_store.delete(row.short_code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move links from DATABASE_URL into the SQLite shards.")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+    if not shards:
+        parser.error("set SHRTNR_SQLITE_SHARDS above 1 (and a SQLite DATABASE_URL)")
+    try:
+        moved = move_to_shards(args.chunk_size)
+    finally:
+        close_store()
+    print(f"Moved {moved} links into {len(shards)} shards")
+
+
+if __name__ == "__main__":
+    main()
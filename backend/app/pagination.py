@@ -0,0 +1,25 @@
+import base64
+import json
+from datetime import datetime
+
+# Largest page a listing serves, cursor or offset
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at: datetime, url_id: int) -> str:
+    """Opaque cursor pointing just past the (created_at, id) of the last row."""
+    raw = json.dumps([created_at.isoformat(), url_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, url_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(url_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
@@ -0,0 +1,107 @@
+import asyncio
+import cProfile
+import marshal
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+# On-demand profile of a live worker, served on GET /api/admin/profile to
+# callers presenting SHRTNR_PROFILER_TOKEN as X-Admin-Token. Nothing runs
+# until a profile is requested: no thread, no hooks, no per-request work.
+# Empty token (default): the endpoint answers 404.
+#   sample    a thread reads every other thread's stack each interval and
+#             returns collapsed stacks ("thread;outer;...;inner count"), the
+#             input of flamegraph.pl, speedscope and inferno
+#   cprofile  deterministic profile of the event loop thread, returned as
+#             a pstats file (snakeviz, flameprof); for interpreters without
+#             sys._current_frames
+# Each uvicorn worker profiles only itself.
+PROFILER_TOKEN = os.getenv("SHRTNR_PROFILER_TOKEN", "")
+PROFILER_MAX_SECONDS = float(os.getenv("SHRTNR_PROFILER_MAX_SECONDS", "60"))
+PROFILER_INTERVAL_MS = float(os.getenv("SHRTNR_PROFILER_INTERVAL_MS", "5"))
+
+MODES = ("sample", "cprofile")
+DEFAULT_MODE = "sample" if hasattr(sys, "_current_frames") else "cprofile"
+
+# Innermost frames of threads parked waiting for work; left out of samples
+# unless asked for, so idle pool threads do not swamp the flame graph
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+_running = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Another profile of this process is in progress."""
+
+
+def authorized(token) -> bool:
+    return bool(PROFILER_TOKEN) and token is not None and secrets.compare_digest(token, PROFILER_TOKEN)
+
+
+def _label(code, labels: dict) -> str:
+    label = labels.get(code)
+    if label is None:
+        path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+        label = labels[code] = f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+    return label
+
+
+def sample_stacks(seconds: float, interval: float, include_idle: bool = False) -> Counter:
+    """Count (thread name, outermost frame, ..., innermost frame) over `seconds`."""
+    me = threading.get_ident()
+    names: dict = {}
+    labels: dict = {}
+    counts: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if not include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                continue
+            if ident not in names:
+                names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code, labels))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[tuple(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts: Counter) -> bytes:
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in counts.most_common()).encode()
+
+
+async def profile(mode: str, seconds: float, interval: float, include_idle: bool = False) -> bytes:
+    """Profile this process for `seconds`; call from the event loop."""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        if mode == "sample":
+            counts = await asyncio.to_thread(sample_stacks, seconds, interval, include_idle)
+            return collapsed(counts)
+        # Profiles what runs on this thread while we wait: the event loop,
+        # async routes and middleware, not the thread pool
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        return marshal.dumps(profiler.stats)
+    finally:
+        _running.release()
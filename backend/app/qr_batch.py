@@ -0,0 +1,90 @@
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Iterable, Iterator
+
+from .executors import PROCESS_WORKERS, get_process_pool
+from .qr import QRParams, cached_qr, qr_cache_key, render_qr, store_qr
+
+QR_BATCH_MAX_CODES = int(os.getenv("SHRTNR_QR_BATCH_MAX_CODES", "10000"))
+
+
+class _ZipSink:
+    """Write-only, non-seekable file object that hands out what was written."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_qr_zip(
+    items: Iterable[tuple[str, str]],
+    fmt: str,
+    params: QRParams,
+    missing: Iterable[str] = ()
+) -> Iterator[bytes]:
+    """Render (short_code, short_url) pairs across the process pool and yield a ZIP.
+
+    Cached images are written straight away; the rest are rendered in
+    completion order, with at most two renders per worker in flight. Each
+    finished entry is flushed to the client right away, so memory stays flat
+    however many codes are requested.
+    """
+    sink = _ZipSink()
+    # PNGs are already deflated; SVG text compresses well
+    compression = zipfile.ZIP_STORED if fmt == "png" else zipfile.ZIP_DEFLATED
+    archive = zipfile.ZipFile(sink, mode="w", compression=compression)
+    pool = get_process_pool()
+    errors = [f"{code}: not found" for code in missing]
+
+    pending = {}
+
+    def collect_finished() -> None:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            code, key = pending.pop(future)
+            try:
+                data = future.result()
+            except Exception as e:
+                errors.append(f"{code}: {e}")
+            else:
+                store_qr(key, fmt, data)
+                archive.writestr(f"{code}.{fmt}", data)
+
+    for code, short_url in items:
+        key = qr_cache_key(short_url, fmt, params)
+        data = cached_qr(key, fmt)
+        if data is not None:
+            archive.writestr(f"{code}.{fmt}", data)
+        else:
+            while len(pending) >= PROCESS_WORKERS * 2:
+                collect_finished()
+            pending[pool.submit(render_qr, short_url, fmt, params)] = (code, key)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    while pending:
+        collect_finished()
+        yield sink.drain()
+
+    if errors:
+        archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    archive.close()
+    yield sink.drain()
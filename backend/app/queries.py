@@ -0,0 +1,289 @@
+import asyncio
+import heapq
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Optional
+
+from sqlalchemy import delete, desc, func, insert, literal, select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from .database import ReplicatedDB, ShardedDB, write_async
+from .models import URL, Click
+from .redirects import Redirect, forget, remember
+from .replicas import note_write
+from .shards import next_url_id
+
+# Data access for urls/clicks, run on an AsyncSession, a ThreadedSession, a
+# ShardedDB or a ReplicatedDB. An AsyncSession cannot lazy-load
+# relationships, so counts and aggregates are always selected explicitly.
+# With shards, lookups by short_code go to one shard; everything else fans
+# out and is merged here. With replicas, reads that tolerate lag go through
+# _read(); writes and the reads guarding them use the primary. Creating and
+# deleting a link also writes through to the redirect store.
+
+IN_CHUNK_SIZE = 500
+
+
+def _session(db, short_code: Optional[str]):
+    """Session for writes and for reads that must see them."""
+    if isinstance(db, ShardedDB):
+        return db.for_code(short_code)
+    if isinstance(db, ReplicatedDB):
+        return db.primary
+    return db
+
+
+async def _read(db, query, short_code: Optional[str] = None, api_key_id: Optional[int] = None):
+    if isinstance(db, ReplicatedDB):
+        return await db.read(query, short_code=short_code, api_key_id=api_key_id)
+    return await query(_session(db, short_code))
+
+
+async def _fan_out(db, query, api_key_id: Optional[int] = None) -> list:
+    """[query(session)] once per shard, or once on the read session."""
+    if isinstance(db, ShardedDB):
+        return await asyncio.gather(*(query(session) for session in db.all()))
+    return [await _read(db, query, api_key_id=api_key_id)]
+
+
+def _click_count():
+    return (
+        select(func.count(Click.id))
+        .where(Click.url_id == URL.id)
+        .correlate(URL)
+        .scalar_subquery()
+    )
+
+
+async def find_url(db, short_code: str, primary: bool = False) -> Optional[URL]:
+    query = select(URL).where(URL.short_code == short_code)
+    if primary:
+        return await _session(db, short_code).scalar(query)
+    return await _read(db, lambda session: session.scalar(query), short_code=short_code)
+
+
+async def short_code_taken(db, short_code: str) -> bool:
+    session = _session(db, short_code)
+    return await session.scalar(select(URL.id).where(URL.short_code == short_code)) is not None
+
+
+async def existing_codes(db, codes: list) -> set:
+    async def lookup(session, codes):
+        found = set()
+        for i in range(0, len(codes), IN_CHUNK_SIZE):
+            chunk = codes[i:i + IN_CHUNK_SIZE]
+            result = await session.execute(select(URL.short_code).where(URL.short_code.in_(chunk)))
+            found.update(code for (code,) in result)
+        return found
+
+    if not isinstance(db, ShardedDB):
+        return await _read(db, lambda session: lookup(session, codes))
+
+    by_shard = defaultdict(list)
+    for code in codes:
+        by_shard[db.for_code(code)].append(code)
+    found = await asyncio.gather(*(lookup(session, codes) for session, codes in by_shard.items()))
+    return set().union(*found)
+
+
+async def create_url(db, original_url: str, short_code: str, api_key_id: Optional[int]) -> URL:
+    url_id = None
+    if isinstance(db, ShardedDB):
+        url_id = next_url_id(URL.__table__, db.index_for(short_code), db.count)
+
+    def insert(session):
+        url = URL(original_url=original_url, short_code=short_code, api_key_id=api_key_id)
+        if url_id is not None:
+            url.id = url_id
+        session.add(url)
+        session.flush()
+        return url
+
+    url = await write_async(_session(db, short_code), insert)
+    note_write(short_code, api_key_id)
+    await remember(url)
+    return url
+
+
+async def delete_url(db, url: URL) -> bool:
+    """False when a concurrent request deleted the link first."""
+    url_id = url.id
+
+    def remove(session):
+        # Its clicks first, as the ORM cascade did; the rowcount tells a
+        # concurrent delete that got there first
+        session.execute(delete(Click).where(Click.url_id == url_id))
+        return session.execute(delete(URL).where(URL.id == url_id)).rowcount > 0
+
+    deleted = await write_async(_session(db, url.short_code), remove)
+    if deleted:
+        note_write(url.short_code, url.api_key_id)
+        await forget(url.short_code)
+    return deleted
+
+
+async def record_click(db, url: URL, ip_address, user_agent, referer) -> bool:
+    """False when the link no longer exists."""
+    url_id = url.id
+    # The link's id is selected rather than inserted as is: a link deleted
+    # since it was looked up (by another worker, while the redirect store
+    # still had it) inserts nothing. Shards do not check foreign keys.
+    link = select(URL.id, literal(ip_address), literal(user_agent), literal(referer)).where(URL.id == url_id)
+    statement = insert(Click).from_select(["url_id", "ip_address", "user_agent", "referer"], link)
+
+    def insert_click(session):
+        return session.execute(statement).rowcount > 0
+
+    try:
+        return await write_async(_session(db, url.short_code), insert_click)
+    except IntegrityError:
+        # Deleted between the select and the insert (Postgres)
+        return False
+
+
+async def url_stats_version(db, short_code: str):
+    """(URL, total clicks, last click id), or None; cheap enough to run before an ETag check."""
+    query = (
+        select(URL, func.count(Click.id), func.max(Click.id))
+        .outerjoin(Click, Click.url_id == URL.id)
+        .where(URL.short_code == short_code)
+        .group_by(URL.id)
+    )
+
+    async def version(session):
+        return (await session.execute(query)).first()
+
+    return await _read(db, version, short_code=short_code)
+
+
+async def clicks_by_day(db, url: URL, since: datetime) -> dict:
+    query = select(Click.clicked_at).where(Click.url_id == url.id, Click.clicked_at >= since)
+
+    async def by_day(session):
+        counts = defaultdict(int)
+        for (clicked_at,) in await session.execute(query):
+            counts[clicked_at.strftime("%Y-%m-%d")] += 1
+        return dict(counts)
+
+    return await _read(db, by_day, short_code=url.short_code)
+
+
+async def top_referers(db, url: URL, limit: int = 5) -> list:
+    referer = func.coalesce(Click.referer, "Direct")
+    query = (
+        select(referer, func.count(Click.id).label("count"))
+        .where(Click.url_id == url.id)
+        .group_by(referer)
+        .order_by(desc("count"))
+        .limit(limit)
+    )
+
+    async def top(session):
+        return [{"referer": ref, "count": count} for ref, count in await session.execute(query)]
+
+    return await _read(db, top, short_code=url.short_code)
+
+
+async def list_urls_page(
+    db,
+    api_key_id: Optional[int],
+    limit: int,
+    offset: Optional[int] = None,
+    after: Optional[tuple] = None
+) -> list:
+    """[(URL, click_count)] newest first, by offset or after a (created_at, id) keyset."""
+    query = select(URL, _click_count())
+    if api_key_id:
+        query = query.where(URL.api_key_id == api_key_id)
+    query = query.order_by(URL.created_at.desc(), URL.id.desc())
+    if after is not None:
+        query = query.where(tuple_(URL.created_at, URL.id) < tuple_(*after))
+
+    if not isinstance(db, ShardedDB):
+        if offset:
+            query = query.offset(offset)
+
+        async def page(session):
+            return (await session.execute(query.limit(limit))).all()
+
+        return await _read(db, page, api_key_id=api_key_id)
+
+    # Each shard's first offset + limit rows cover the merged page
+    offset = offset or 0
+
+    async def page(session):
+        return (await session.execute(query.limit(offset + limit))).all()
+
+    pages = await _fan_out(db, page)
+    merged = heapq.merge(*pages, key=lambda row: (row[0].created_at, row[0].id), reverse=True)
+    return list(merged)[offset:offset + limit]
+
+
+async def codes_for_api_key(db, api_key_id: int, limit: int) -> list:
+    """Short codes of a key's links, oldest first."""
+    query = select(URL.id, URL.short_code).where(URL.api_key_id == api_key_id).order_by(URL.id).limit(limit)
+
+    async def codes(session):
+        return (await session.execute(query)).all()
+
+    return [code for _, code in heapq.merge(*await _fan_out(db, codes, api_key_id))][:limit]
+
+
+async def global_stats(db, today: date) -> dict:
+    async def counts(session):
+        return {
+            "total_urls": await session.scalar(select(func.count(URL.id))),
+            "total_clicks": await session.scalar(select(func.count(Click.id))),
+            "urls_today": await session.scalar(
+                select(func.count(URL.id)).where(func.date(URL.created_at) == today)
+            ),
+            "clicks_today": await session.scalar(
+                select(func.count(Click.id)).where(func.date(Click.clicked_at) == today)
+            ),
+        }
+
+    totals = defaultdict(int)
+    for shard_counts in await _fan_out(db, counts):
+        for name, count in shard_counts.items():
+            totals[name] += count
+    return dict(totals)
+
+
+async def trending_urls(db, since: datetime, limit: int) -> list:
+    """[(URL, click_count)] by clicks since `since`, most first."""
+    recent_clicks = func.count(Click.id).label("recent_clicks")
+    query = (
+        select(URL, _click_count(), recent_clicks)
+        .join(Click, Click.url_id == URL.id)
+        .where(Click.clicked_at >= since)
+        .group_by(URL.id)
+        .order_by(desc(recent_clicks))
+        .limit(limit)
+    )
+
+    async def top(session):
+        return (await session.execute(query)).all()
+
+    rows = [row for rows in await _fan_out(db, top) for row in rows]
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return [(url, click_count) for url, click_count, _ in rows[:limit]]
+
+
+async def hot_links(db, since: datetime, limit: int) -> list:
+    """[Redirect] for the links with most clicks since `since`, most first."""
+    recent_clicks = func.count(Click.id).label("recent_clicks")
+    query = (
+        select(URL.id, URL.short_code, URL.original_url, recent_clicks)
+        .join(Click, Click.url_id == URL.id)
+        .where(Click.clicked_at >= since)
+        .group_by(URL.id)
+        .order_by(desc(recent_clicks))
+        .limit(limit)
+    )
+
+    async def top(session):
+        return (await session.execute(query)).all()
+
+    rows = [row for rows in await _fan_out(db, top) for row in rows]
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return [Redirect(id, short_code, original_url) for id, short_code, original_url, _ in rows[:limit]]
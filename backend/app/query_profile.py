@@ -0,0 +1,158 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .database import shards
+
+# Per-request SQL profile for development and CI. Counts the statements a
+# request runs, flags the same statement repeated within one request (an
+# N+1 pattern) and statements slower than SHRTNR_SLOW_QUERY_MS, and checks
+# the count against the route's budget below.
+#   off    nothing is hooked (default)
+#   log    problems are logged as warnings on "shrtnr.queries"
+#   raise  problems also turn the response into a 500 listing them, so any
+#          test run that exercises the route fails
+QUERY_PROFILE = os.getenv("SHRTNR_QUERY_PROFILE", "off").lower()
+SLOW_QUERY_MS = float(os.getenv("SHRTNR_SLOW_QUERY_MS", "100"))
+# The same SQL on the same database this many times in one request
+QUERY_REPEAT_LIMIT = int(os.getenv("SHRTNR_QUERY_REPEAT_LIMIT", "5"))
+
+# Most statements each route may run: with an uncached API key lookup, a
+# database-backed rate limit, writes made in the request (no SQLite writer)
+# and a replica miss retried on the primary. None: work grows with the
+# request by design, so only slow statements are flagged. Fan-out routes run
+# their queries once per SQLite shard, so budgets scale with the shard count.
+QUERY_BUDGETS = {
+    "GET /health": 0,
+    "GET /health/ready": 1,
+    "GET /metrics": 0,
+    "GET /api/admin/profile": 0,
+    "POST /api/shorten": 5,
+    "GET /{short_code}": 3,
+    "GET /api/urls/{short_code}": 5,
+    "GET /api/urls": 3,
+    "DELETE /api/urls/{short_code}": 6,
+    "GET /api/urls/{short_code}/qr": 3,
+    "POST /api/qr/batch": None,
+    "POST /api/keys": 3,
+    "GET /api/keys": 2,
+    "DELETE /api/keys/{key_id}": 4,
+    "GET /api/stats": 5,
+    "GET /api/trending": 2,
+}
+
+logger = logging.getLogger("shrtnr.queries")
+
+_current: ContextVar[Optional["QueryProfile"]] = ContextVar("query_profile", default=None)
+
+
+class QueryProfile:
+    """Statements run on behalf of one request, from any thread."""
+
+    def __init__(self):
+        self.count = 0
+        self.repeats: dict = {}
+        self.slow: list = []
+        self._lock = threading.Lock()
+
+    def record(self, engine, statement: str, ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            key = (engine, statement)
+            self.repeats[key] = self.repeats.get(key, 0) + 1
+            if ms >= SLOW_QUERY_MS:
+                self.slow.append((ms, statement))
+
+    def problems(self, route: str) -> list:
+        found = []
+        budget = QUERY_BUDGETS.get(route)
+        if budget is not None and self.count > budget * max(len(shards), 1):
+            found.append(f"{self.count} statements, budget {budget}")
+        unbounded = route in QUERY_BUDGETS and budget is None
+        for (_, statement), times in self.repeats.items():
+            if times >= QUERY_REPEAT_LIMIT and not unbounded:
+                found.append(f"repeated {times}x (N+1?): {_shorten(statement)}")
+        for ms, statement in self.slow:
+            found.append(f"slow {ms:.0f} ms: {_shorten(statement)}")
+        return found
+
+
+def _shorten(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_profile_started", None)
+    profile = _current.get()
+    if started is not None and profile is not None:
+        profile.record(conn.engine, statement, (time.perf_counter() - started) * 1000)
+
+
+def profile_queries() -> None:
+    """Profile statements on every engine; ones run by the SQLite writer thread are not attributed."""
+    event.listen(Engine, "before_cursor_execute", _before_execute)
+    event.listen(Engine, "after_cursor_execute", _after_execute)
+
+
+class QueryProfileMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _current.set(profile)
+        replaced = False
+
+        async def send_checked(message: Message) -> None:
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                route = f"{scope['method']} {getattr(scope.get('route'), 'path', scope['path'])}"
+                problems = profile.problems(route)
+                if problems:
+                    logger.warning(
+                        "%s: %s", route, "; ".join(problems),
+                        extra={"route": route, "queries": profile.count, "problems": problems},
+                    )
+                    if QUERY_PROFILE == "raise":
+                        replaced = True
+                        body = json.dumps({"detail": "Query profile check failed", "route": route,
+                                           "problems": problems}).encode()
+                        await send({
+                            "type": "http.response.start",
+                            "status": 500,
+                            "headers": [
+                                (b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode()),
+                                (b"x-query-count", str(profile.count).encode()),
+                            ],
+                        })
+                        await send({"type": "http.response.body", "body": body})
+                        return
+                MutableHeaders(scope=message).append("X-Query-Count", str(profile.count))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_checked)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .metrics import Counter, Gauge
+
+# Key-value store answering short_code -> destination ahead of the SQL
+# database, which stays the system of record for links and clicks.
+#   sqlite:///./redirects.db   one memory-mapped key/value file, shared by
+#                              every worker on the host
+#   memory                     per-process LRU (SHRTNR_REDIRECT_STORE_SIZE)
+# Empty or "off" disables it. Entries are written through on shorten and
+# delete and filled in when a redirect falls back to SQL.
+REDIRECT_STORE = os.getenv("SHRTNR_REDIRECT_STORE", "")
+# Seconds an entry is trusted before the next redirect re-reads SQL; 0 keeps
+# it until the link is deleted. A delete only reaches the stores it is made
+# through, so unset this defaults to 0 for the SQLite file (every worker on
+# the host shares it) and to UNSHARED_STORE_TTL for the per-worker memory
+# store. Set it for the SQLite file too when links are deleted on other hosts.
+REDIRECT_STORE_TTL = os.getenv("SHRTNR_REDIRECT_STORE_TTL", "")
+UNSHARED_STORE_TTL = 300.0
+# Most links the memory store holds per worker
+REDIRECT_STORE_SIZE = int(os.getenv("SHRTNR_REDIRECT_STORE_SIZE", "100000"))
+# Before serving, each worker loads the links with the most clicks over the
+# last SHRTNR_REDIRECT_WARM_DAYS into the store, so the first redirects of
+# viral links after a deploy do not all fall through to SQL at once. The
+# query and the loading together stop after SHRTNR_REDIRECT_WARM_BUDGET
+# seconds; startup then goes ahead with what was loaded. 0 links: no warm-up.
+REDIRECT_WARM_LINKS = int(os.getenv("SHRTNR_REDIRECT_WARM_LINKS", "1000"))
+REDIRECT_WARM_BUDGET = float(os.getenv("SHRTNR_REDIRECT_WARM_BUDGET", "5"))
+REDIRECT_WARM_DAYS = float(os.getenv("SHRTNR_REDIRECT_WARM_DAYS", "7"))
+
+logger = logging.getLogger("shrtnr.redirects")
+
+REDIRECT_STORE_LOOKUPS = Counter(
+    "shrtnr_redirect_store_lookups_total", "Redirect store lookups by result (hit or miss)", ("result",)
+)
+
+_warmup: dict = {}
+REDIRECT_WARMUP_SECONDS = Gauge(
+    "shrtnr_redirect_warmup_seconds", "How long this worker's startup warm-up of the redirect store took",
+    collect=lambda: {(): _warmup["seconds"]} if _warmup else {},
+)
+REDIRECT_WARMUP_LINKS = Gauge(
+    "shrtnr_redirect_warmup_links", "Links loaded into the redirect store at startup",
+    collect=lambda: {(): _warmup["links"]} if _warmup else {},
+)
+
+
+class Redirect(NamedTuple):
+    """What a redirect needs; stands in for the URL row when recording the click."""
+    id: int
+    short_code: str
+    original_url: str
+
+
+def store_ttl(shared: bool) -> float:
+    """SHRTNR_REDIRECT_STORE_TTL, or the default for a store that is (not) shared."""
+    if REDIRECT_STORE_TTL:
+        return float(REDIRECT_STORE_TTL)
+    return 0.0 if shared else UNSHARED_STORE_TTL
+
+
+class RedirectStore:
+    def get(self, short_code: str) -> Optional[Redirect]:
+        raise NotImplementedError
+
+    def put(self, redirect: Redirect) -> None:
+        raise NotImplementedError
+
+    def delete(self, short_code: str) -> None:
+        raise NotImplementedError
+
+    def put_many(self, redirects: list) -> None:
+        for redirect in redirects:
+            self.put(redirect)
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryRedirectStore(RedirectStore):
+    """Per-process LRU: past `maxsize` links, the least recently used go first."""
+
+    def __init__(self, ttl: float = store_ttl(shared=False), maxsize: int = REDIRECT_STORE_SIZE):
+        self.ttl = ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl or None)
+
+    def get(self, short_code: str) -> Optional[Redirect]:
+        return self._cache.get(short_code)
+
+    def put(self, redirect: Redirect) -> None:
+        self._cache.set(redirect.short_code, redirect)
+
+    def delete(self, short_code: str) -> None:
+        self._cache.pop(short_code)
+
+    def size(self) -> int:
+        return len(self._cache)
+
+
+class SQLiteRedirectStore(RedirectStore):
+    """A single-table SQLite file used as a key/value store.
+
+    Lookups are a primary-key probe on a WITHOUT ROWID table through
+    memory-mapped pages, so they stay in the microseconds and never wait on
+    analytics queries. WAL lets every worker process read while one writes.
+    Connections are per thread, as sqlite3 requires.
+    """
+
+    # get() skips expired rows; they are deleted at most this often (seconds)
+    PRUNE_INTERVAL = 60
+
+    PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 64 * 1024 * 1024,
+    }
+
+    def __init__(self, path: str, ttl: float = store_ttl(shared=True)):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS redirects ("
+            "short_code TEXT PRIMARY KEY, url_id INTEGER NOT NULL, "
+            "original_url TEXT NOT NULL, expires_at REAL) WITHOUT ROWID"
+        )
+        self._connection().execute(
+            "CREATE INDEX IF NOT EXISTS redirects_expires_at ON redirects (expires_at)"
+        )
+        self._next_prune = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every put/delete is its own short transaction
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            for name, value in self.PRAGMAS.items():
+                conn.execute(f"PRAGMA {name}={value}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, short_code: str) -> Optional[Redirect]:
+        row = self._connection().execute(
+            "SELECT url_id, original_url FROM redirects "
+            "WHERE short_code = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (short_code, time.time())
+        ).fetchone()
+        return Redirect(row[0], short_code, row[1]) if row else None
+
+    def put(self, redirect: Redirect) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self._connection().execute(
+            "INSERT OR REPLACE INTO redirects (short_code, url_id, original_url, expires_at) VALUES (?, ?, ?, ?)",
+            (redirect.short_code, redirect.id, redirect.original_url, expires_at)
+        )
+        if self.ttl and time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def put_many(self, redirects: list) -> None:
+        expires_at = time.time() + self.ttl if self.ttl else None
+        conn = self._connection()
+        # One transaction, so one WAL commit for the whole batch
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO redirects (short_code, url_id, original_url, expires_at) VALUES (?, ?, ?, ?)",
+                [(r.short_code, r.id, r.original_url, expires_at) for r in redirects]
+            )
+        if self.ttl and time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete expired rows."""
+        self._next_prune = time.monotonic() + self.PRUNE_INTERVAL
+        self._connection().execute("DELETE FROM redirects WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, short_code: str) -> None:
+        self._connection().execute("DELETE FROM redirects WHERE short_code = ?", (short_code,))
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM redirects").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def create_store(url: str) -> Optional[RedirectStore]:
+    if not url or url.lower() == "off":
+        return None
+    if url == "memory":
+        return MemoryRedirectStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteRedirectStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported SHRTNR_REDIRECT_STORE: {url}")
+
+
+redirect_store = create_store(REDIRECT_STORE)
+
+
+def lookup(short_code: str) -> Optional[Redirect]:
+    # Called on the event loop: a WAL read does not wait on writers
+    if not redirect_store:
+        return None
+    redirect = redirect_store.get(short_code)
+    REDIRECT_STORE_LOOKUPS.inc("miss" if redirect is None else "hit")
+    return redirect
+
+
+async def remember(url) -> None:
+    if redirect_store:
+        await run_in_threadpool(redirect_store.put, Redirect(url.id, url.short_code, url.original_url))
+
+
+async def forget(short_code: str) -> None:
+    if redirect_store:
+        await run_in_threadpool(redirect_store.delete, short_code)
+
+
+def _load(redirects: list, deadline: float, chunk_size: int = 100) -> int:
+    loaded = 0
+    while loaded < len(redirects) and time.perf_counter() < deadline:
+        chunk = redirects[loaded:loaded + chunk_size]
+        redirect_store.put_many(chunk)
+        loaded += len(chunk)
+    return loaded
+
+
+async def warm(hot_links: Callable[[datetime, int], Awaitable[list]]) -> int:
+    """Load the hottest links into the store; hot_links(since, limit) returns [Redirect], hottest first."""
+    if not redirect_store or REDIRECT_WARM_LINKS <= 0:
+        return 0
+    start = time.perf_counter()
+    deadline = start + REDIRECT_WARM_BUDGET
+    since = datetime.utcnow() - timedelta(days=REDIRECT_WARM_DAYS)
+    loaded = 0
+    try:
+        redirects = await asyncio.wait_for(hot_links(since, REDIRECT_WARM_LINKS), REDIRECT_WARM_BUDGET)
+        loaded = await run_in_threadpool(_load, redirects, deadline)
+        if loaded < len(redirects):
+            logger.warning("Warm-up budget spent after %d of %d links", loaded, len(redirects))
+    except asyncio.TimeoutError:
+        logger.warning("Warm-up query took longer than %.1fs; starting cold", REDIRECT_WARM_BUDGET)
+    except Exception:
+        # A cold store is slower, not wrong: never fail startup over it
+        logger.exception("Warm-up of the redirect store failed; starting cold")
+    _warmup.update(seconds=time.perf_counter() - start, links=loaded)
+    return loaded
+
+
+def store_size() -> Optional[int]:
+    """Entries in the store, expired ones included; None when there is no store."""
+    return redirect_store.size() if redirect_store else None
+
+
+def close_store() -> None:
+    if redirect_store:
+        redirect_store.close()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, HttpUrl, field_validator
+from pydantic import BaseModel, Field, HttpUrl, field_validator
 from datetime import datetime
 from typing import Optional, List
 import re
@@ -48,6 +48,11 @@ class URLResponse(BaseModel):
         from_attributes = True
 
 
+class URLPage(BaseModel):
+    items: List[URLResponse]
+    next_cursor: Optional[str] = None
+
+
 class URLStatsResponse(BaseModel):
     id: int
     original_url: str
@@ -79,3 +84,17 @@ class APIKeyResponse(BaseModel):
 
 class QRCodeResponse(BaseModel):
     qr_code: str  # Base64 encoded PNG
+
+
+class QRBatchRequest(BaseModel):
+    codes: Optional[List[str]] = None  # Defaults to every link of the API key
+    format: str = Field("png", pattern="^(png|svg)$")
+    size: int = Field(10, ge=1, le=40)
+    ec: str = Field("M", pattern="^[LMQHlmqh]$")
+    border: int = Field(5, ge=0, le=20)
+
+    @field_validator("ec")
+    @classmethod
+    def normalize_ec(cls, v):
+        # Either case, as the api/ handler accepts
+        return v.upper()
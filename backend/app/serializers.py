@@ -0,0 +1,74 @@
+import json
+from datetime import datetime
+from typing import Any, Callable
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    return str(obj)
+
+
+def dumps(data: Any) -> bytes:
+    """Serialize straight to bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
+
+
+def url_encoder(base_url: str) -> Callable[..., dict]:
+    """Build the URLResponse row encoder once per base URL."""
+    prefix = f"{base_url}/"
+
+    def encode_url(url, click_count: int) -> dict:
+        return {
+            "id": url.id,
+            "original_url": url.original_url,
+            "short_code": url.short_code,
+            "created_at": url.created_at,
+            "click_count": click_count,
+            "short_url": prefix + url.short_code,
+        }
+
+    return encode_url
+
+
+def encode_api_key(api_key) -> dict:
+    return {
+        "id": api_key.id,
+        "key": api_key.key,
+        "name": api_key.name,
+        "created_at": api_key.created_at,
+        "is_active": api_key.is_active,
+    }
+
+
+def encode_url_stats(url, click_count: int, clicks_by_day: dict, top_referers: list) -> dict:
+    return {
+        "id": url.id,
+        "original_url": url.original_url,
+        "short_code": url.short_code,
+        "created_at": url.created_at,
+        "click_count": click_count,
+        "clicks": [],
+        "clicks_by_day": clicks_by_day,
+        "top_referers": top_referers,
+    }
+
+
+class JSONBytesResponse(Response):
+    """JSON response for trusted ORM output; skips response_model validation."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
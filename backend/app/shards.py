@@ -0,0 +1,50 @@
+import os
+import zlib
+from functools import partial
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from .sqlite_profile import SQLITE_PRAGMAS, SQLITE_WRITER, apply_pragmas, create_writer
+
+# Number of SQLite files urls/clicks are spread over; 1 keeps them in
+# DATABASE_URL. api_keys and the rate limit buckets always stay there.
+SQLITE_SHARDS = int(os.getenv("SHRTNR_SQLITE_SHARDS", "1"))
+
+SHARDED_TABLES = ("urls", "clicks")
+
+# urls.api_key_id points at api_keys in the main database, which a shard's
+# foreign key checks cannot see: every insert into urls would fail with
+# "no such table". Shards leave them off; record_click checks that the link
+# still exists instead.
+SHARD_PRAGMAS = {**SQLITE_PRAGMAS, "foreign_keys": "OFF"}
+
+
+def shard_index(short_code: str, count: int) -> int:
+    # crc32 rather than hash(): it has to agree across processes and restarts
+    return zlib.crc32(short_code.encode()) % count
+
+
+def shard_url(url, index: int):
+    """./url_shortener.db -> ./url_shortener.shard0.db"""
+    root, ext = os.path.splitext(url.database)
+    return url.set(database=f"{root}.shard{index}{ext or '.db'}")
+
+
+def next_url_id(table, index: int, count: int):
+    """SQL for the shard's next URL id; ids stay unique across shards (id % count == index).
+
+    Evaluated inside the INSERT, so it is atomic under SQLite's write lock
+    even with several processes writing to the same shard.
+    """
+    return select((func.coalesce(func.max(table.c.id), 0) // count + 1) * count + index).scalar_subquery()
+
+
+class Shard:
+    def __init__(self, index: int, url):
+        self.index = index
+        self.engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(self.engine, "connect", partial(apply_pragmas, pragmas=SHARD_PRAGMAS))
+        self.SessionLocal = sessionmaker(autoflush=False, bind=self.engine)
+        # One writer per file, so writes to different shards run in parallel
+        self.writer = create_writer(url, {"check_same_thread": False}, SHARD_PRAGMAS) if SQLITE_WRITER else None
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from .metrics import Counter
+
+# Concurrent requests for the same key share one call instead of each
+# running it: when a link goes viral, hundreds of redirects miss the store
+# at once, and only one SQL lookup per short code is in flight per worker.
+# The call runs as its own task on the first caller's arguments (and so its
+# session); later callers await the same result, exception included. Its
+# result must not depend on who asked.
+
+COALESCED = Counter(
+    "shrtnr_singleflight_coalesced_total", "Calls that joined an identical call already in flight", ("flight",)
+)
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict = {}
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn(*args))
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            COALESCED.inc(self.name)
+        # One caller going away must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here so an error nobody is left to await is not logged as lost
+            task.exception()
@@ -0,0 +1,142 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Callable
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from .metrics import SIZE_BUCKETS, Counter, Histogram
+
+# Applied to every SQLite connection. WAL lets readers run alongside the
+# writer; synchronous=NORMAL is durable across app crashes in WAL mode and
+# only risks the last commits on power loss. SQLite checks foreign keys only
+# when asked to, per connection.
+SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",
+    "journal_mode": "WAL",
+    "synchronous": os.getenv("SHRTNR_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SHRTNR_SQLITE_BUSY_TIMEOUT", "5000")),
+    "mmap_size": int(os.getenv("SHRTNR_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SHRTNR_SQLITE_CACHE_SIZE", "-65536")),  # negative: KiB
+}
+
+SQLITE_WRITER = os.getenv("SHRTNR_SQLITE_WRITER", "on").lower() not in ("off", "0", "false")
+SQLITE_WRITE_BATCH = int(os.getenv("SHRTNR_SQLITE_WRITE_BATCH", "256"))
+
+WRITER_BATCH_SIZE = Histogram(
+    "shrtnr_sqlite_writer_batch_size", "Writes committed per writer transaction", buckets=SIZE_BUCKETS
+)
+WRITER_DROPPED = Counter(
+    "shrtnr_sqlite_writer_dropped_total", "Queued writes not committed, by reason", ("reason",)
+)
+
+
+def apply_pragmas(dbapi_connection, connection_record, pragmas: dict = SQLITE_PRAGMAS) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_writer(url, connect_args: dict, pragmas: dict = SQLITE_PRAGMAS) -> "SQLiteWriter":
+    # Its own connection: requests hold pooled connections while they wait
+    # on the writer, so sharing their pool could starve it
+    engine = create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0)
+    event.listen(engine, "connect", partial(apply_pragmas, pragmas=pragmas))
+    return SQLiteWriter(sessionmaker(autoflush=False, bind=engine))
+
+
+class SQLiteWriter:
+    """Single thread that owns every write to the database.
+
+    SQLite allows one writer at a time, so instead of many threads queueing
+    on the file lock, work items are queued here. Whatever has queued up
+    since the last commit is applied in one transaction (group commit). If
+    the batch fails, its items are retried one by one so a single bad write
+    only fails its own caller.
+    """
+
+    def __init__(self, session_factory, max_batch: int = SQLITE_WRITE_BATCH):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, work: Callable[[Any], Any]) -> Future:
+        """Queue work(session); the future resolves once it is committed."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((work, future))
+        return future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            queued = len(batch)
+            batch = [(work, future) for work, future in batch if future.set_running_or_notify_cancel()]
+            if len(batch) < queued:
+                WRITER_DROPPED.inc("cancelled", amount=queued - len(batch))
+            if batch and not self._apply(batch):
+                for work, future in batch:
+                    self._apply([(work, future)])
+            if stopping:
+                return
+
+    def _apply(self, batch) -> bool:
+        session = self.session_factory(expire_on_commit=False)
+        try:
+            results = []
+            for work, _ in batch:
+                results.append(work(session))
+                session.flush()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(batch) > 1:
+                return False
+            WRITER_DROPPED.inc("error")
+            batch[0][1].set_exception(e)
+            return True
+        finally:
+            session.close()
+
+        WRITER_BATCH_SIZE.observe(len(batch))
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        return True
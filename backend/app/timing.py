@@ -0,0 +1,85 @@
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Per-request phase timings (lookup, click, db, render, serialize, total),
+# sent as a Server-Timing header and logged at INFO on "shrtnr.timing".
+# Off by default; when off the middleware is not installed and phase() is a
+# context variable read returning a shared no-op context manager.
+SERVER_TIMING = os.getenv("SHRTNR_SERVER_TIMING", "off").lower() in ("on", "1", "true")
+
+logger = logging.getLogger("shrtnr.timing")
+
+_current: ContextVar[Optional["Timings"]] = ContextVar("timings", default=None)
+_NO_PHASE = nullcontext()
+
+
+class Timings:
+    """Milliseconds per phase for one request; repeated phases add up."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def total(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def header(self) -> str:
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.phases.items()]
+        entries.append(f"total;dur={self.total():.2f}")
+        return ", ".join(entries)
+
+    def log(self, method: str, path: str, status: Optional[int]) -> None:
+        fields = {name: round(ms, 2) for name, ms in self.phases.items()}
+        fields["total"] = round(self.total(), 2)
+        logger.info(
+            "%s %s %s %s", method, path, status, " ".join(f"{name}={ms}ms" for name, ms in fields.items()),
+            extra={"http_method": method, "path": path, "status": status, "timings": fields},
+        )
+
+
+def phase(name: str):
+    """Context manager timing one phase of the current request, if timing is on."""
+    timings = _current.get()
+    return timings.phase(name) if timings is not None else _NO_PHASE
+
+
+class ServerTimingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = Timings()
+        token = _current.set(timings)
+        status = None
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            timings.log(scope["method"], scope["path"], status)
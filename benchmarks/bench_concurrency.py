@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Redirect latency while QR codes are being rendered.
+
+Starts the FastAPI backend under uvicorn on a scratch SQLite database,
+then measures redirect latency twice: on an idle server, and with QR
+clients continuously requesting uncached PNG renders. With rendering in
+the process pool and DB work in the thread pool, redirect p99 should stay
+close to the idle figure.
+
+Run: python benchmarks/bench_concurrency.py [--redirects 2000] [--concurrency 16] [--qr-clients 8] [--async-db]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, db_path, async_db=False):
+    scheme = "sqlite+aiosqlite" if async_db else "sqlite"
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"{scheme}:///{db_path}",
+        SHRTNR_RATE_LIMITS="off",
+        SHRTNR_QR_CACHE_DIR="",
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT / "backend",
+        env=env,
+    )
+
+
+async def wait_ready(client):
+    for _ in range(100):
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def pick(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    return {
+        "count": len(samples),
+        "p50_ms": round(pick(0.50) * 1000, 2),
+        "p95_ms": round(pick(0.95) * 1000, 2),
+        "p99_ms": round(pick(0.99) * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+async def measure_redirects(client, codes, total, concurrency):
+    latencies = []
+    requests = itertools.islice(itertools.cycle(codes), total)
+
+    async def worker():
+        for code in requests:
+            start = time.perf_counter()
+            response = await client.get(f"/{code}", params={"direct": "true"})
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 307, response.status_code
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+async def qr_load(client, codes, stop):
+    # Every (code, size, border) combination is a fresh render
+    combos = itertools.product(codes, range(20, 41), range(0, 21))
+    rendered = 0
+    for code, size, border in combos:
+        if stop.is_set():
+            break
+        response = await client.get(
+            f"/api/urls/{code}/qr",
+            params={"format": "png", "size": size, "border": border, "ec": "H"},
+        )
+        assert response.status_code == 200, response.status_code
+        rendered += 1
+    return rendered
+
+
+async def run(args):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(port, os.path.join(tmp, "bench.db"), args.async_db)
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency + args.qr_clients + 4)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                await wait_ready(client)
+                codes = []
+                for i in range(args.links):
+                    response = await client.post("/api/shorten", json={"url": f"https://example.com/page/{i}"})
+                    codes.append(response.json()["short_code"])
+
+                # Warm up connections and the process pool
+                await measure_redirects(client, codes, args.concurrency * 4, args.concurrency)
+                await client.get(f"/api/urls/{codes[0]}/qr", params={"format": "png"})
+
+                idle = await measure_redirects(client, codes, args.redirects, args.concurrency)
+
+                stop = asyncio.Event()
+                qr_tasks = [
+                    asyncio.create_task(qr_load(client, codes[i::args.qr_clients], stop))
+                    for i in range(args.qr_clients)
+                ]
+                started = time.perf_counter()
+                loaded = await measure_redirects(client, codes, args.redirects, args.concurrency)
+                elapsed = time.perf_counter() - started
+                stop.set()
+                rendered = sum(await asyncio.gather(*qr_tasks))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps({
+        "database": "async" if args.async_db else "sync",
+        "redirects": args.redirects,
+        "concurrency": args.concurrency,
+        "qr_clients": args.qr_clients,
+        "idle": percentiles(idle),
+        "under_qr_load": percentiles(loaded),
+        "qr_renders_per_s": round(rendered / elapsed, 1),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--redirects", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--qr-clients", type=int, default=8)
+    parser.add_argument("--links", type=int, default=50)
+    parser.add_argument("--async-db", action="store_true", help="use sqlite+aiosqlite (native async engine)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
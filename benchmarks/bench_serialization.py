@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for a 1,000-row URL listing.
+
+Compares the previous response paths against the shared row encoders:
+  - api/ handlers: dicts with .isoformat() per row + json.dumps(default=str)
+  - backend: URLResponse models + FastAPI jsonable_encoder + json.dumps
+  - encoders + dumps (orjson when installed, stdlib fallback)
+
+Run: python benchmarks/bench_serialization.py [--rows 1000] [--repeat 200]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+
+from app import serializers  # noqa: E402
+
+BASE_URL = "https://short.example.com"
+
+
+def make_rows(n):
+    start = datetime(2024, 1, 1)
+    return [
+        SimpleNamespace(
+            id=i,
+            original_url=f"https://example.com/campaigns/2024/spring/landing-page-{i}?utm_source=newsletter&utm_medium=email",
+            short_code=f"c{i:05d}",
+            created_at=start + timedelta(minutes=i),
+            click_count=i % 97,
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_api(rows):
+    results = [{
+        "id": url.id,
+        "original_url": url.original_url,
+        "short_code": url.short_code,
+        "created_at": url.created_at.isoformat(),
+        "click_count": url.click_count,
+        "short_url": f"{BASE_URL}/{url.short_code}"
+    } for url in rows]
+    return json.dumps(results, default=str).encode()
+
+
+def legacy_backend(rows):
+    from fastapi.encoders import jsonable_encoder
+    from app.schemas import URLResponse
+    results = [
+        URLResponse(
+            id=url.id,
+            original_url=url.original_url,
+            short_code=url.short_code,
+            created_at=url.created_at,
+            click_count=url.click_count,
+            short_url=f"{BASE_URL}/{url.short_code}"
+        )
+        for url in rows
+    ]
+    return json.dumps(jsonable_encoder(results)).encode()
+
+
+def encoders(rows, use_orjson=True):
+    encode_url = serializers.url_encoder(BASE_URL)
+    saved = serializers.orjson
+    if not use_orjson:
+        serializers.orjson = None
+    try:
+        return serializers.dumps([encode_url(url, url.click_count) for url in rows])
+    finally:
+        serializers.orjson = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    cases = {
+        "api_legacy": lambda: legacy_api(rows),
+        "backend_legacy": lambda: legacy_backend(rows),
+        "encoders_stdlib": lambda: encoders(rows, use_orjson=False),
+    }
+    if serializers.orjson is not None:
+        cases["encoders_orjson"] = lambda: encoders(rows)
+
+    # Every path must produce the same document
+    expected = json.loads(legacy_api(rows))
+    for name, fn in cases.items():
+        assert json.loads(fn()) == expected, name
+
+    results = {}
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        results[name] = {"ms": round(best * 1000, 3), "bytes": len(fn())}
+
+    baseline = results["backend_legacy"]["ms"]
+    for name, result in results.items():
+        result["speedup_vs_backend"] = round(baseline / result["ms"], 2)
+    print(json.dumps({"rows": args.rows, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Click write throughput across SQLite shard counts.
+
+Creates 1, 2, 4, ... shard files in a scratch directory and has writer
+threads insert clicks through each shard's SQLiteWriter, the same path
+redirects take. Each shard commits independently, so throughput should
+grow with the shard count until cores or the disk run out.
+
+Run: python benchmarks/bench_shards.py [--clicks 20000] [--clients 32] [--shards 1,2,4,8]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from sqlalchemy.engine import make_url
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend"))
+
+from app.database import Base  # noqa: E402
+from app.models import Click, URL  # noqa: E402
+from app.shards import SHARDED_TABLES, Shard, shard_index, shard_url  # noqa: E402
+
+
+def run(count, clicks, clients, directory):
+    base = make_url(f"sqlite:///{directory}/bench{count}.db")
+    shards = [Shard(i, shard_url(base, i)) for i in range(count)]
+    tables = [Base.metadata.tables[name] for name in SHARDED_TABLES]
+    codes = [f"c{i:04d}" for i in range(1000)]
+    url_ids = {}
+    for shard in shards:
+        Base.metadata.create_all(bind=shard.engine, tables=tables)
+    for code in codes:
+        shard = shards[shard_index(code, count)]
+        with shard.SessionLocal() as session:
+            url = URL(original_url="https://example.com", short_code=code)
+            session.add(url)
+            session.commit()
+            url_ids[code] = url.id
+
+    def click(i):
+        code = codes[i % len(codes)]
+        writer = shards[shard_index(code, count)].writer
+        writer.submit(lambda session: session.add(Click(url_id=url_ids[code], referer="bench"))).result()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        wait([pool.submit(click, i) for i in range(clicks)])
+    elapsed = time.perf_counter() - started
+
+    for shard in shards:
+        shard.writer.stop()
+        shard.engine.dispose()
+    return {"shards": count, "seconds": round(elapsed, 3), "clicks_per_s": round(clicks / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clicks", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--shards", default="1,2,4,8")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            run(int(count), args.clicks, args.clients, directory)
+            for count in args.shards.split(",")
+        ]
+    print(json.dumps({"clicks": args.clicks, "clients": args.clients, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Offline performance suite for both backends.
+
+For each dataset size, seeds a scratch SQLite database with datagen.py
+(links across API keys, Zipf-distributed clicks), then runs the FastAPI backend (uvicorn) and the api/ serverless
+handlers (behind a small local router that mirrors the Vercel routes and
+serves one request at a time, like one serverless instance) against a copy
+of it and measures:
+  - redirect throughput and latency percentiles under concurrency
+  - shorten throughput and latency percentiles under concurrency
+  - URL stats, global stats, trending and listing latency (one at a time)
+
+Results are printed, or written with --output, as JSON so that runs can
+be diffed over time. Seeding is deterministic for a given --seed.
+
+Run: python benchmarks/bench_suite.py [--sizes 1000,10000] [--targets fastapi,api]
+                                      [--redirects 2000] [--shortens 500] [--reads 200]
+                                      [--concurrency 16] [--output results.json]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+from bench_concurrency import free_port, percentiles, start_server
+from datagen import ZIPF, generate, zipf_cum_weights
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Vercel routes for the api/ handlers, most specific first
+API_ROUTES = [
+    ("/api/urls/", "/qr", "api/urls/[code]/qr.py"),
+    ("/api/urls/", "", "api/urls/[code].py"),
+    ("/api/urls", None, "api/urls/index.py"),
+    ("/api/keys/", "", "api/keys/[id].py"),
+    ("/api/keys", None, "api/keys/index.py"),
+    ("/api/shorten", None, "api/shorten.py"),
+    ("/api/stats", None, "api/stats.py"),
+    ("/api/trending", None, "api/trending.py"),
+    ("/api/redirect", None, "api/redirect.py"),
+]
+
+
+def serve_api(port):
+    """Serve the api/ handlers on one port, routing like vercel.json does."""
+    import importlib.util
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    def quiet(self, format, *args):
+        pass
+
+    sys.path.insert(0, str(ROOT))
+    handlers = {}
+    for _, _, path in API_ROUTES:
+        spec = importlib.util.spec_from_file_location(f"api_handler_{len(handlers)}", ROOT / path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        handlers[path] = type("handler", (module.handler,), {"log_message": quiet})
+
+    def resolve(path):
+        path = path.split("?", 1)[0].rstrip("/")
+        for prefix, suffix, handler_path in API_ROUTES:
+            if suffix is None:
+                if path == prefix:
+                    return handlers[handler_path]
+            elif path.startswith(prefix) and path.endswith(suffix) and "/" not in path[len(prefix):len(path) - len(suffix)]:
+                return handlers[handler_path]
+        # vercel.json rewrites /:code to /api/redirect?code=:code
+        return handlers["api/redirect.py"]
+
+    class Router(BaseHTTPRequestHandler):
+        def dispatch(self):
+            target = resolve(self.path)
+            method = getattr(target, f"do_{self.command}", None)
+            if method is None:
+                self.send_error(405)
+                return
+            # The handler's helpers (send_json, get_code) live on its class
+            self.__class__ = target
+            try:
+                method(self)
+            finally:
+                self.__class__ = Router
+
+        do_GET = do_POST = do_DELETE = do_OPTIONS = dispatch
+        log_message = quiet
+
+    # One request at a time, like a single serverless instance; concurrent
+    # clients queue in the listen backlog
+    class Server(HTTPServer):
+        request_queue_size = 256
+
+    Server(("127.0.0.1", port), Router).serve_forever()
+
+
+def start_api_server(port, db_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", SHRTNR_RATE_LIMITS="off")
+    return subprocess.Popen([sys.executable, __file__, "--serve-api", str(port)], env=env)
+
+
+TARGETS = {
+    "fastapi": (lambda port, db_path: start_server(port, db_path), "/health"),
+    "api": (start_api_server, "/api/stats"),
+}
+
+
+async def wait_ready(client, path):
+    for _ in range(300):
+        try:
+            if (await client.get(path)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def load(client, make_request, total, concurrency, expect):
+    """Run `total` requests from `concurrency` workers; throughput plus percentiles."""
+    latencies = []
+    counter = itertools.count()
+
+    async def worker():
+        while (i := next(counter)) < total:
+            start = time.perf_counter()
+            response = await make_request(i)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == expect, (response.status_code, response.text[:200])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"requests_per_s": round(total / elapsed, 1), **percentiles(latencies)}
+
+
+async def bench_target(target, db_path, codes, args, rng):
+    start, ready_path = TARGETS[target]
+    port = free_port()
+    server = start(port, db_path)
+    # Requests follow the same popularity curve as the seeded clicks
+    hot = rng.choices(codes, cum_weights=zipf_cum_weights(len(codes), ZIPF), k=1000)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency + 4)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            await wait_ready(client, ready_path)
+
+            def redirect(i):
+                return client.get(f"/{hot[i % len(hot)]}", params={"direct": "true"})
+
+            def shorten(i):
+                return client.post("/api/shorten", json={"url": f"https://example.com/new/{target}/{i}"})
+
+            reads = {
+                "url_stats": (lambda i: client.get(f"/api/urls/{hot[i % len(hot)]}"), 200),
+                "global_stats": (lambda i: client.get("/api/stats"), 200),
+                "trending": (lambda i: client.get("/api/trending"), 200),
+                "listing": (lambda i: client.get("/api/urls", params={"limit": 50, "offset": (i * 50) % len(codes)}), 200),
+            }
+
+            await load(client, redirect, args.concurrency * 4, args.concurrency, 307)  # warm-up
+            result = {"redirect": await load(client, redirect, args.redirects, args.concurrency, 307)}
+            for name, (make_request, expect) in reads.items():
+                result[name] = await load(client, make_request, args.reads, 1, expect)
+            # Last, since it grows the dataset
+            result["shorten"] = await load(client, shorten, args.shortens, args.concurrency, 200)
+            return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "serve_api")},
+    }
+
+
+async def run(args):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            template = os.path.join(tmp, f"seed{size}.db")
+            codes = generate(f"sqlite:///{template}", urls=size, clicks=size * args.clicks_per_link, seed=args.seed)
+            for target in args.targets.split(","):
+                db_path = os.path.join(tmp, f"{target}{size}.db")
+                shutil.copy(template, db_path)
+                measured = await bench_target(target, db_path, codes, args, random.Random(args.seed))
+                results.append({"target": target, "links": size, "clicks": size * args.clicks_per_link, **measured})
+                print(f"{target} @ {size} links: {measured['redirect']['requests_per_s']} redirects/s", file=sys.stderr)
+    return {"meta": metadata(args), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated link counts")
+    parser.add_argument("--clicks-per-link", type=int, default=5)
+    parser.add_argument("--targets", default="fastapi,api")
+    parser.add_argument("--redirects", type=int, default=2000)
+    parser.add_argument("--shortens", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=200, help="requests per stats/trending/listing endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--serve-api", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_api:
+        serve_api(args.serve_api)
+        return
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Query budget check for both backends, for CI.
+
+Seeds a scratch SQLite database with datagen.py, starts the FastAPI backend
+and the api/ handlers with SHRTNR_QUERY_PROFILE=raise, and calls every route
+once. In raise mode a request that runs more statements than its budget,
+repeats one statement (N+1) or runs a slow one gets a 500 listing the
+problems. The SQLite writer is off and rate limits are kept in the database
+so that every statement a request causes is counted against it.
+
+Prints the statement count per route as JSON and exits 1 if any route
+failed its check or returned an unexpected status.
+
+Run: python benchmarks/check_query_budgets.py [--targets fastapi,api] [--urls 500] [--clicks 20000]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from bench_concurrency import free_port
+from datagen import generate
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# High enough never to trip, but checked on every request
+RATE_LIMITS = "shorten=100000/minute,read=100000/minute,write=100000/minute,qr=100000/minute"
+
+
+def start(target, port, db_path):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        SHRTNR_QUERY_PROFILE="raise",
+        SHRTNR_SQLITE_WRITER="off",
+        SHRTNR_RATE_LIMITS=RATE_LIMITS,
+        SHRTNR_RATE_LIMIT_STORE="database",
+        SHRTNR_QR_CACHE_DIR="",
+    )
+    if target == "fastapi":
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+        return subprocess.Popen(command, cwd=ROOT / "backend", env=env)
+    command = [sys.executable, str(ROOT / "benchmarks" / "bench_suite.py"), "--serve-api", str(port)]
+    return subprocess.Popen(command, env=env)
+
+
+def wait_ready(client):
+    for _ in range(300):
+        try:
+            client.get("/api/stats")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def check_target(target, db_path, hot_code):
+    port = free_port()
+    server = start(target, port, db_path)
+    results = []
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            wait_ready(client)
+
+            def call(label, method, path, expect=200, **kwargs):
+                response = client.request(method, path, **kwargs)
+                ok = response.status_code == expect
+                results.append({
+                    "route": label,
+                    "status": response.status_code,
+                    "queries": response.headers.get("X-Query-Count"),
+                    "ok": ok,
+                    **({} if ok else {"body": response.text[:1000]}),
+                })
+                return response
+
+            key = call("POST /api/keys", "POST", "/api/keys", json={"name": "budget check"}).json()
+            auth = {"X-API-Key": key["key"]}
+            call("GET /api/keys", "GET", "/api/keys")
+
+            call("POST /api/shorten (key)", "POST", "/api/shorten", json={"url": "https://example.com/a"}, headers=auth)
+            call("POST /api/shorten (custom)", "POST", "/api/shorten",
+                 json={"url": "https://example.com/b", "custom_code": f"budget{target}"})
+            call("POST /api/shorten (taken)", "POST", "/api/shorten", expect=400,
+                 json={"url": "https://example.com/c", "custom_code": f"budget{target}"})
+
+            call("GET /{code} (direct)", "GET", f"/{hot_code}", expect=307, params={"direct": "true"})
+            call("GET /{code} (interstitial)", "GET", f"/{hot_code}")
+            call("GET /{code} (missing)", "GET", "/no-such-code", expect=404)
+
+            stats = call("GET /api/urls/{code}", "GET", f"/api/urls/{hot_code}")
+            call("GET /api/urls/{code} (revalidate)", "GET", f"/api/urls/{hot_code}", expect=304,
+                 headers={"If-None-Match": stats.headers.get("ETag", "")})
+            call("GET /api/urls (offset)", "GET", "/api/urls", params={"limit": 50, "offset": 50})
+            page = call("GET /api/urls (cursor)", "GET", "/api/urls", params={"limit": 50, "cursor": ""}).json()
+            call("GET /api/urls (next page)", "GET", "/api/urls", params={"limit": 50, "cursor": page["next_cursor"]})
+            call("GET /api/urls (key)", "GET", "/api/urls", headers=auth)
+
+            call("GET /api/stats", "GET", "/api/stats")
+            call("GET /api/trending", "GET", "/api/trending")
+            call("GET /api/urls/{code}/qr", "GET", f"/api/urls/{hot_code}/qr")
+            call("GET /api/urls/{code}/qr (svg)", "GET", f"/api/urls/{hot_code}/qr", params={"format": "svg"})
+            if target == "fastapi":
+                call("POST /api/qr/batch", "POST", "/api/qr/batch", json={"codes": [hot_code, f"budget{target}"]})
+
+            call("DELETE /api/urls/{code}", "DELETE", f"/api/urls/budget{target}")
+            call("DELETE /api/keys/{id}", "DELETE", f"/api/keys/{key['id']}")
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--targets", default="fastapi,api")
+    parser.add_argument("--urls", type=int, default=500)
+    parser.add_argument("--clicks", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for target in args.targets.split(","):
+            db_path = os.path.join(tmp, f"{target}.db")
+            codes = generate(f"sqlite:///{db_path}", urls=args.urls, clicks=args.clicks, seed=args.seed)
+            report[target] = check_target(target, db_path, codes[0])
+
+    print(json.dumps(report, indent=2))
+    failed = [f"{target}: {r['route']}" for target, results in report.items() for r in results if not r["ok"]]
+    if failed:
+        print(f"{len(failed)} route(s) failed: " + ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Synthetic dataset generator: URLs across API keys and a Zipf click history.
+
+Bulk-loads `--urls` links owned by `--api-keys` keys (plus anonymous ones)
+and `--clicks` clicks whose links follow a Zipf distribution, so a handful
+of links take most of the traffic, as in production. Clicks follow a
+daily cycle and draw referers, user agents and client IPs from weighted
+pools. Loads use executemany on SQLite and COPY on Postgres, with the
+secondary indexes dropped during the load and rebuilt afterwards.
+
+Meant for scratch databases: on SQLite, journaling and fsync are off
+while loading. Deterministic for a given --seed.
+
+Run: python benchmarks/datagen.py --database sqlite:///big.db [--urls 1000000] [--clicks 100000000]
+                                  [--api-keys 100] [--url-days 365] [--click-days 90] [--zipf 1.1]
+
+Also importable: bench_suite.py seeds its datasets with generate().
+"""
+
+import argparse
+import bisect
+import io
+import itertools
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BASE62 = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+CODE_LENGTH = 7
+# Coprime with 62**7, so i -> i * CODE_STRIDE mod 62**7 never repeats
+CODE_STRIDE = 2_654_435_761
+
+ZIPF = 1.1
+ANONYMOUS_SHARE = 0.3
+TIMESTAMP_POOL = 1 << 20
+
+# (weight, value) pools
+REFERERS = [
+    (40, None),
+    (14, "https://t.co/"),
+    (12, "https://www.google.com/"),
+    (8, "https://www.facebook.com/"),
+    (6, "https://www.linkedin.com/"),
+    (5, "https://www.reddit.com/"),
+    (4, "https://news.ycombinator.com/"),
+    (4, "https://mail.google.com/"),
+    (3, "https://www.instagram.com/"),
+    (2, "https://duckduckgo.com/"),
+    (2, "https://slack.com/"),
+]
+USER_AGENTS = [
+    (30, "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 "
+         "(KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1"),
+    (25, "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 "
+         "(KHTML, like Gecko) Chrome/126.0.0.0 Mobile Safari/537.36"),
+    (20, "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+         "(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"),
+    (10, "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+         "(KHTML, like Gecko) Version/17.5 Safari/605.1.15"),
+    (6, "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:127.0) Gecko/20100101 Firefox/127.0"),
+    (4, "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)"),
+    (3, "Twitterbot/1.0"),
+    (2, "Slackbot-LinkExpanding 1.0 (+https://api.slack.com/robots)"),
+]
+# Share of clicks per UTC hour: quiet overnight, peaks in the afternoon
+HOURLY = [2, 1, 1, 1, 1, 2, 3, 4, 5, 6, 6, 6, 7, 7, 7, 6, 6, 6, 5, 5, 4, 4, 3, 3]
+
+
+def short_code(i):
+    n = (i * CODE_STRIDE) % 62 ** CODE_LENGTH
+    chars = []
+    for _ in range(CODE_LENGTH):
+        n, r = divmod(n, 62)
+        chars.append(BASE62[r])
+    return "".join(chars)
+
+
+def zipf_cum_weights(n, s):
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+def timestamp_pool(rng, end, days, size):
+    """Click times over the last `days` days, following the daily cycle."""
+    hour_weights = list(itertools.accumulate(HOURLY))
+    pool = []
+    for _ in range(size):
+        day = end - timedelta(days=rng.randrange(days) + 1)
+        hour = bisect.bisect(hour_weights, rng.random() * hour_weights[-1])
+        moment = day.replace(hour=hour, minute=0, second=0, microsecond=0) + timedelta(seconds=rng.random() * 3600)
+        pool.append(moment.isoformat(sep=" "))
+    return pool
+
+
+def ip_pool(rng, size):
+    # A few busy addresses (offices, carrier NAT) and a long tail
+    return [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+            for _ in range(size)]
+
+
+def weighted(pool):
+    return [value for _, value in pool], list(itertools.accumulate(weight for weight, _ in pool))
+
+
+class Loader:
+    """Bulk rows into one table, by executemany on SQLite or COPY on Postgres."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.postgres = engine.dialect.name == "postgresql"
+        self.conn = engine.raw_connection()
+        if not self.postgres:
+            self.execute("PRAGMA journal_mode=OFF")
+            self.execute("PRAGMA synchronous=OFF")
+
+    def insert(self, table, columns, rows):
+        cursor = self.conn.cursor()
+        if self.postgres:
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write("\t".join(r"\N" if v is None else str(v) for v in row))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        else:
+            placeholders = ", ".join("?" for _ in columns)
+            cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        cursor.close()
+        self.conn.commit()
+
+    def execute(self, sql):
+        cursor = self.conn.cursor()
+        cursor.execute(sql)
+        row = cursor.fetchone() if cursor.description else None
+        cursor.close()
+        return row
+
+    def scalar(self, sql):
+        return self.execute(sql)[0]
+
+    def close(self):
+        if self.postgres:
+            # Rows were loaded with explicit ids; move the sequences past them
+            for table in ("api_keys", "urls"):
+                self.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+                )
+            self.conn.commit()
+        else:
+            self.execute("PRAGMA journal_mode=WAL")
+        self.conn.close()
+
+
+def generate(
+    database,
+    urls=10_000,
+    clicks=100_000,
+    api_keys=10,
+    url_days=365,
+    click_days=90,
+    zipf=ZIPF,
+    seed=1,
+    batch=200_000,
+    progress=False,
+):
+    """Load the dataset into `database`; returns its short codes, most clicked first."""
+    sys.path.insert(0, str(ROOT / "backend"))
+    from sqlalchemy import create_engine
+    from app.models import Base
+
+    def log(message):
+        if progress:
+            print(message, file=sys.stderr)
+
+    rng = random.Random(seed)
+    engine = create_engine(database)
+    Base.metadata.create_all(bind=engine)
+    loaded_tables = [Base.metadata.tables[name] for name in ("urls", "clicks")]
+    indexes = [index for table in loaded_tables for index in table.indexes]
+    for index in indexes:
+        index.drop(bind=engine, checkfirst=True)
+
+    loader = Loader(engine)
+    started = time.perf_counter()
+    now = datetime.utcnow().replace(microsecond=0)
+
+    first_key = loader.scalar("SELECT coalesce(max(id), 0) FROM api_keys") + 1
+    loader.insert("api_keys", ("id", "key", "name", "created_at", "is_active"), [
+        (first_key + i, f"datagen-{seed}-{first_key + i}-{rng.getrandbits(128):032x}", f"datagen key {i}",
+         (now - timedelta(days=url_days)).isoformat(sep=" "), True)
+        for i in range(api_keys)
+    ])
+
+    # Key ownership is skewed too: a few keys own most links
+    key_weights = zipf_cum_weights(api_keys, 1.0) if api_keys else []
+    first_url = loader.scalar("SELECT coalesce(max(id), 0) FROM urls") + 1
+    codes = [short_code(first_url + i) for i in range(urls)]
+
+    def url_rows(start, stop):
+        for i in range(start, stop):
+            api_key_id = None
+            if api_keys and rng.random() >= ANONYMOUS_SHARE:
+                api_key_id = first_key + bisect.bisect(key_weights, rng.random() * key_weights[-1])
+            created_at = now - timedelta(seconds=rng.randrange(url_days * 86400))
+            yield (first_url + i, f"https://example.com/{codes[i][:3]}/articles/{i}?utm_source=datagen",
+                   codes[i], created_at.isoformat(sep=" "), api_key_id)
+
+    for start in range(0, urls, batch):
+        loader.insert("urls", ("id", "original_url", "short_code", "created_at", "api_key_id"),
+                      url_rows(start, min(start + batch, urls)))
+    log(f"{urls} urls in {time.perf_counter() - started:.1f}s")
+
+    # Popularity rank -> url id, shuffled so hot links are spread over ids
+    by_rank = list(range(first_url, first_url + urls))
+    rng.shuffle(by_rank)
+    rank_weights = zipf_cum_weights(urls, zipf)
+    times = timestamp_pool(rng, now, click_days, min(TIMESTAMP_POOL, max(clicks, 1)))
+    ips = ip_pool(rng, max(1, min(clicks // 20, 200_000)))
+    ip_weights = zipf_cum_weights(len(ips), 0.8)
+    referers, referer_weights = weighted(REFERERS)
+    agents, agent_weights = weighted(USER_AGENTS)
+
+    loaded = 0
+    while loaded < clicks:
+        n = min(batch, clicks - loaded)
+        rows = zip(
+            rng.choices(by_rank, cum_weights=rank_weights, k=n),
+            rng.choices(times, k=n),
+            rng.choices(ips, cum_weights=ip_weights, k=n),
+            rng.choices(agents, cum_weights=agent_weights, k=n),
+            rng.choices(referers, cum_weights=referer_weights, k=n),
+        )
+        loader.insert("clicks", ("url_id", "clicked_at", "ip_address", "user_agent", "referer"), rows)
+        loaded += n
+        elapsed = time.perf_counter() - started
+        log(f"{loaded}/{clicks} clicks, {loaded / elapsed:,.0f}/s overall")
+    loader.close()
+
+    index_started = time.perf_counter()
+    for index in indexes:
+        index.create(bind=engine, checkfirst=True)
+    log(f"indexes rebuilt in {time.perf_counter() - index_started:.1f}s")
+    engine.dispose()
+
+    return [codes[url_id - first_url] for url_id in by_rank]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database", required=True, help="sqlite:///path.db or postgresql://...")
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    parser.add_argument("--clicks", type=int, default=10_000_000)
+    parser.add_argument("--api-keys", type=int, default=100)
+    parser.add_argument("--url-days", type=int, default=365, help="links are created over this many days")
+    parser.add_argument("--click-days", type=int, default=90, help="clicks fall in this many days")
+    parser.add_argument("--zipf", type=float, default=ZIPF, help="Zipf exponent of link popularity")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=200_000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    codes = generate(
+        args.database, args.urls, args.clicks, args.api_keys, args.url_days, args.click_days,
+        args.zipf, args.seed, args.batch, progress=True,
+    )
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "database": args.database,
+        "urls": args.urls,
+        "clicks": args.clicks,
+        "api_keys": args.api_keys,
+        "seconds": round(elapsed, 1),
+        "clicks_per_s": round(args.clicks / elapsed) if elapsed else None,
+        "hottest_codes": codes[:10],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
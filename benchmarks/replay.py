@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Replay recorded or generated traffic against a local backend.
+
+The workload is either an access log or a generated Zipf workload:
+  --log FILE   Combined/Common Log Format (nginx, Apache), uvicorn access
+               lines, or JSON lines with method, path and an optional
+               timestamp (epoch seconds or ISO 8601). Requests keep their
+               recorded spacing (scaled by --speed) unless --rate is given.
+               Only GETs and POST /api/shorten are replayed.
+  --zipf       --requests requests drawn from --mix (e.g. redirect=90,
+               stats=7,shorten=3), with links picked by Zipf popularity.
+
+Arrivals are open-loop: each request is sent at its scheduled time,
+whether or not earlier ones have finished (--rate gives Poisson arrivals).
+At most --concurrency requests are in flight at once. Latency is measured
+from the scheduled time, so time spent waiting behind a slow server
+counts too (no coordinated omission); service time is reported alongside.
+
+By default the FastAPI backend or the api/ handlers (--target) are started
+on a scratch SQLite database seeded with datagen.py. Short codes seen in
+the log are added to it so that replayed redirects resolve. --base-url
+targets an instance that is already running instead. Nothing leaves the
+machine.
+
+Reports latency percentiles, status classes and error rates overall and
+per request kind, plus throughput and latency per --interval seconds, as
+JSON.
+
+Run: python benchmarks/replay.py --zipf [--requests 20000] [--rate 300] [--mix redirect=90,stats=7,shorten=3]
+     python benchmarks/replay.py --log access.log [--speed 2] [--target fastapi|api] [--base-url URL]
+                                 [--concurrency 64] [--interval 1] [--output replay.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import httpx
+
+from bench_concurrency import free_port, percentiles
+from bench_suite import TARGETS, metadata, wait_ready
+from datagen import ZIPF, generate, zipf_cum_weights
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MIX = "redirect=90,stats=7,shorten=3"
+
+COMBINED_LOG = re.compile(r'^\S+ \S+ \S+ \[([^\]]+)\] "(\S+) (\S+)[^"]*" (\d{3})')
+UVICORN_LOG = re.compile(r'"(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS) (\S+) HTTP/[\d.]+" (\d{3})')
+RESERVED = {"api", "health", "metrics", "docs", "openapi.json", "redoc", "trending", "favicon.ico"}
+
+
+class Request(NamedTuple):
+    at: float  # seconds after the start of the run
+    kind: str
+    method: str
+    path: str
+
+
+def classify(method, path):
+    """Request kind for a path, or None when it is not replayed."""
+    route = path.split("?", 1)[0].rstrip("/")
+    parts = route.strip("/").split("/")
+    if method == "POST":
+        return "shorten" if route == "/api/shorten" else None
+    if method != "GET":
+        return None
+    if route == "/api/stats":
+        return "global_stats"
+    if route == "/api/trending":
+        return "trending"
+    if route == "/api/urls":
+        return "listing"
+    if len(parts) == 3 and parts[:2] == ["api", "urls"]:
+        return "stats"
+    if len(parts) == 4 and parts[:2] == ["api", "urls"] and parts[3] == "qr":
+        return "qr"
+    if len(parts) == 1 and parts[0] and parts[0] not in RESERVED:
+        return "redirect"
+    return None
+
+
+def short_code_of(kind, path):
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if kind == "redirect":
+        return parts[0]
+    if kind in ("stats", "qr"):
+        return parts[2]
+    return None
+
+
+def parse_timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) / (1000 if value > 1e11 else 1)
+    for fmt in ("%d/%b/%Y:%H:%M:%S %z",):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def parse_log(path):
+    """[(timestamp or None, method, path)] from the lines that parse; the count of lines that do not."""
+    entries, unparsed = [], 0
+    with open(path, errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    unparsed += 1
+                    continue
+                method = record.get("method") or record.get("request_method")
+                target = record.get("path") or record.get("url") or record.get("request_uri")
+                when = record.get("timestamp") or record.get("time")
+                if method and target:
+                    entries.append((parse_timestamp(when), method.upper(), target))
+                else:
+                    unparsed += 1
+                continue
+            match = COMBINED_LOG.match(line)
+            if match:
+                entries.append((parse_timestamp(match.group(1)), match.group(2), match.group(3)))
+                continue
+            match = UVICORN_LOG.search(line)
+            if match:
+                entries.append((None, match.group(1), match.group(2)))
+                continue
+            unparsed += 1
+    return entries, unparsed
+
+
+def poisson_arrivals(rng, count, rate):
+    at = 0.0
+    for _ in range(count):
+        at += rng.expovariate(rate)
+        yield at
+
+
+def log_workload(entries, rate, speed, rng):
+    requests, kept = [], []
+    skipped = 0
+    for when, method, path in entries:
+        kind = classify(method, path)
+        if kind is None:
+            skipped += 1
+        else:
+            kept.append((when, kind, method, path))
+    timed = all(when is not None for when, *_ in kept)
+    if rate is None and not timed:
+        raise SystemExit("the log has no timestamps; pass --rate")
+    if rate is not None or not kept:
+        arrivals = poisson_arrivals(rng, len(kept), rate or 1)
+    else:
+        kept.sort(key=lambda entry: entry[0])
+        first = kept[0][0]
+        arrivals = ((when - first) / speed for when, *_ in kept)
+    for at, (_, kind, method, path) in zip(arrivals, kept):
+        requests.append(Request(at, kind, method, path))
+    return requests, skipped
+
+
+def zipf_workload(codes, count, rate, mix, rng):
+    kinds = list(mix)
+    kind_weights = [mix[kind] for kind in kinds]
+    popularity = zipf_cum_weights(len(codes), ZIPF)
+    paths = {
+        "redirect": lambda code: f"/{code}?direct=true",
+        "stats": lambda code: f"/api/urls/{code}",
+        "qr": lambda code: f"/api/urls/{code}/qr",
+        "global_stats": lambda code: "/api/stats",
+        "trending": lambda code: "/api/trending",
+        "listing": lambda code: "/api/urls?limit=50",
+        "shorten": lambda code: "/api/shorten",
+    }
+    unknown = set(kinds) - set(paths)
+    if unknown:
+        raise SystemExit(f"unknown request kinds in --mix: {', '.join(sorted(unknown))}")
+    requests = []
+    for at in poisson_arrivals(rng, count, rate):
+        kind = rng.choices(kinds, weights=kind_weights)[0]
+        code = rng.choices(codes, cum_weights=popularity)[0]
+        requests.append(Request(at, kind, "POST" if kind == "shorten" else "GET", paths[kind](code)))
+    return requests
+
+
+def parse_mix(spec):
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def add_codes(db_path, codes):
+    """Give short codes seen in the log a row, so their redirects resolve."""
+    conn = sqlite3.connect(db_path)
+    now = datetime.utcnow().isoformat(sep=" ")
+    conn.executemany(
+        "INSERT OR IGNORE INTO urls (original_url, short_code, created_at) VALUES (?, ?, ?)",
+        [(f"https://example.com/replayed/{code}", code, now) for code in codes]
+    )
+    conn.commit()
+    conn.close()
+
+
+async def run_workload(client, requests, concurrency):
+    """Send each request at its time; [(request, sent_at, started_at, finished_at, status or None)]."""
+    slots = asyncio.Semaphore(concurrency)
+    results = []
+    start = time.perf_counter()
+
+    async def fire(i, request):
+        scheduled = start + request.at
+        async with slots:
+            started = time.perf_counter()
+            try:
+                kwargs = {"json": {"url": f"https://example.com/replay/{i}"}} if request.kind == "shorten" else {}
+                response = await client.request(request.method, request.path, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+            results.append((request, scheduled - start, started - start, time.perf_counter() - start, status))
+
+    tasks = []
+    for i, request in enumerate(requests):
+        delay = start + request.at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(i, request)))
+    await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+
+def status_class(status):
+    return "error" if status is None else f"{status // 100}xx"
+
+
+def summarize(results, elapsed):
+    latencies = [finished - scheduled for _, scheduled, _, finished, _ in results]
+    service = [finished - started for _, _, started, finished, _ in results]
+    classes = Counter(status_class(status) for *_, status in results)
+    errors = classes["error"] + classes["5xx"]
+    return {
+        "requests": len(results),
+        "requests_per_s": round(len(results) / elapsed, 1) if elapsed else None,
+        "error_rate": round(errors / len(results), 4) if results else None,
+        "statuses": dict(sorted(classes.items())),
+        "latency": percentiles(latencies) if latencies else None,
+        "service_time": percentiles(service) if service else None,
+    }
+
+
+def timeline(results, interval):
+    """Completions, errors and latency per interval, by finish time."""
+    buckets = defaultdict(list)
+    for request, scheduled, _, finished, status in results:
+        buckets[int(finished // interval)].append((finished - scheduled, status))
+    rows = []
+    for index in range(max(buckets) + 1 if buckets else 0):
+        samples = buckets.get(index, [])
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, status in samples if status is None or status >= 500)
+        rows.append({
+            "t": round(index * interval, 3),
+            "requests_per_s": round(len(samples) / interval, 1),
+            "errors": errors,
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+            if latencies else None,
+        })
+    return rows
+
+
+async def replay(args, requests, base_url):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if not args.base_url:
+            await wait_ready(client, TARGETS[args.target][1])
+        results, elapsed = await run_workload(client, requests, args.concurrency)
+
+    by_kind = defaultdict(list)
+    for result in results:
+        by_kind[result[0].kind].append(result)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "scheduled_s": round(requests[-1].at, 2) if requests else 0,
+        "summary": summarize(results, elapsed),
+        "by_kind": {kind: summarize(rows, elapsed) for kind, rows in sorted(by_kind.items())},
+        "timeline": timeline(results, args.interval),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", help="access log to replay")
+    source.add_argument("--zipf", action="store_true", help="generate a Zipf workload instead")
+    parser.add_argument("--requests", type=int, default=20_000, help="requests in a generated workload")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="request kinds and weights for --zipf")
+    parser.add_argument("--rate", type=float, help="Poisson arrival rate (req/s); --zipf defaults to 300")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay a timed log this many times faster")
+    parser.add_argument("--concurrency", type=int, default=64, help="most requests in flight")
+    parser.add_argument("--interval", type=float, default=1.0, help="timeline bucket, seconds")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--target", choices=sorted(TARGETS), default="fastapi")
+    parser.add_argument("--base-url", help="an already running local instance; skips starting and seeding one")
+    parser.add_argument("--urls", type=int, default=10_000, help="links in the seeded dataset")
+    parser.add_argument("--clicks", type=int, default=100_000, help="clicks in the seeded dataset")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    skipped = unparsed = 0
+    if args.log:
+        entries, unparsed = parse_log(args.log)
+        requests, skipped = log_workload(entries, args.rate, args.speed, rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        base_url = args.base_url
+        if not base_url:
+            template = os.path.join(tmp, "seed.db")
+            codes = generate(f"sqlite:///{template}", urls=args.urls, clicks=args.clicks, seed=args.seed)
+            db_path = os.path.join(tmp, f"{args.target}.db")
+            shutil.copy(template, db_path)
+            if args.log:
+                add_codes(db_path, {code for r in requests if (code := short_code_of(r.kind, r.path))})
+            port = free_port()
+            server = TARGETS[args.target][0](port, db_path)
+            base_url = f"http://127.0.0.1:{port}"
+        elif args.zipf:
+            raise SystemExit("--zipf needs a seeded dataset; drop --base-url")
+
+        if args.zipf:
+            requests = zipf_workload(codes, args.requests, args.rate or 300, parse_mix(args.mix), rng)
+        try:
+            result = asyncio.run(replay(args, requests, base_url))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    report = {
+        "meta": {**metadata(args), "source": args.log or "zipf", "skipped": skipped, "unparsed": unparsed},
+        **result,
+    }
+    summary = result["summary"]
+    print(f"{summary['requests']} requests in {result['elapsed_s']}s, error rate {summary['error_rate']}",
+          file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
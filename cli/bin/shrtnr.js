@@ -5,7 +5,8 @@ import chalk from 'chalk';
 import ora from 'ora';
 import clipboardy from 'clipboardy';
 import fetch from 'node-fetch';
-import { readFileSync, writeFileSync, existsSync } from 'fs';
+import { readFileSync, writeFileSync, existsSync, createWriteStream } from 'fs';
+import { pipeline } from 'stream/promises';
 import { homedir } from 'os';
 import { join } from 'path';
 
@@ -240,4 +241,50 @@ program
     }
   });
 
+// Batch QR export command
+program
+  .command('qr-batch [codes...]')
+  .description('Download QR codes as a ZIP (all your links if no codes are given)')
+  .option('-f, --format <format>', 'png or svg', 'png')
+  .option('-s, --size <px>', 'Pixels per QR module', '10')
+  .option('-o, --output <file>', 'Output file', 'qr-codes.zip')
+  .action(async (codes, options) => {
+    const spinner = ora('Rendering QR codes...').start();
+
+    try {
+      const apiUrl = getApiUrl();
+      const config = loadConfig();
+
+      const headers = {
+        'Content-Type': 'application/json'
+      };
+      if (config.apiKey) {
+        headers['X-API-Key'] = config.apiKey;
+      }
+
+      const response = await fetch(`${apiUrl}/api/qr/batch`, {
+        method: 'POST',
+        headers,
+        body: JSON.stringify({
+          codes: codes.length > 0 ? codes : null,
+          format: options.format,
+          size: parseInt(options.size, 10)
+        })
+      });
+
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}));
+        spinner.fail(chalk.red(data.detail || `Batch export failed (HTTP ${response.status})`));
+        process.exit(1);
+      }
+
+      // The server streams entries as they render; write them straight to disk
+      await pipeline(response.body, createWriteStream(options.output));
+      spinner.succeed(chalk.green(`QR codes saved to ${options.output}`));
+    } catch (error) {
+      spinner.fail(chalk.red('Failed to export QR codes'));
+      process.exit(1);
+    }
+  });
+
 program.parse();
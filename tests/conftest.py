@@ -0,0 +1,87 @@
+"""
+Offline test setup: everything runs against scratch SQLite databases.
+
+Both backends read their settings at import time, so the environment is
+set here before any test module imports them, with the memory redirect
+store on so that redirects go through it. Route tests run each backend
+in its own process (uvicorn, or the api/ handlers behind the local router
+from benchmarks/bench_suite.py) on its own database.
+
+Run: python -m pytest tests
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "backend"), str(ROOT / "benchmarks"), str(ROOT)]
+
+_scratch = tempfile.mkdtemp(prefix="shrtnr-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_scratch}/unit.db",
+    SHRTNR_RATE_LIMITS="off",
+    SHRTNR_QR_CACHE_DIR="",
+    SHRTNR_REDIRECT_STORE="memory",
+)
+
+from bench_concurrency import free_port  # noqa: E402
+
+# Scripts against a live deployment, not tests
+collect_ignore = ["qa_comprehensive.py", "test_dynamic.py"]
+
+TARGETS = {
+    "fastapi": (["-m", "uvicorn", "app.main:app", "--log-level", "warning", "--port"], ROOT / "backend"),
+    "api": ([str(ROOT / "benchmarks" / "bench_suite.py"), "--serve-api"], ROOT),
+}
+
+
+def start_target(target, db_path, **env):
+    """Start `target` on a free port, with `env` on top of ours; returns (process, client).
+
+    client.db_path is the database it was started on.
+    """
+    args, cwd = TARGETS[target]
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, *args, str(port)], cwd=cwd, env=dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", **env)
+    )
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30)
+    client.db_path = db_path
+    for _ in range(300):
+        try:
+            # OPTIONS: answered by both backends without touching rate limits
+            client.options("/api/stats")
+            return server, client
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"{target} did not start")
+
+
+@pytest.fixture(scope="module", params=sorted(TARGETS))
+def server(request, tmp_path_factory):
+    """An httpx client for each backend, started on an empty database."""
+    db_path = tmp_path_factory.mktemp(request.param) / "shrtnr.db"
+    process, client = start_target(request.param, db_path)
+    yield client
+    client.close()
+    process.terminate()
+    process.wait()
+
+
+@pytest.fixture
+def db():
+    """A session on the unit test database, with the FastAPI backend's tables."""
+    from app.database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    yield session
+    session.close()
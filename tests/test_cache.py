@@ -0,0 +1,86 @@
+import secrets
+
+from app import auth, cache
+from app.cache import TTLCache
+from app.models import APIKey
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_evicts_least_recently_used():
+    lru = TTLCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert (lru.get("a"), lru.get("c"), len(lru)) == (1, 3, 2)
+
+
+def test_entries_expire(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    ttl = TTLCache(ttl=10)
+    ttl.set("default", 1)
+    ttl.set("short", 2, ttl=1)
+    clock.now += 5
+    assert (ttl.get("default"), ttl.get("short", "gone")) == (1, "gone")
+    clock.now += 5
+    assert ttl.get("default") is None
+    assert len(ttl) == 0
+
+
+def test_pop_and_clear():
+    lru = TTLCache()
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.pop("a")
+    lru.pop("missing")
+    assert lru.get("a") is None and len(lru) == 1
+    lru.clear()
+    assert len(lru) == 0
+
+
+def test_authenticate_caches_until_invalidated(db):
+    raw_key = secrets.token_urlsafe(32)
+    api_key = APIKey(key=raw_key, name="cache test")
+    db.add(api_key)
+    db.commit()
+
+    assert auth.authenticate(db, raw_key).id == api_key.id
+    # Revoked behind the cache's back: still served from it
+    api_key.is_active = False
+    db.commit()
+    assert auth.authenticate(db, raw_key).id == api_key.id
+
+    auth.invalidate(raw_key)
+    assert auth.authenticate(db, raw_key) is None
+
+
+def test_unknown_key_is_cached_briefly(db):
+    raw_key = secrets.token_urlsafe(32)
+    assert auth.authenticate(db, raw_key) is None
+    db.add(APIKey(key=raw_key, name="created after a miss"))
+    db.commit()
+    assert auth.authenticate(db, raw_key) is None
+    auth.invalidate(raw_key)
+    assert auth.authenticate(db, raw_key) is not None
+
+
+def test_revoked_key_stops_working_at_once(server):
+    key = server.post("/api/keys", json={"name": "revoke test"}).json()
+    headers = {"X-API-Key": key["key"]}
+    assert server.post("/api/shorten", json={"url": "https://example.com/keyed"}, headers=headers).status_code == 200
+    server.post("/api/shorten", json={"url": "https://example.com/anonymous"})
+
+    # A key lists only its own links; the key is cached by now
+    assert len(server.get("/api/urls", headers=headers).json()) == 1
+
+    assert server.delete(f"/api/keys/{key['id']}").status_code == 200
+    assert len(server.get("/api/urls", headers=headers).json()) > 1
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+from app.pagination import MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("params", [
+    {"limit": 0, "cursor": ""},
+    {"limit": 0},
+    {"limit": -1},
+    {"limit": MAX_PAGE_SIZE + 1, "cursor": ""},
+    {"limit": "ten"},
+    {"offset": -1},
+])
+def test_list_rejects_out_of_range_pages(server, params):
+    assert server.get("/api/urls", params=params).status_code in (400, 422)
+
+
+def test_list_cursor_pages(server):
+    for i in range(3):
+        assert server.post("/api/shorten", json={"url": f"https://example.com/page/{i}"}).status_code == 200
+
+    first = server.get("/api/urls", params={"limit": 2, "cursor": ""}).json()
+    assert len(first["items"]) == 2 and first["next_cursor"]
+    second = server.get("/api/urls", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert len(second["items"]) == 1 and second["next_cursor"] is None
+    seen = {item["short_code"] for item in first["items"] + second["items"]}
+    assert len(seen) == 3
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm9wZQ", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_invalid_cursor_is_rejected(server):
+    assert server.get("/api/urls", params={"cursor": "not base64!"}).status_code == 400
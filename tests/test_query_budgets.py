@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_every_route_stays_within_its_query_budget(tmp_path):
+    # Both backends in SHRTNR_QUERY_PROFILE=raise mode on a small dataset.
+    # Output goes to a file, not a pipe: the FastAPI backend's process pool
+    # leaves a resource tracker behind that would hold a pipe open.
+    with open(tmp_path / "report.txt", "w+") as report:
+        check = subprocess.run(
+            [sys.executable, "check_query_budgets.py", "--urls", "200", "--clicks", "2000"],
+            cwd=ROOT / "benchmarks", stdout=report, stderr=subprocess.STDOUT, timeout=600,
+        )
+        report.seek(0)
+        assert check.returncode == 0, report.read()[-2000:]
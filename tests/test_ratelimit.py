@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import create_engine
+
+from conftest import TARGETS, start_target
+from app.ratelimit import Limit, MemoryStore, RateLimiter, SQLStore, identity_for, parse_limits, retry_after_header
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    return SQLStore(create_engine(f"sqlite:///{tmp_path}/buckets.db"))
+
+
+def test_parse_limits():
+    assert parse_limits("shorten=60/minute, read=10/seconds") == {
+        "shorten": Limit(60, 60), "read": Limit(10, 1)
+    }
+    assert parse_limits("off") == {}
+    assert parse_limits("") == {}
+
+
+def test_bucket_empties_then_refills(store):
+    limit = Limit(2, 60)  # one token every 30 s
+    assert store.take("ip:a", limit, 0.0) == 0
+    assert store.take("ip:a", limit, 0.0) == 0
+    assert store.take("ip:a", limit, 0.0) == pytest.approx(30)
+    assert store.take("ip:a", limit, 15.0) == pytest.approx(15)
+    assert store.take("ip:a", limit, 30.0) == 0
+    # Buckets are independent
+    assert store.take("ip:b", limit, 30.0) == 0
+
+
+def test_refill_stops_at_capacity(store):
+    limit = Limit(2, 60)
+    store.take("ip:a", limit, 0.0)
+    for _ in range(2):
+        assert store.take("ip:a", limit, 3600.0) == 0
+    assert store.take("ip:a", limit, 3600.0) > 0
+
+
+def test_memory_store_forgets_oldest_bucket():
+    store = MemoryStore(maxsize=1)
+    limit = Limit(1, 60)
+    store.take("ip:a", limit, 0.0)
+    store.take("ip:b", limit, 0.0)
+    # ip:a was evicted, so it starts from a full bucket again
+    assert store.take("ip:a", limit, 0.0) == 0
+
+
+def test_limiter_per_class_and_identity():
+    limiter = RateLimiter({"shorten": Limit(1, 60)}, MemoryStore())
+    assert limiter.hit("read", "ip:a") == 0
+    assert limiter.hit("shorten", identity_for(None, "10.0.0.1")) == 0
+    assert limiter.hit("shorten", identity_for(None, "10.0.0.1")) > 0
+    assert limiter.hit("shorten", identity_for(7, "10.0.0.1")) == 0
+
+
+def test_retry_after_header_rounds_up():
+    assert retry_after_header(0.2) == {"Retry-After": "1"}
+    assert retry_after_header(29.5) == {"Retry-After": "30"}
+
+
+@pytest.mark.parametrize("target", sorted(TARGETS))
+@pytest.mark.parametrize("method,path", [
+    ("GET", "/api/stats"),
+    ("GET", "/api/trending"),
+    ("GET", "/api/urls/{code}"),
+    ("GET", "/api/urls/{code}/qr"),
+    ("GET", "/api/keys"),
+])
+def test_requests_are_limited_per_key(tmp_path, target, method, path):
+    process, client = start_target(
+        target, tmp_path / "shrtnr.db", SHRTNR_RATE_LIMITS="shorten=100/minute,read=2/minute,write=100/minute,qr=2/minute"
+    )
+    try:
+        code = client.post("/api/shorten", json={"url": "https://example.com/limited"}).json()["short_code"]
+        first, second = (
+            {"X-API-Key": client.post("/api/keys", json={"name": name}).json()["key"]} for name in ("first", "second")
+        )
+        path = path.format(code=code)
+        assert [client.request(method, path, headers=first).status_code for _ in range(3)] == [200, 200, 429]
+        # Another key has a bucket of its own, not the client address's
+        assert client.request(method, path, headers=second).status_code == 200
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
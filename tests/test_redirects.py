@@ -0,0 +1,119 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.redirects import MemoryRedirectStore, Redirect, SQLiteRedirectStore, create_store
+from app.shards import shard_index
+from conftest import start_target
+
+
+def delete_elsewhere(db_path, short_code):
+    """Delete a link the way another worker or host would, behind the server's back."""
+    with sqlite3.connect(db_path) as db:
+        (url_id,) = db.execute("SELECT id FROM urls WHERE short_code = ?", (short_code,)).fetchone()
+        db.execute("DELETE FROM clicks WHERE url_id = ?", (url_id,))
+        db.execute("DELETE FROM urls WHERE id = ?", (url_id,))
+
+
+def count_clicks(db_path):
+    with sqlite3.connect(db_path) as db:
+        return db.execute("SELECT COUNT(*) FROM clicks").fetchone()[0]
+
+
+def check_deleted_elsewhere(client, locate):
+    """`locate(short_code)` is the database file the link was written to."""
+    code = client.post("/api/shorten", json={"url": "https://example.com/gone"}).json()["short_code"]
+    db_path = locate(code)
+    # Puts the link in this server's redirect store
+    assert client.get(f"/{code}", params={"direct": "true"}).status_code == 307
+
+    delete_elsewhere(db_path, code)
+    assert client.get(f"/{code}", params={"direct": "true"}).status_code == 404
+    assert count_clicks(db_path) == 0
+
+
+def test_redirect_to_link_deleted_elsewhere(server):
+    check_deleted_elsewhere(server, lambda code: server.db_path)
+
+
+def test_redirect_to_link_deleted_elsewhere_sharded(tmp_path):
+    process, client = start_target("fastapi", tmp_path / "shrtnr.db", SHRTNR_SQLITE_SHARDS="2")
+    try:
+        check_deleted_elsewhere(client, lambda code: tmp_path / f"shrtnr.shard{shard_index(code, 2)}.db")
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    stores = []
+
+    def make(ttl=0.0, **kwargs):
+        if request.param == "memory":
+            store = MemoryRedirectStore(ttl=ttl, **kwargs)
+        else:
+            store = SQLiteRedirectStore(str(tmp_path / "redirects.db"), ttl=ttl)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_store_put_get_delete(make_store):
+    store = make_store()
+    store.put(Redirect(1, "abc", "https://example.com/"))
+    store.put_many([Redirect(2, "def", "https://example.org/"), Redirect(3, "ghi", "https://example.net/")])
+    assert store.get("abc") == Redirect(1, "abc", "https://example.com/")
+    assert store.size() == 3
+    store.delete("abc")
+    store.delete("missing")
+    assert store.get("abc") is None and store.get("def").id == 2
+
+
+def test_store_entries_expire(make_store, monkeypatch):
+    now = [1000.0]
+    # The memory store expires on the monotonic clock, the SQLite file on wall time
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    store = make_store(ttl=10)
+    store.put(Redirect(1, "abc", "https://example.com/"))
+    now[0] += 5
+    assert store.get("abc") is not None
+    now[0] += 10
+    assert store.get("abc") is None
+
+
+def test_memory_store_is_an_lru():
+    store = MemoryRedirectStore(ttl=0, maxsize=2)
+    for i, code in enumerate(("a", "b", "c")):
+        store.put(Redirect(i, code, f"https://example.com/{code}"))
+    assert store.get("a") is None and store.size() == 2
+
+
+def test_sqlite_store_prunes_expired_rows(tmp_path, monkeypatch):
+    store = SQLiteRedirectStore(str(tmp_path / "redirects.db"), ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    try:
+        store.put(Redirect(1, "old", "https://example.com/old"))
+        now[0] += store.PRUNE_INTERVAL
+        store.put(Redirect(2, "new", "https://example.com/new"))
+        assert store.size() == 1 and store.get("new") is not None
+    finally:
+        store.close()
+
+
+def test_create_store(tmp_path):
+    assert create_store("") is None and create_store("off") is None
+    assert isinstance(create_store("memory"), MemoryRedirectStore)
+    store = create_store(f"sqlite:///{tmp_path}/redirects.db")
+    assert isinstance(store, SQLiteRedirectStore)
+    store.close()
+    with pytest.raises(ValueError):
+        create_store("redis://localhost")
@@ -0,0 +1,92 @@
+import os
+import random
+import string
+import subprocess
+import sys
+from collections import Counter
+
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.engine import make_url
+
+from app.shards import next_url_id, shard_index, shard_url
+from conftest import ROOT, start_target
+
+
+def random_codes(count, seed=1):
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    return ["".join(rng.choices(alphabet, k=6)) for _ in range(count)]
+
+
+def test_shard_index_is_stable():
+    # Pinned: a change would move existing links to another shard
+    assert [shard_index(code, 4) for code in ("abc123", "xyz789", "a")] == [0, 3, 3]
+
+
+def test_codes_spread_over_every_shard():
+    counts = Counter(shard_index(code, 4) for code in random_codes(4000))
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert min(counts.values()) > 800
+
+
+def test_shard_url():
+    url = make_url("sqlite:///./url_shortener.db")
+    assert shard_url(url, 2).database == "./url_shortener.shard2.db"
+    assert shard_url(make_url("sqlite:////data/links"), 0).database == "/data/links.shard0.db"
+
+
+def test_ids_are_unique_across_shards():
+    count = 3
+    ids = []
+    for index in range(count):
+        engine = create_engine("sqlite://")
+        table = Table("urls", MetaData(), Column("id", Integer, primary_key=True))
+        table.create(bind=engine)
+        with engine.begin() as conn:
+            for _ in range(5):
+                conn.execute(insert(table).values(id=next_url_id(table, index, count)))
+            shard_ids = list(conn.execute(select(table.c.id).order_by(table.c.id)).scalars())
+        assert all(url_id % count == index for url_id in shard_ids)
+        ids += shard_ids
+    assert len(set(ids)) == len(ids) == 15
+
+
+def test_sharding_an_existing_database(tmp_path):
+    db_path = tmp_path / "shrtnr.db"
+    process, client = start_target("fastapi", db_path)
+    try:
+        codes = [client.post("/api/shorten", json={"url": f"https://example.com/{i}"}).json()["short_code"]
+                 for i in range(20)]
+        for code in codes[:5]:
+            client.get(f"/{code}", params={"direct": "true"})
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", SHRTNR_SQLITE_SHARDS="3")
+    # Refuses to start while the links would be hidden
+    refused = subprocess.run(
+        [sys.executable, "-c", "import app.main"], cwd=ROOT / "backend", env=env, capture_output=True, text=True
+    )
+    assert refused.returncode != 0 and "move_to_shards" in refused.stderr
+
+    move = [sys.executable, "-m", "app.move_to_shards", "--chunk-size", "7"]
+    moved = subprocess.run(move, cwd=ROOT / "backend", env=env, capture_output=True, text=True)
+    assert moved.returncode == 0, moved.stderr
+    assert "Moved 20 links" in moved.stdout
+    # Nothing left to move the second time
+    assert "Moved 0 links" in subprocess.run(move, cwd=ROOT / "backend", env=env, capture_output=True, text=True).stdout
+
+    process, client = start_target("fastapi", db_path, SHRTNR_SQLITE_SHARDS="3")
+    try:
+        for code in codes:
+            assert client.get(f"/{code}", params={"direct": "true"}).status_code == 307
+        stats = {code: client.get(f"/api/urls/{code}").json()["click_count"] for code in codes}
+        assert [stats[code] for code in codes] == [2] * 5 + [1] * 15
+        ids = [item["id"] for item in client.get("/api/urls", params={"limit": 100}).json()]
+        assert len(set(ids)) == 20
+    finally:
+        client.close()
+        process.terminate()
+        process.wait()
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        return await asyncio.gather(*(flight.do(key, fetch, key) for key in ["a"] * 5 + ["b"]))
+
+    assert asyncio.run(main()) == ["A"] * 5 + ["B"]
+    assert sorted(calls) == ["a", "b"]
+    assert flight._calls == {}
+
+
+def test_later_calls_run_again():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return [await flight.do("key", fetch), await flight.do("key", fetch)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise LookupError("gone")
+
+    async def main():
+        return await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, LookupError) and second is first
+
+
+def test_cancelled_caller_does_not_cancel_the_call():
+    flight = SingleFlight("test")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leaving = asyncio.ensure_future(flight.do("key", slow))
+        staying = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0.01)
+        leaving.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leaving
+        return await staying
+
+    assert asyncio.run(main()) == "done"
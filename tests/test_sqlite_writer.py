@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.sqlite_profile import SQLiteWriter
+
+items = Table("items", MetaData(), Column("id", Integer, primary_key=True), Column("name", String, unique=True))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/writer.db")
+    items.create(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def writer(engine):
+    writer = SQLiteWriter(sessionmaker(bind=engine))
+    yield writer
+    writer.stop()
+
+
+def add(name):
+    def work(session):
+        return session.execute(insert(items).values(name=name)).inserted_primary_key[0]
+    return work
+
+
+def names(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(select(items.c.name)).scalars())
+
+
+def hold(writer):
+    """Keep the writer thread busy until the returned event is set, so work queues up behind it."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def wait(session):
+        started.set()
+        release.wait(10)
+
+    writer.submit(wait)
+    started.wait(10)
+    return release
+
+
+def test_writes_commit_and_return_results(writer, engine):
+    first, second = writer.submit(add("a")), writer.submit(add("b"))
+    assert {first.result(10), second.result(10)} == {1, 2}
+    assert names(engine) == ["a", "b"]
+
+
+def test_queued_writes_commit_together(writer, engine):
+    release = hold(writer)
+    futures = [writer.submit(add(name)) for name in "abc"]
+    assert writer.queue_depth() == 3
+    release.set()
+    for future in futures:
+        future.result(10)
+    assert names(engine) == ["a", "b", "c"]
+
+
+def test_failed_write_fails_only_its_caller(writer, engine):
+    writer.submit(add("taken")).result(10)
+    release = hold(writer)
+    good = writer.submit(add("x"))
+    bad = writer.submit(add("taken"))
+    also_good = writer.submit(add("y"))
+    release.set()
+
+    # The batch fails as a whole, then each write is retried on its own
+    assert good.result(10) and also_good.result(10)
+    with pytest.raises(IntegrityError):
+        bad.result(10)
+    assert names(engine) == ["taken", "x", "y"]
+
+
+def test_cancelled_write_is_skipped(writer, engine):
+    release = hold(writer)
+    cancelled = writer.submit(add("never"))
+    assert cancelled.cancel()
+    kept = writer.submit(add("kept"))
+    release.set()
+    kept.result(10)
+    assert names(engine) == ["kept"]
+